@@ -1,7 +1,8 @@
 """
 ASGI config for brain project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``:
+the Django application behind the bare ingest app of events/fast_ingest.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +14,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'brain.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup, as it needs the app registry and URLconf.
+from events.fast_ingest import wrap  # noqa: E402
+
+application = wrap(django_application)
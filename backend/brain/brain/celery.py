@@ -2,9 +2,9 @@ import os
 from celery import Celery
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uasam.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'brain.settings')
 
-app = Celery('uasam')
+app = Celery('brain')
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
@@ -16,4 +16,4 @@ app.autodiscover_tasks()
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
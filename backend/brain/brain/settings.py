@@ -68,6 +68,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'brain.wsgi.application'
+ASGI_APPLICATION = 'brain.asgi.application'
 
 
 # Database
@@ -81,9 +82,20 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'brainpass'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Async views run their queries on a fixed pool of threads
+        # (events/blocking.py), so their connections can be kept open.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Threads, and so Postgres connections, per ASGI process for the ORM and
+# cache work of the async views.
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 20))
+# Threads (and connections) for streaming exports, which hold theirs for the
+# whole download; further exports wait for one.
+ASYNC_STREAM_POOL_SIZE = int(os.getenv('ASYNC_STREAM_POOL_SIZE', 4))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,6 +145,28 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'flush-event-buffer': {
+        'task': 'events.tasks.flush_event_buffer_task',
+        'schedule': float(os.getenv('EVENT_BUFFER_FLUSH_INTERVAL', 1.0)),
+    },
+    'fold-rollups': {
+        'task': 'events.tasks.fold_rollups_task',
+        'schedule': float(os.getenv('ROLLUP_FOLD_INTERVAL', 1.0)),
+    },
+    'manage-event-partitions': {
+        'task': 'events.tasks.manage_event_partitions_task',
+        'schedule': float(os.getenv('EVENT_PARTITION_MANAGE_INTERVAL', 3600)),
+    },
+    'retrain-payload-dictionaries': {
+        'task': 'events.tasks.retrain_payload_dictionaries_task',
+        'schedule': float(os.getenv('EVENT_PAYLOAD_DICT_RETRAIN_INTERVAL', 24 * 3600)),
+    },
+    'learn-path-templates': {
+        'task': 'events.tasks.learn_path_templates_task',
+        'schedule': float(os.getenv('PATH_TEMPLATE_LEARN_INTERVAL', 3600)),
+    },
+}
 
 # Redis Cache Configuration
 CACHES = {
@@ -148,6 +182,114 @@ ALLOWED_HOSTS = ['*']
 # JWT
 JWT_SECRET = os.getenv('JWT_SECRET', 'some-jwt-secret')
 
+# Shared secret for the internal endpoints (X-OTAS-INTERNAL-TOKEN): metrics
+# and UASAM's auth cache invalidation. Empty disables them.
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+
+# Pooled HTTP client for brain -> UASAM calls (seconds / connections)
+UASAM_HTTP_POOL_MAXSIZE = int(os.getenv('UASAM_HTTP_POOL_MAXSIZE', 50))
+# Connection limit of the async (httpx) client; keep-alive is capped at UASAM_HTTP_POOL_MAXSIZE.
+UASAM_HTTP_ASYNC_POOL_MAXSIZE = int(os.getenv('UASAM_HTTP_ASYNC_POOL_MAXSIZE', 200))
+UASAM_HTTP_CONNECT_TIMEOUT = float(os.getenv('UASAM_HTTP_CONNECT_TIMEOUT', 1.0))
+UASAM_HTTP_READ_TIMEOUT = float(os.getenv('UASAM_HTTP_READ_TIMEOUT', 5.0))
+UASAM_HTTP_MAX_RETRIES = int(os.getenv('UASAM_HTTP_MAX_RETRIES', 2))
+UASAM_HTTP_RETRY_BACKOFF = float(os.getenv('UASAM_HTTP_RETRY_BACKOFF', 0.05))
+UASAM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('UASAM_CIRCUIT_FAILURE_THRESHOLD', 5))
+UASAM_CIRCUIT_RESET_SECONDS = float(os.getenv('UASAM_CIRCUIT_RESET_SECONDS', 10))
+
+# SDK key verification cache (seconds / entries)
+SDK_KEY_CACHE_MAXSIZE = int(os.getenv('SDK_KEY_CACHE_MAXSIZE', 10000))
+SDK_KEY_CACHE_TTL = int(os.getenv('SDK_KEY_CACHE_TTL', 300))
+SDK_KEY_CACHE_NEGATIVE_TTL = int(os.getenv('SDK_KEY_CACHE_NEGATIVE_TTL', 30))
+
+# Dashboard authorization cache: (user, project, agent) decisions from UASAM.
+# UASAM invalidates entries through /api/v1/internal/auth-cache/invalidate/
+# (needs INTERNAL_API_TOKEN on both sides); the TTL bounds staleness if that
+# call is lost.
+AGENT_AUTH_CACHE_MAXSIZE = int(os.getenv('AGENT_AUTH_CACHE_MAXSIZE', 10000))
+AGENT_AUTH_CACHE_TTL = int(os.getenv('AGENT_AUTH_CACHE_TTL', 60))
+
+# Event ingest
+EVENT_BATCH_MAX_SIZE = int(os.getenv('EVENT_BATCH_MAX_SIZE', 1000))
+# 'sync' writes events inside the request; 'buffered' queues them in Redis and
+# responds 202, leaving the write to the flush_event_buffer_task workers.
+EVENT_INGEST_MODE = os.getenv('EVENT_INGEST_MODE', 'sync')
+EVENT_BUFFER_REDIS_URL = os.getenv('EVENT_BUFFER_REDIS_URL', 'redis://localhost:6379/2')
+EVENT_BUFFER_KEY = os.getenv('EVENT_BUFFER_KEY', 'brain:ingest:events')
+EVENT_BUFFER_FLUSH_BATCH_SIZE = int(os.getenv('EVENT_BUFFER_FLUSH_BATCH_SIZE', 500))
+EVENT_BUFFER_FLUSH_MAX_SECONDS = float(os.getenv('EVENT_BUFFER_FLUSH_MAX_SECONDS', 5))
+EVENT_BUFFER_MAX_ATTEMPTS = int(os.getenv('EVENT_BUFFER_MAX_ATTEMPTS', 5))
+# A flush holds its claimed batch this long; after that (the worker died) the
+# batch goes back to the buffer. Keep it well above a batch's write time.
+EVENT_BUFFER_CLAIM_TIMEOUT = int(os.getenv('EVENT_BUFFER_CLAIM_TIMEOUT', 300))
+# Serve single-event SDK/agent log POSTs from the bare ASGI app in front of
+# Django (events/fast_ingest.py) instead of the full middleware stack.
+FAST_INGEST_ENABLED = os.getenv('FAST_INGEST_ENABLED', 'True') == 'True'
+
+# Rows fetched per server-side cursor round trip by event exports.
+EVENT_EXPORT_CHUNK_SIZE = int(os.getenv('EVENT_EXPORT_CHUNK_SIZE', 2000))
+
+# Analytics response cache (events/response_cache.py), in CACHES['default'].
+ANALYTICS_CACHE_ENABLED = os.getenv('ANALYTICS_CACHE_ENABLED', 'True') == 'True'
+# Ranges reaching today; also invalidated by the agent's ingest watermark.
+ANALYTICS_CACHE_LIVE_TTL = int(os.getenv('ANALYTICS_CACHE_LIVE_TTL', 30))
+# Ranges that end before today.
+ANALYTICS_CACHE_PAST_TTL = int(os.getenv('ANALYTICS_CACHE_PAST_TTL', 24 * 3600))
+ANALYTICS_CACHE_LOCK_TIMEOUT = int(os.getenv('ANALYTICS_CACHE_LOCK_TIMEOUT', 10))
+
+# Upper bound on buckets per series for the analytics `bucket=` parameter.
+ANALYTICS_MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', 2000))
+# Upper bound on paths x buckets for per-path series.
+ANALYTICS_MAX_PATH_BUCKETS = int(os.getenv('ANALYTICS_MAX_PATH_BUCKETS', 50000))
+
+# Rollup deltas staged at ingest are folded into the agent/path rollups every
+# ROLLUP_FOLD_INTERVAL seconds, this many per transaction.
+ROLLUP_FOLD_BATCH_SIZE = int(os.getenv('ROLLUP_FOLD_BATCH_SIZE', 10000))
+
+# Latency percentiles. Sketches answer within this relative error; changing it
+# requires `manage.py rebuild_rollups`.
+LATENCY_SKETCH_RELATIVE_ACCURACY = float(os.getenv('LATENCY_SKETCH_RELATIVE_ACCURACY', 0.01))
+# mode=auto computes exact percentiles from raw events up to this many events.
+LATENCY_EXACT_MAX_EVENTS = int(os.getenv('LATENCY_EXACT_MAX_EVENTS', 50000))
+
+# backend_event partitioning (see events/partitions.py)
+EVENT_PARTITION_INTERVAL = os.getenv('EVENT_PARTITION_INTERVAL', 'day')  # 'day' or 'week'
+EVENT_PARTITION_PRECREATE_DAYS = int(os.getenv('EVENT_PARTITION_PRECREATE_DAYS', 14))
+# Partitions entirely older than this many days are dropped; 0 keeps everything.
+EVENT_RETENTION_DAYS = int(os.getenv('EVENT_RETENTION_DAYS', 0))
+# Detach expired partitions instead of dropping them, e.g. to archive them first.
+EVENT_RETENTION_DETACH_ONLY = os.getenv('EVENT_RETENTION_DETACH_ONLY', 'False') == 'True'
+
+# Payload storage codec (see events/payload_codec.py): 'plain' or 'zstd'.
+# `manage.py benchmark_payload_codec` reports the ratio on your own payloads.
+EVENT_PAYLOAD_CODEC = os.getenv('EVENT_PAYLOAD_CODEC', 'plain')
+EVENT_PAYLOAD_ZSTD_LEVEL = int(os.getenv('EVENT_PAYLOAD_ZSTD_LEVEL', 3))
+EVENT_PAYLOAD_DICT_SIZE = int(os.getenv('EVENT_PAYLOAD_DICT_SIZE', 32 * 1024))
+# Dictionaries are trained on up to this many payloads of the last
+# EVENT_PAYLOAD_DICT_SAMPLE_DAYS days, for projects with at least the minimum.
+EVENT_PAYLOAD_DICT_SAMPLES = int(os.getenv('EVENT_PAYLOAD_DICT_SAMPLES', 5000))
+EVENT_PAYLOAD_DICT_MIN_SAMPLES = int(os.getenv('EVENT_PAYLOAD_DICT_MIN_SAMPLES', 200))
+EVENT_PAYLOAD_DICT_SAMPLE_DAYS = int(os.getenv('EVENT_PAYLOAD_DICT_SAMPLE_DAYS', 7))
+# A project is retrained once its dictionary compresses recent payloads this
+# much (as a fraction of its ratio when trained) worse.
+EVENT_PAYLOAD_DICT_MAX_DEGRADATION = float(os.getenv('EVENT_PAYLOAD_DICT_MAX_DEGRADATION', 0.1))
+# How long a process keeps using a project's dictionary before checking for a newer one.
+EVENT_PAYLOAD_DICT_CACHE_TTL = int(os.getenv('EVENT_PAYLOAD_DICT_CACHE_TTL', 300))
+
+# Path templates (see events/paths.py). New configured or learned templates
+# apply to ingest within PATH_TEMPLATE_CACHE_TTL seconds.
+PATH_TEMPLATE_CACHE_TTL = int(os.getenv('PATH_TEMPLATE_CACHE_TTL', 300))
+PATH_TEMPLATE_CACHE_MAXSIZE = int(os.getenv('PATH_TEMPLATE_CACHE_MAXSIZE', 100000))
+# A {param} template is learned once this many templates differ only in one segment.
+PATH_TEMPLATE_LEARN_MIN_VARIANTS = int(os.getenv('PATH_TEMPLATE_LEARN_MIN_VARIANTS', 50))
+
+# Live event tail over SSE (see events/live_tail.py), fed by Redis pub/sub.
+LIVE_TAIL_ENABLED = os.getenv('LIVE_TAIL_ENABLED', 'True') == 'True'
+LIVE_TAIL_REDIS_URL = os.getenv('LIVE_TAIL_REDIS_URL', 'redis://localhost:6379/2')
+LIVE_TAIL_HEARTBEAT_SECONDS = float(os.getenv('LIVE_TAIL_HEARTBEAT_SECONDS', 15))
+# Streams end after this long; clients reconnect and resume with Last-Event-ID.
+LIVE_TAIL_MAX_SECONDS = float(os.getenv('LIVE_TAIL_MAX_SECONDS', 900))
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
@@ -165,5 +307,6 @@ CORS_ALLOW_HEADERS = [
     'X-OTAS-AGENT-SESSION-KEY',
     'X-OTAS-SDK-KEY',
     'X-OTAS-AGENT-ID',
-    'X-OTAS-PROJECT-ID'
+    'X-OTAS-PROJECT-ID',
+    'last-event-id',
 ]
@@ -1,16 +1,113 @@
 # decorators.py
+import hmac
+import jwt
 import requests
 import logging
 from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
 from constants import USER_AGENT_AUTHENTICATE_API
+from ttl_cache import TTLCache, MISSING
+from uasam_client import uasam_client
+from events.blocking import run_blocking
 
 logger = logging.getLogger(__name__)
 
+# (user_id, project_id, agent_id) -> (generations, auth context returned by
+# UASAM). Only successful decisions are cached; the user JWT itself is
+# verified locally on every request, so expired or forged tokens never hit
+# the cache. Entries are per process, so revocation goes through generation
+# counters in the shared Django cache instead: UASAM calls
+# AgentUserAuthInvalidateView when a membership, project or agent changes,
+# which bumps the user's, project's or agent's counter, and an entry is only
+# served while the counters it was stored under are unchanged.
+_agent_user_auth_cache = TTLCache(
+    maxsize=getattr(settings, "AGENT_AUTH_CACHE_MAXSIZE", 10000),
+    ttl=getattr(settings, "AGENT_AUTH_CACHE_TTL", 60),
+)
 
-def agent_user_auth_required(view_func):
+_AUTH_GENERATION_PREFIX = "agent_user_auth:gen"
+AUTH_GENERATION_KINDS = ("user", "project", "agent")
+
+
+def _auth_generation_key(kind, object_id):
+    return f"{_AUTH_GENERATION_PREFIX}:{kind}:{str(object_id).lower()}"
+
+
+def _auth_generations(user_id, project_id, agent_id):
+    """
+    Returns the current (user, project, agent) generations, or None when the
+    cache is unreachable, in which case the caller must not trust or store
+    cached decisions.
+    """
+    keys = [
+        _auth_generation_key(kind, object_id)
+        for kind, object_id in zip(AUTH_GENERATION_KINDS, (user_id, project_id, agent_id))
+    ]
+    try:
+        found = cache.get_many(keys)
+    except Exception:
+        logger.warning("Could not read auth cache generations", exc_info=True)
+        return None
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def invalidate_agent_user_auth(user_ids=(), project_ids=(), agent_ids=()):
+    """
+    Drops cached dashboard authorization for the given users, projects and
+    agents in every process.
+    """
+    for kind, object_ids in zip(AUTH_GENERATION_KINDS, (user_ids, project_ids, agent_ids)):
+        for object_id in object_ids:
+            key = _auth_generation_key(kind, object_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+def internal_token_required(view_func):
+    """
+    Restricts an internal endpoint (metrics, auth cache invalidation) to
+    callers presenting INTERNAL_API_TOKEN in X-OTAS-INTERNAL-TOKEN. With no
+    token configured the endpoint answers 404, so it is off unless
+    deliberately enabled.
+    """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
+        expected = getattr(settings, "INTERNAL_API_TOKEN", "")
+        if not expected:
+            return JsonResponse({"status": 0, "status_description": "not_found"}, status=404)
+        token = request.headers.get("X-OTAS-INTERNAL-TOKEN", "")
+        if not hmac.compare_digest(token.encode(), expected.encode()):
+            return JsonResponse({"status": 0, "status_description": "invalid_internal_token"}, status=401)
+        return view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _decode_user_token(user_token):
+    """
+    Verifies the UASAM user JWT locally. Returns the user_id or None.
+    """
+    try:
+        payload = jwt.decode(user_token, settings.JWT_SECRET, algorithms=["HS256"])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return None
+    user_id = payload.get("user_id")
+    return str(user_id) if user_id else None
+
+
+def agent_user_auth_required(view_func):
+    """
+    Authorizes the dashboard user for the agent named in the request headers
+    and attaches auth_user_id / auth_agent_id / auth_agent_name /
+    auth_project_id to the request. For async views: put it on dispatch of a
+    View whose handlers are async.
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
         user_token = request.headers.get("X-OTAS-USER-TOKEN")
         agent_id = request.headers.get("X-OTAS-AGENT-ID")
         project_id = request.headers.get("X-OTAS-PROJECT-ID")
@@ -22,35 +119,64 @@ def agent_user_auth_required(view_func):
         if not project_id:
             return JsonResponse({"status": 0, "status_description": "missing_project_id"}, status=400)
 
-        # Call the authenticate API
-        try:
-            response = requests.post(
-                USER_AGENT_AUTHENTICATE_API,
-                headers={
-                    "X-OTAS-USER-TOKEN": user_token,
-                    "X-OTAS-AGENT-ID": agent_id,
-                    "X-OTAS-PROJECT-ID": project_id,
-                },
-                timeout=5,
-            )
-        except requests.exceptions.Timeout:
-            logger.exception("Auth service timeout")
-            return JsonResponse({"status": 0, "status_description": "auth_service_timeout"}, status=503)
-        except requests.exceptions.RequestException:
-            logger.exception("Auth service unreachable")
-            return JsonResponse({"status": 0, "status_description": "auth_service_error"}, status=503)
-
-        # Non-200 from auth service → pass it straight back to caller
-        if response.status_code != 200:
-            print(f"response: {response}")
-            return JsonResponse(response.json(), status=response.status_code)
+        user_id = _decode_user_token(user_token)
+        if not user_id:
+            return JsonResponse({"status": 0, "status_description": "invalid_token"}, status=401)
+
+        cache_key = (user_id, project_id, agent_id)
+        generations = await run_blocking(_auth_generations, user_id, project_id, agent_id)
+        auth_context = MISSING
+        if generations is not None:
+            cached = _agent_user_auth_cache.get(cache_key)
+            if cached is not MISSING and cached[0] == generations:
+                auth_context = cached[1]
+
+        if auth_context is MISSING:
+            # Call the authenticate API
+            try:
+                response = await uasam_client.apost(
+                    USER_AGENT_AUTHENTICATE_API,
+                    headers={
+                        "X-OTAS-USER-TOKEN": user_token,
+                        "X-OTAS-AGENT-ID": agent_id,
+                        "X-OTAS-PROJECT-ID": project_id,
+                    },
+                )
+            except requests.exceptions.Timeout:
+                logger.exception("Auth service timeout")
+                return JsonResponse({"status": 0, "status_description": "auth_service_timeout"}, status=503)
+            except requests.exceptions.RequestException:
+                logger.exception("Auth service unreachable")
+                return JsonResponse({"status": 0, "status_description": "auth_service_error"}, status=503)
+
+            try:
+                data = response.json()
+                if response.status_code == 200:
+                    auth_context = {
+                        "agent_id": data["agent"]["id"],
+                        "agent_name": data["agent"]["name"],
+                        "project_id": data["agent"]["project_id"],
+                    }
+                elif not isinstance(data, dict):
+                    raise TypeError("error body is not a JSON object")
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Unexpected auth service response: %s %.200r", response.status_code, response.text)
+                return JsonResponse({"status": 0, "status_description": "auth_service_error"}, status=503)
+
+            # Non-200 from auth service → pass it straight back to caller
+            if response.status_code != 200:
+                logger.warning("Auth service rejected agent %s: %s", agent_id, response.status_code)
+                return JsonResponse(data, status=response.status_code)
+
+            if generations is not None:
+                _agent_user_auth_cache.set(cache_key, (generations, auth_context))
 
         # Attach auth context to request
-        data = response.json()
-        request.auth_agent_id = data["agent"]["id"]
-        request.auth_agent_name = data["agent"]["name"]
-        request.auth_project_id = data["agent"]["project_id"]
+        request.auth_user_id = user_id
+        request.auth_agent_id = auth_context["agent_id"]
+        request.auth_agent_name = auth_context["agent_name"]
+        request.auth_project_id = auth_context["project_id"]
 
-        return view_func(request, *args, **kwargs)
+        return await view_func(request, *args, **kwargs)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
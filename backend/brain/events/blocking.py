@@ -0,0 +1,109 @@
+"""
+Blocking work (ORM queries, Redis calls) for the async views.
+
+Under ASGI, Django runs sync code for every request on one shared thread, so
+the async views hand their database and cache work to a dedicated pool of
+ASYNC_DB_POOL_SIZE threads instead. The pool size bounds the number of
+Postgres connections a process opens, however many requests are in flight;
+requests beyond it wait on the event loop without holding a thread.
+
+Streams (iterate_blocking) keep a server-side cursor open on one thread for
+their whole length, so they get a separate pool of ASYNC_STREAM_POOL_SIZE
+threads; further streams wait for one to free up.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+ASYNC_DB_POOL_SIZE = getattr(settings, 'ASYNC_DB_POOL_SIZE', 20)
+ASYNC_STREAM_POOL_SIZE = getattr(settings, 'ASYNC_STREAM_POOL_SIZE', 4)
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_POOL_SIZE, thread_name_prefix='brain-db')
+
+# One single-thread executor per stream slot: every step of a stream must run
+# on the thread holding its cursor. Built by _stream_pool for the running loop.
+_stream_loop = None
+_stream_slots = None
+_stream_executors = []
+
+_DONE = object()
+
+
+def _call(func, args, kwargs):
+    # Pool threads never see request_started/request_finished, so apply
+    # CONN_MAX_AGE and drop broken connections around each call instead.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on the pool and returns its result.
+    """
+    return await sync_to_async(_call, thread_sensitive=False, executor=_executor)(func, args, kwargs)
+
+
+def _stream_pool():
+    """
+    Returns the stream semaphore and free executors for the running loop.
+    An asyncio.Semaphore belongs to the loop it is first awaited on, so a new
+    loop (a restarted server, or each async_to_sync call in tests) gets a new
+    pool; the old loop's free executors are shut down.
+    """
+    global _stream_loop, _stream_slots, _stream_executors
+    loop = asyncio.get_running_loop()
+    if _stream_loop is not loop:
+        for executor in _stream_executors:
+            executor.shutdown(wait=False)
+        _stream_loop = loop
+        _stream_slots = asyncio.Semaphore(ASYNC_STREAM_POOL_SIZE)
+        _stream_executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='brain-stream')
+            for _ in range(ASYNC_STREAM_POOL_SIZE)
+        ]
+    return _stream_slots, _stream_executors
+
+
+def _next(iterator):
+    return next(iterator, _DONE)
+
+
+def _close(iterator):
+    try:
+        close = getattr(iterator, 'close', None)
+        if close:
+            close()
+    finally:
+        connections.close_all()
+
+
+async def iterate_blocking(iterable):
+    """
+    Async iterator over a blocking iterable, e.g. a streaming response body
+    reading from a server-side cursor. Holds one of the ASYNC_STREAM_POOL_SIZE
+    stream threads, waiting for one if all are busy, and runs every step on
+    it, since the cursor belongs to that thread's connection.
+    """
+    slots, executors = _stream_pool()
+    async with slots:
+        executor = executors.pop()
+        step = sync_to_async(_next, thread_sensitive=False, executor=executor)
+        iterator = iter(iterable)
+        try:
+            while (item := await step(iterator)) is not _DONE:
+                yield item
+        finally:
+            try:
+                await sync_to_async(_close, thread_sensitive=False, executor=executor)(iterator)
+            finally:
+                if executors is _stream_executors:
+                    executors.append(executor)
+                else:
+                    # The pool was replaced for another loop while streaming.
+                    executor.shutdown(wait=False)
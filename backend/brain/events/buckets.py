@@ -0,0 +1,196 @@
+"""
+Dense, fixed-width time-bucketed series for the agent analytics views.
+
+Buckets are aligned with date_bin() to a Monday-midnight-UTC origin, so
+week buckets start on Mondays and every other size starts on a whole
+minute/hour/day. Each query aggregates the narrowest source that has the
+resolution (raw events for minute/5m, agent_path_hourly_rollup for hour,
+agent_path_daily_rollup for day/week) and LEFT JOINs the result onto a
+generate_series() of every bucket, so empty buckets come back as zeros.
+"""
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+
+from .models import AgentPathDailyRollup, AgentPathHourlyRollup
+from .sketch import DDSketch
+
+ANALYTICS_MAX_BUCKETS = getattr(settings, 'ANALYTICS_MAX_BUCKETS', 2000)
+ANALYTICS_MAX_PATH_BUCKETS = getattr(settings, 'ANALYTICS_MAX_PATH_BUCKETS', 50000)
+
+Bucket = namedtuple('Bucket', 'step source')
+
+BUCKETS = {
+    'minute': Bucket(timedelta(minutes=1), 'raw'),
+    '5m': Bucket(timedelta(minutes=5), 'raw'),
+    'hour': Bucket(timedelta(hours=1), 'hourly'),
+    'day': Bucket(timedelta(days=1), 'daily'),
+    'week': Bucket(timedelta(weeks=1), 'daily'),
+}
+
+ORIGIN = datetime(2000, 1, 3, tzinfo=dt_timezone.utc)  # a Monday
+
+# Per source: (FROM clause, timestamp column fed to date_bin, WHERE clause).
+_SOURCES = {
+    'raw': (
+        'backend_event',
+        'event_time',
+        'agent_id = %(agent_id)s AND event_date >= %(start_date)s AND event_date <= %(end_date)s '
+        'AND event_time >= %(start)s AND event_time < %(end)s',
+    ),
+    'hourly': (
+        AgentPathHourlyRollup._meta.db_table,
+        'bucket',
+        'agent_id = %(agent_id)s AND bucket >= %(start)s AND bucket < %(end)s',
+    ),
+    'daily': (
+        AgentPathDailyRollup._meta.db_table,
+        "(event_date::timestamp AT TIME ZONE 'UTC')",
+        'agent_id = %(agent_id)s AND event_date >= %(start_date)s AND event_date <= %(end_date)s',
+    ),
+}
+
+_COUNT_METRICS = {
+    'raw': [
+        ('request_count', 'count(*)'),
+        ('error_count', "count(*) FILTER (WHERE error IS NOT NULL AND error <> '')"),
+    ],
+    'hourly': [
+        ('request_count', 'sum(request_count)'),
+        ('error_count', 'sum(error_count)'),
+    ],
+}
+_COUNT_METRICS['daily'] = _COUNT_METRICS['hourly']
+
+
+class BucketError(ValueError):
+    pass
+
+
+def bucket_range(bucket, start, end):
+    """
+    Aligns the [start, end) datetimes outward to bucket boundaries.
+    Raises BucketError for an unknown bucket or too many buckets.
+    Returns (aligned_start, aligned_end, number of buckets).
+    """
+    if bucket not in BUCKETS:
+        raise BucketError('bucket must be one of ' + ', '.join(BUCKETS))
+    step = BUCKETS[bucket].step
+    aligned_start = ORIGIN + ((start - ORIGIN) // step) * step
+    aligned_end = ORIGIN - ((ORIGIN - end) // step) * step
+    count = (aligned_end - aligned_start) // step
+    if count > ANALYTICS_MAX_BUCKETS:
+        raise BucketError(
+            f'too many buckets ({count} > {ANALYTICS_MAX_BUCKETS}); '
+            f'narrow the range or use a coarser bucket'
+        )
+    return aligned_start, aligned_end, count
+
+
+def _series(bucket, source, agent_id, start, end, metrics, group_by_path=False, params=None):
+    """
+    Runs the aggregate of `metrics` [(name, sql)] over source, zero-filled
+    onto every bucket in the already aligned [start, end). Returns rows of
+    (bucket, [path_id,] metric values...) ordered by [path_id,] bucket; metric
+    values are NULL for empty buckets.
+    group_by_path returns a series per path, so it raises BucketError when
+    paths x buckets exceeds ANALYTICS_MAX_PATH_BUCKETS.
+    """
+    step = BUCKETS[bucket].step
+    table, time_column, where = _SOURCES[source]
+    params = {
+        **(params or {}),
+        'agent_id': agent_id,
+        'start': start,
+        'end': end,
+        'start_date': start.date(),
+        'end_date': (end - timedelta(microseconds=1)).date(),
+        'step': step,
+        'origin': ORIGIN,
+        'last': end - step,
+    }
+    group_columns = 'bucket, path_id' if group_by_path else 'bucket'
+    aggregated = (
+        f"SELECT date_bin(%(step)s, {time_column}, %(origin)s) AS bucket"
+        f"{', path_id' if group_by_path else ''}, "
+        + ', '.join(f'{sql} AS {name}' for name, sql in metrics)
+        + f" FROM {table} WHERE {where} GROUP BY {group_columns}"
+    )
+    series = 'generate_series(%(start)s::timestamptz, %(last)s::timestamptz, %(step)s) AS series(bucket)'
+    selected = ', '.join(f'agg.{name}' for name, _ in metrics)
+    if group_by_path:
+        sql = (
+            f"WITH agg AS ({aggregated}) "
+            f"SELECT series.bucket, paths.path_id, {selected} "
+            f"FROM (SELECT DISTINCT path_id FROM agg) paths CROSS JOIN {series} "
+            f"LEFT JOIN agg ON agg.path_id = paths.path_id AND agg.bucket = series.bucket "
+            f"ORDER BY paths.path_id, series.bucket"
+        )
+    else:
+        sql = (
+            f"WITH agg AS ({aggregated}) "
+            f"SELECT series.bucket, {selected} FROM {series} "
+            f"LEFT JOIN agg ON agg.bucket = series.bucket ORDER BY series.bucket"
+        )
+    with connection.cursor() as cursor:
+        if group_by_path:
+            cursor.execute(f"SELECT count(DISTINCT path_id) FROM {table} WHERE {where}", params)
+            paths = cursor.fetchone()[0]
+            count = (end - start) // step
+            if paths * count > ANALYTICS_MAX_PATH_BUCKETS:
+                raise BucketError(
+                    f'too many buckets ({paths} paths x {count} > {ANALYTICS_MAX_PATH_BUCKETS}); '
+                    f'narrow the range or use a coarser bucket'
+                )
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def bucket_counts(agent_id, bucket, start, end, group_by_path=False):
+    """
+    Dense series of request and error counts over the aligned [start, end).
+    Returns dicts with bucket (and path_id when group_by_path), request_count
+    and error_count. Raises BucketError when group_by_path has too many
+    paths for the range.
+    """
+    source = BUCKETS[bucket].source
+    metrics = _COUNT_METRICS[source]
+    results = []
+    for row in _series(bucket, source, agent_id, start, end, metrics, group_by_path):
+        item = {'bucket': row[0]}
+        if group_by_path:
+            item['path_id'] = row[1]
+        for (name, _), value in zip(metrics, row[2 if group_by_path else 1:]):
+            item[name] = int(value or 0)
+        results.append(item)
+    return results
+
+
+def bucket_percentiles(agent_id, bucket, start, end, quantiles, exact=False):
+    """
+    Dense series of latency quantiles over the aligned [start, end). Raw
+    resolution buckets, or exact=True, use PERCENTILE_CONT over raw events;
+    coarser buckets merge rollup DDSketches.
+    Returns (mode, [(bucket, [value or None per quantile])]).
+    """
+    source = 'raw' if exact else BUCKETS[bucket].source
+    if source == 'raw':
+        metrics = [('q', 'percentile_cont(%(quantiles)s::float8[]) WITHIN GROUP (ORDER BY latency_ms)')]
+    else:
+        metrics = [('sketch', 'ddsketch_merge_agg(latency_sketch)')]
+    rows = _series(bucket, source, agent_id, start, end, metrics, params={'quantiles': list(quantiles)})
+
+    series = []
+    for bucket_start, value in rows:
+        if value is None:
+            values = [None] * len(quantiles)
+        elif source == 'raw':
+            values = list(value)
+        else:
+            sketch = DDSketch(json.loads(value) if isinstance(value, str) else value)
+            values = [sketch.quantile(quantile) for quantile in quantiles]
+        series.append((bucket_start, values))
+    return ('exact' if source == 'raw' else 'sketch'), series
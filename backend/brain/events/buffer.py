@@ -0,0 +1,317 @@
+"""
+Redis-backed ingest buffer.
+
+In buffered ingest mode the capture views push validated events onto a Redis
+list and return 202; the flush_event_buffer Celery task drains the list in
+bounded batches and writes each batch with one bulk insert.
+
+A flush claims each batch with LMOVE into a processing list of its own and
+holds a lease (EVENT_BUFFER_CLAIM_TIMEOUT) while writing it. The processing
+list is only emptied once the batch is committed, requeued or dead-lettered,
+so a worker dying mid-batch loses nothing: once its lease expires,
+recover_stale_claims() puts the batch back at the head of the buffer. Events
+whose insert had already committed are skipped when they come round again.
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+
+import redis
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from django.utils import timezone
+
+from .models import BackendEvent
+from .utils import bulk_save_events
+
+logger = logging.getLogger(__name__)
+
+EVENT_INGEST_MODE = getattr(settings, 'EVENT_INGEST_MODE', 'sync')
+EVENT_BUFFER_REDIS_URL = getattr(settings, 'EVENT_BUFFER_REDIS_URL', 'redis://localhost:6379/2')
+EVENT_BUFFER_KEY = getattr(settings, 'EVENT_BUFFER_KEY', 'brain:ingest:events')
+EVENT_BUFFER_FLUSH_BATCH_SIZE = getattr(settings, 'EVENT_BUFFER_FLUSH_BATCH_SIZE', 500)
+EVENT_BUFFER_FLUSH_MAX_SECONDS = getattr(settings, 'EVENT_BUFFER_FLUSH_MAX_SECONDS', 5)
+EVENT_BUFFER_MAX_ATTEMPTS = getattr(settings, 'EVENT_BUFFER_MAX_ATTEMPTS', 5)
+EVENT_BUFFER_CLAIM_TIMEOUT = getattr(settings, 'EVENT_BUFFER_CLAIM_TIMEOUT', 300)
+
+DEAD_LETTER_KEY = f'{EVENT_BUFFER_KEY}:dead'
+STATS_KEY = f'{EVENT_BUFFER_KEY}:stats'
+# Set of flush ids with a claim; each has a processing list and a lease key.
+WORKERS_KEY = f'{EVENT_BUFFER_KEY}:workers'
+
+# Errors that say nothing about the events themselves: the batch is retried.
+_TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+_client = None
+
+
+def is_buffered_ingest():
+    return EVENT_INGEST_MODE == 'buffered'
+
+
+def get_buffer_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(EVENT_BUFFER_REDIS_URL)
+    return _client
+
+
+def _encode(event_kwargs, enqueued_at, attempts=0):
+    event = dict(event_kwargs)
+    event['event_id'] = str(event['event_id'])
+    event['event_time'] = event['event_time'].isoformat()
+    return json.dumps({'enqueued_at': enqueued_at, 'attempts': attempts, 'event': event})
+
+
+def _decode(raw):
+    envelope = json.loads(raw)
+    event = envelope['event']
+    event['event_id'] = uuid.UUID(event['event_id'])
+    event['event_time'] = datetime.fromisoformat(event['event_time'])
+    return envelope, event
+
+
+def enqueue_events(event_kwargs_list):
+    """
+    Pushes events onto the ingest buffer with one RPUSH.
+    event_id and event_time are assigned here so the caller can acknowledge
+    the events before they reach Postgres. Returns the event ids in order.
+    Raises redis.RedisError if the buffer is unavailable.
+    """
+    now = timezone.now()
+    enqueued_at = time.time()
+    payloads = []
+    event_ids = []
+    for event_kwargs in event_kwargs_list:
+        event_kwargs.setdefault('event_id', uuid.uuid4())
+        event_kwargs.setdefault('event_time', now)
+        payloads.append(_encode(event_kwargs, enqueued_at))
+        event_ids.append(event_kwargs['event_id'])
+    get_buffer_client().rpush(EVENT_BUFFER_KEY, *payloads)
+    return event_ids
+
+
+def save_or_enqueue_events(event_kwargs_list):
+    """
+    Entry point for the capture views.
+    In buffered mode the events are queued; if Redis is unavailable they are
+    written synchronously instead so the request is not lost.
+    Returns (event_ids, queued).
+    """
+    if is_buffered_ingest():
+        try:
+            return enqueue_events(event_kwargs_list), True
+        except redis.RedisError:
+            logger.warning('Ingest buffer unavailable, writing %d events synchronously', len(event_kwargs_list))
+    events = bulk_save_events(event_kwargs_list)
+    return [event.event_id for event in events], False
+
+
+def _processing_key(worker):
+    return f'{EVENT_BUFFER_KEY}:processing:{worker}'
+
+
+def _lease_key(worker):
+    return f'{EVENT_BUFFER_KEY}:lease:{worker}'
+
+
+def _claim(client, worker, batch_size):
+    """
+    Moves up to batch_size events from the head of the buffer to worker's
+    processing list, renewing its lease. Returns the raw events in order.
+    """
+    pipe = client.pipeline(transaction=False)
+    pipe.set(_lease_key(worker), 1, ex=EVENT_BUFFER_CLAIM_TIMEOUT)
+    pipe.sadd(WORKERS_KEY, worker)
+    for _ in range(batch_size):
+        pipe.lmove(EVENT_BUFFER_KEY, _processing_key(worker), 'LEFT', 'RIGHT')
+    return [raw for raw in pipe.execute()[2:] if raw is not None]
+
+
+def _release(client, worker):
+    """
+    Drops worker's lease once its processing list is empty. A non-empty list
+    is left to recover_stale_claims().
+    """
+    if not client.llen(_processing_key(worker)):
+        pipe = client.pipeline()
+        pipe.delete(_lease_key(worker))
+        pipe.srem(WORKERS_KEY, worker)
+        pipe.execute()
+
+
+def recover_stale_claims():
+    """
+    Moves the events of flushes whose lease expired (the worker died or hung
+    mid-batch) back to the head of the buffer, in their original order.
+    Returns the number of events recovered.
+    """
+    client = get_buffer_client()
+    recovered = 0
+    for worker in client.smembers(WORKERS_KEY):
+        worker = worker.decode()
+        if client.exists(_lease_key(worker)):
+            continue
+        processing = _processing_key(worker)
+        # Tail first onto the head, so the batch keeps its order.
+        while client.lmove(processing, EVENT_BUFFER_KEY, 'RIGHT', 'LEFT') is not None:
+            recovered += 1
+        client.srem(WORKERS_KEY, worker)
+    if recovered:
+        logger.warning('Recovered %d ingest buffer events from expired claims', recovered)
+    return recovered
+
+
+def _finish(client, worker, retry=(), dead=(), dead_raw=()):
+    """
+    Ends worker's batch in one MULTI: events to retry go back to the head of
+    the buffer (dead-lettered once they exhaust EVENT_BUFFER_MAX_ATTEMPTS),
+    dead events go to the dead-letter list, and the processing list is
+    emptied.
+    """
+    requeue, dead_payloads = [], list(dead_raw)
+    for envelope, event in retry:
+        attempts = envelope.get('attempts', 0) + 1
+        payload = _encode(event, envelope['enqueued_at'], attempts)
+        (dead_payloads if attempts >= EVENT_BUFFER_MAX_ATTEMPTS else requeue).append(payload)
+    dead_payloads += [_encode(event, envelope['enqueued_at'], envelope.get('attempts', 0) + 1) for envelope, event in dead]
+    pipe = client.pipeline()
+    if requeue:
+        pipe.lpush(EVENT_BUFFER_KEY, *reversed(requeue))
+    if dead_payloads:
+        pipe.rpush(DEAD_LETTER_KEY, *dead_payloads)
+    pipe.delete(_processing_key(worker))
+    pipe.execute()
+    if dead_payloads:
+        logger.error('Moved %d events to the ingest dead-letter list', len(dead_payloads))
+
+
+def _already_saved(events):
+    """
+    The ids of events that are already in backend_event: batches recovered
+    from a worker that died after its commit.
+    """
+    return set(BackendEvent.objects.filter(
+        event_id__in=[event['event_id'] for event in events],
+        event_date__in={event['event_time'].date() for event in events},
+    ).values_list('event_id', flat=True))
+
+
+def _save(envelopes, dead):
+    """
+    Writes the events of envelopes. A failing batch is bisected, so the
+    events that are fine get written and only those failing on their own are
+    appended to dead. Transient database errors propagate.
+    Returns the number of events written.
+    """
+    try:
+        bulk_save_events([event for _, event in envelopes])
+        return len(envelopes)
+    except _TRANSIENT_ERRORS:
+        raise
+    except Exception:
+        if len(envelopes) == 1:
+            logger.exception('Ingest buffer event %s cannot be written', envelopes[0][1]['event_id'])
+            dead.append(envelopes[0])
+            return 0
+    middle = len(envelopes) // 2
+    return _save(envelopes[:middle], dead) + _save(envelopes[middle:], dead)
+
+
+def flush_event_buffer(batch_size=None, max_seconds=None):
+    """
+    Drains the ingest buffer in batches of at most batch_size events until it
+    is empty or max_seconds have elapsed. Safe to run from several workers at
+    once: LMOVE hands each event to exactly one of them.
+    Events that cannot be written go to the dead-letter list on their own;
+    after a transient database error the batch is requeued and the flush
+    stops. Returns the number of events written.
+    """
+    batch_size = batch_size or EVENT_BUFFER_FLUSH_BATCH_SIZE
+    max_seconds = max_seconds or EVENT_BUFFER_FLUSH_MAX_SECONDS
+    client = get_buffer_client()
+    deadline = time.monotonic() + max_seconds
+    worker = uuid.uuid4().hex
+    flushed = 0
+
+    recover_stale_claims()
+    try:
+        while time.monotonic() < deadline:
+            raw_batch = _claim(client, worker, batch_size)
+            if not raw_batch:
+                break
+
+            envelopes, dead_raw = [], []
+            for raw in raw_batch:
+                try:
+                    envelopes.append(_decode(raw))
+                except (ValueError, KeyError, TypeError):
+                    dead_raw.append(raw)
+
+            dead = []
+            try:
+                saved = _already_saved([event for _, event in envelopes]) if envelopes else set()
+                pending = [(envelope, event) for envelope, event in envelopes if event['event_id'] not in saved]
+                written = _save(pending, dead) if pending else 0
+            except Exception:
+                logger.exception('Ingest buffer flush failed, requeueing %d events', len(envelopes))
+                _finish(client, worker, retry=envelopes, dead_raw=dead_raw)
+                break
+            _finish(client, worker, dead=dead, dead_raw=dead_raw)
+
+            flushed += written
+            flush_lag = time.time() - min((envelope['enqueued_at'] for envelope, _ in envelopes), default=time.time())
+            pipe = client.pipeline()
+            pipe.hset(STATS_KEY, mapping={
+                'last_flush_at': time.time(),
+                'last_flush_count': written,
+                'last_flush_lag_seconds': round(flush_lag, 3),
+            })
+            pipe.hincrby(STATS_KEY, 'flushed_total', written)
+            pipe.execute()
+
+            if len(raw_batch) < batch_size:
+                break
+    finally:
+        _release(client, worker)
+
+    return flushed
+
+
+def get_buffer_metrics():
+    """
+    Queue depth, age of the oldest buffered event, events claimed by flushes
+    in progress (or by dead workers awaiting recovery) and stats from the
+    last flush.
+    """
+    client = get_buffer_client()
+    pipe = client.pipeline()
+    pipe.llen(EVENT_BUFFER_KEY)
+    pipe.lindex(EVENT_BUFFER_KEY, 0)
+    pipe.llen(DEAD_LETTER_KEY)
+    pipe.hgetall(STATS_KEY)
+    pipe.smembers(WORKERS_KEY)
+    depth, oldest, dead_depth, stats, workers = pipe.execute()
+    pipe = client.pipeline()
+    for worker in workers:
+        pipe.llen(_processing_key(worker.decode()))
+    in_flight = sum(pipe.execute())
+
+    oldest_age = None
+    if oldest:
+        oldest_age = round(time.time() - json.loads(oldest)['enqueued_at'], 3)
+
+    stats = {k.decode(): v.decode() for k, v in stats.items()}
+    return {
+        'ingest_mode': EVENT_INGEST_MODE,
+        'queue_depth': depth,
+        'oldest_event_age_seconds': oldest_age,
+        'in_flight': in_flight,
+        'dead_letter_depth': dead_depth,
+        'flushed_total': int(stats.get('flushed_total', 0)),
+        'last_flush_at': float(stats['last_flush_at']) if 'last_flush_at' in stats else None,
+        'last_flush_count': int(stats['last_flush_count']) if 'last_flush_count' in stats else None,
+        'last_flush_lag_seconds': float(stats['last_flush_lag_seconds']) if 'last_flush_lag_seconds' in stats else None,
+    }
@@ -0,0 +1,128 @@
+"""
+Streaming export of BackendEvent rows as NDJSON or CSV.
+
+Rows are read through a server-side cursor (QuerySet.iterator) and encoded
+into ~64 KiB blocks, optionally gzip-compressed on the fly, so memory use is
+bounded by EVENT_EXPORT_CHUNK_SIZE rows whatever the size of the export.
+Shared by EventExportView and the export_events management command.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import BackendEvent, PAYLOAD_FIELDS
+from .utils import EVENT_FIELDS, payload_prefetch, serialize_backend_event
+
+EVENT_EXPORT_CHUNK_SIZE = getattr(settings, 'EVENT_EXPORT_CHUNK_SIZE', 2000)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+_BLOCK_SIZE = 64 * 1024
+# Fields stored as JSON; CSV writes them as JSON text.
+_JSON_FIELDS = ('custom_properties', 'metadata')
+
+
+def export_queryset(*, project_id=None, agent_id=None, session_id=None, start=None, end=None, fields=None):
+    """
+    Events matching every given filter, in (event_time, event_id) order.
+    start/end are inclusive event dates, which lets Postgres prune partitions.
+    Payloads are prefetched per chunk when fields (default: all) include any.
+    """
+    qs = BackendEvent.objects.all()
+    if project_id:
+        qs = qs.filter(project_id=project_id)
+    if agent_id:
+        qs = qs.filter(agent_id=agent_id)
+    if session_id:
+        qs = qs.filter(agent_session_id=session_id)
+    if start:
+        qs = qs.filter(event_date__gte=start)
+    if end:
+        qs = qs.filter(event_date__lte=end)
+    if fields:
+        qs = qs.only(*[field for field in fields if field not in PAYLOAD_FIELDS])
+    if not fields or any(field in PAYLOAD_FIELDS for field in fields):
+        qs = qs.prefetch_related(payload_prefetch(start, end))
+    return qs.order_by('event_time', 'event_id')
+
+
+def resolve_fields(raw_fields):
+    """
+    Parses a comma-separated field list into export columns; None means all.
+    Raises ValueError naming any unknown field.
+    """
+    if not raw_fields:
+        return None
+    requested = [field.strip() for field in raw_fields.split(',') if field.strip()]
+    unknown = sorted(set(requested) - set(EVENT_FIELDS))
+    if unknown:
+        raise ValueError('unknown fields: ' + ', '.join(unknown))
+    return list(dict.fromkeys(requested)) or None
+
+
+def _ndjson_lines(events, fields):
+    for event in events:
+        yield json.dumps(serialize_backend_event(event, fields), cls=DjangoJSONEncoder) + '\n'
+
+
+def _csv_lines(events, fields):
+    columns = fields or list(EVENT_FIELDS)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def line(values):
+        writer.writerow(values)
+        text = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return text
+
+    yield line(columns)
+    for event in events:
+        row = serialize_backend_event(event, columns)
+        yield line([
+            json.dumps(row[column]) if column in _JSON_FIELDS and row[column] is not None
+            else ('' if row[column] is None else row[column])
+            for column in columns
+        ])
+
+
+def _blocks(lines):
+    block = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        block.append(data)
+        size += len(data)
+        if size >= _BLOCK_SIZE:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+def _gzip(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_events(qs, fmt, fields=None, compress=False):
+    """
+    Yields the encoded export of qs as bytes blocks.
+    """
+    events = qs.iterator(chunk_size=EVENT_EXPORT_CHUNK_SIZE)
+    lines = _csv_lines(events, fields) if fmt == 'csv' else _ndjson_lines(events, fields)
+    blocks = _blocks(lines)
+    return _gzip(blocks) if compress else blocks
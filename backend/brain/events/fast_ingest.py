@@ -0,0 +1,147 @@
+"""
+Bare ASGI application for the single-event ingest endpoints.
+
+Every SDK and agent log POST otherwise goes through Django's full request
+handling:
+    - the request_started/finished signals;
+    - a HttpRequest built from the scope;
+    - the session, auth, messages, CSRF and CORS middleware;
+    - URL resolving and a JsonResponse.
+The ingest endpoints use none of that. IngestApplication wraps the Django
+application (brain/asgi.py). It answers POSTs to BackendEventCaptureView's
+and AgentEventCaptureView's paths itself:
+    - it reads the auth headers in one pass over the raw scope headers;
+    - it decodes the body bytes directly;
+    - it runs the same capture coroutines as those views (events/ingest.py);
+    - it writes a JSON response.
+Everything else goes to Django, including:
+    - other methods on these paths, e.g. CORS preflights;
+    - requests with an Origin header, so browsers still get the CORS headers;
+    - lifespan events.
+Database work still runs on the events/blocking.py pool, which manages its
+own connections, so the request signals are not needed.
+
+FAST_INGEST_ENABLED = False serves every request through Django.
+`manage.py benchmark_ingest` compares the two paths.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.urls import reverse
+
+from .ingest import capture_agent_event, capture_sdk_event
+
+logger = logging.getLogger(__name__)
+
+FAST_INGEST_ENABLED = getattr(settings, 'FAST_INGEST_ENABLED', True)
+
+_SESSION_TOKEN = b'x-otas-agent-session-token'
+_ORIGIN = b'origin'
+
+_CAPTURE_FAILED = (500, {'status': 0, 'status_description': 'event_capture_failed'})
+_TOO_LARGE = (413, {'status': 0, 'status_description': 'request_too_large'})
+
+
+def _static_headers():
+    """
+    The headers Django's security and clickjacking middleware add to every
+    response under the current settings.
+    """
+    headers = [(b'content-type', b'application/json')]
+    if getattr(settings, 'SECURE_CONTENT_TYPE_NOSNIFF', True):
+        headers.append((b'x-content-type-options', b'nosniff'))
+    referrer_policy = getattr(settings, 'SECURE_REFERRER_POLICY', 'same-origin')
+    if referrer_policy:
+        if not isinstance(referrer_policy, str):
+            referrer_policy = ','.join(referrer_policy)
+        headers.append((b'referrer-policy', referrer_policy.encode()))
+    opener_policy = getattr(settings, 'SECURE_CROSS_ORIGIN_OPENER_POLICY', 'same-origin')
+    if opener_policy:
+        headers.append((b'cross-origin-opener-policy', opener_policy.encode()))
+    headers.append((b'x-frame-options', getattr(settings, 'X_FRAME_OPTIONS', 'DENY').upper().encode()))
+    return headers
+
+
+class IngestApplication:
+    """
+    ASGI application serving the single-event ingest POSTs and passing every
+    other request to django_application.
+    """
+
+    def __init__(self, django_application):
+        self.django_application = django_application
+        # path -> (lowercase auth key header, capture coroutine)
+        self.routes = {
+            reverse('backend-sdk-event-capture'): (b'x-otas-sdk-key', capture_sdk_event),
+            reverse('agent-event-capture'): (b'x-otas-agent-key', capture_agent_event),
+        }
+        self.max_body_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        self.headers = _static_headers()
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get(scope.get('path')) if scope['type'] == 'http' else None
+        if route is None or scope['method'] != 'POST':
+            return await self.django_application(scope, receive, send)
+
+        key_header, capture = route
+        key = token = None
+        for name, value in scope['headers']:
+            if name == key_header:
+                key = value.decode('latin-1')
+            elif name == _SESSION_TOKEN:
+                token = value.decode('latin-1')
+            elif name == _ORIGIN:
+                return await self.django_application(scope, receive, send)
+
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        if body is False:
+            status, data = _TOO_LARGE
+        else:
+            try:
+                status, data = await capture(key, token, body)
+            except Exception:
+                logger.exception('Event capture failed')
+                status, data = _CAPTURE_FAILED
+        await self._respond(send, status, data)
+
+    async def _read_body(self, receive):
+        """
+        The request body, False if it exceeds DATA_UPLOAD_MAX_MEMORY_SIZE, or
+        None if the client disconnected.
+        """
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body_size is not None and size > self.max_body_size:
+                return False
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    async def _respond(self, send, status, data):
+        body = json.dumps(data, separators=(',', ':')).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [*self.headers, (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def wrap(django_application):
+    """
+    The brain ASGI application: django_application behind IngestApplication,
+    or unchanged with FAST_INGEST_ENABLED = False.
+    """
+    if not FAST_INGEST_ENABLED:
+        return django_application
+    return IngestApplication(django_application)
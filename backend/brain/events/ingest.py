@@ -0,0 +1,178 @@
+"""
+Single-event capture for the SDK and agent log endpoints.
+
+BackendEventCaptureView and AgentEventCaptureView, and the bare ASGI ingest
+app in front of Django (events/fast_ingest.py), run these same coroutines,
+so both return the same responses. Each takes the raw auth header values and
+the raw request body, and returns (HTTP status, response dict).
+"""
+import json
+import logging
+
+from .blocking import run_blocking
+from .buffer import is_buffered_ingest, save_or_enqueue_events
+from .utils import validate_agent_session_token, averify_sdk_key, avalidate_agent_key
+from .utils import build_event_and_save, build_agent_event_and_save, build_event_kwargs, validate_event_item
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ['project_id', 'path', 'method', 'status_code', 'latency_ms']
+
+OPTIONAL_FIELDS = [
+    'request_size_bytes', 'response_size_bytes',
+    'request_headers', 'request_body', 'query_params', 'post_data',
+    'response_headers', 'response_body',
+    'request_content_type', 'response_content_type',
+    'custom_properties', 'error', 'metadata',
+]
+
+_CAPTURE_FAILED = {
+    'status': 0,
+    'status_description': 'event_capture_failed',
+}
+
+
+def _rejected(status_description):
+    return {
+        'status': 0,
+        'status_description': status_description,
+    }
+
+
+def _session(token):
+    """
+    The validated session token's ids, or (status, response) to reject with.
+    """
+    if not token:
+        return None, (401, _rejected('missing_agent_session_token'))
+    token_data = validate_agent_session_token(token)
+    if not token_data:
+        return None, (401, _rejected('invalid_or_expired_token'))
+    return token_data, None
+
+
+def _decode_event(raw_body):
+    """
+    The validated event body, or (status, response) to reject with.
+    """
+    try:
+        body = json.loads(raw_body or b'{}')
+    except ValueError:
+        return None, (400, _rejected('invalid_json'))
+    body, rejection = validate_event_item(body, REQUIRED_FIELDS)
+    if rejection:
+        return None, (400, {'status': 0, **rejection})
+    return body, None
+
+
+async def _queue_single_event(event_kwargs):
+    """
+    Buffered-mode tail of the single-event capture.
+    """
+    try:
+        event_ids, queued = await run_blocking(save_or_enqueue_events, [event_kwargs])
+    except Exception:
+        logger.exception('Event capture failed')
+        return 500, _CAPTURE_FAILED
+
+    return (202 if queued else 201), {
+        'status': 1,
+        'status_description': 'event_queued' if queued else 'event_captured',
+        'response': {
+            'event_id': str(event_ids[0]),
+        },
+    }
+
+
+async def capture_sdk_event(sdk_key, token, raw_body):
+    """
+    POST /api/v1/backend/log/sdk/
+    Headers: X-OTAS-SDK-KEY, X-OTAS-AGENT-SESSION-TOKEN
+    """
+    if not sdk_key:
+        return 401, _rejected('missing_sdk_key')
+
+    project_info = await averify_sdk_key(sdk_key)
+    if not project_info:
+        return 401, _rejected('invalid_sdk_key')
+
+    token_data, rejection = _session(token)
+    if rejection:
+        return rejection
+
+    body, rejection = _decode_event(raw_body)
+    if rejection:
+        return rejection
+
+    if is_buffered_ingest():
+        return await _queue_single_event(build_event_kwargs(
+            body,
+            OPTIONAL_FIELDS,
+            project_id=project_info['id'],
+            agent_id=token_data['agent_id'],
+            agent_session_id=token_data['agent_session_id'],
+        ))
+
+    try:
+        await run_blocking(build_event_and_save, token_data, project_info, body, OPTIONAL_FIELDS)
+    except Exception:
+        logger.exception('Event capture failed')
+        return 500, _CAPTURE_FAILED
+    return 201, {
+        'status': 1,
+        'status_description': 'event_captured',
+        'response': {
+        },
+    }
+
+
+async def capture_agent_event(agent_key, token, raw_body):
+    """
+    POST /api/v1/backend/log/agent/
+    Headers: X-OTAS-AGENT-KEY, X-OTAS-AGENT-SESSION-TOKEN
+    """
+    if not agent_key:
+        return 401, _rejected('missing_agent_key')
+
+    auth_data = await avalidate_agent_key(agent_key)
+    if not auth_data:
+        return 401, _rejected('invalid_or_expired_agent_key')
+
+    token_data, rejection = _session(token)
+    if rejection:
+        return rejection
+
+    if str(token_data['agent_id']) != str(auth_data['agent_id']):
+        return 403, _rejected('session_agent_mismatch')
+
+    body, rejection = _decode_event(raw_body)
+    if rejection:
+        return rejection
+
+    if is_buffered_ingest():
+        return await _queue_single_event(build_event_kwargs(
+            body,
+            OPTIONAL_FIELDS,
+            project_id=auth_data['project_id'],
+            agent_id=auth_data['agent_id'],
+            agent_session_id=token_data['agent_session_id'],
+        ))
+
+    try:
+        event = await run_blocking(
+            build_agent_event_and_save,
+            auth_data,
+            body,
+            OPTIONAL_FIELDS,
+            agent_session_id=token_data['agent_session_id'],
+        )
+    except Exception:
+        logger.exception('Agent log capture failed')
+        return 500, _CAPTURE_FAILED
+    return 201, {
+        'status': 1,
+        'status_description': 'event_captured',
+        'response': {
+            'event_id': str(event.event_id),
+        },
+    }
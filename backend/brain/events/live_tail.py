@@ -0,0 +1,169 @@
+"""
+Redis pub/sub transport for the live event tail (AgentEventTailView).
+
+Once a capture, batch capture or buffer flush commits, bulk_save_events
+publishes the new events, serialized without their payload fields, as one
+JSON list per agent on that agent's channel. Each tail connection subscribes
+to its agent's channel and filters the events itself. Without subscribers
+the cost is one pipelined PUBLISH round trip per committed batch.
+
+Publishing never fails ingest: when Redis is unreachable, events are not
+published for LIVE_TAIL_RETRY_SECONDS. The first publish after that sends
+each agent whose events were dropped a gap marker, {"gap": <event_time of
+the first dropped event>}, on its channel, so connected tails can tell
+their clients to backfill from Postgres.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LIVE_TAIL_ENABLED = getattr(settings, 'LIVE_TAIL_ENABLED', True)
+LIVE_TAIL_REDIS_URL = getattr(settings, 'LIVE_TAIL_REDIS_URL', 'redis://localhost:6379/2')
+LIVE_TAIL_CHANNEL_PREFIX = getattr(settings, 'LIVE_TAIL_CHANNEL_PREFIX', 'brain:tail')
+LIVE_TAIL_HEARTBEAT_SECONDS = getattr(settings, 'LIVE_TAIL_HEARTBEAT_SECONDS', 15)
+LIVE_TAIL_MAX_SECONDS = getattr(settings, 'LIVE_TAIL_MAX_SECONDS', 900)
+LIVE_TAIL_RETRY_SECONDS = getattr(settings, 'LIVE_TAIL_RETRY_SECONDS', 5)
+
+_client = None
+_paused_until = 0.0
+# agent_id -> event_time of its first event not published; bounded so a long
+# outage cannot grow it without limit. Agents left out get no gap marker, and
+# their tails only catch up when they reconnect with their last event id.
+_missed = {}
+_missed_lock = threading.Lock()
+_MAX_MISSED_AGENTS = 10000
+
+
+def _channel(agent_id):
+    return f'{LIVE_TAIL_CHANNEL_PREFIX}:{agent_id}'
+
+
+def _publisher():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(LIVE_TAIL_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+    return _client
+
+
+def _first_event_times(events):
+    first = {}
+    for event in events:
+        if event.agent_id:
+            agent_id = str(event.agent_id)
+            first[agent_id] = min(first.get(agent_id, event.event_time), event.event_time)
+    return first
+
+
+def _miss(first_event_times):
+    with _missed_lock:
+        for agent_id, event_time in first_event_times.items():
+            if agent_id in _missed:
+                _missed[agent_id] = min(_missed[agent_id], event_time)
+            elif len(_missed) < _MAX_MISSED_AGENTS:
+                _missed[agent_id] = event_time
+
+
+def publish_events(events, serialize):
+    """
+    Publishes saved BackendEvents to their agents' channels, as
+    serialize(event) dicts, with one pipelined round trip, preceded by the
+    gap markers of agents whose events were dropped while Redis was
+    unreachable. Call it after the events are committed. Events without an
+    agent are not published.
+    """
+    global _paused_until
+    if not LIVE_TAIL_ENABLED:
+        return
+    if time.monotonic() < _paused_until:
+        _miss(_first_event_times(events))
+        return
+    events_by_agent = defaultdict(list)
+    for event in events:
+        if event.agent_id:
+            events_by_agent[str(event.agent_id)].append(serialize(event))
+    with _missed_lock:
+        missed = dict(_missed)
+        _missed.clear()
+    if not events_by_agent and not missed:
+        return
+    try:
+        pipe = _publisher().pipeline(transaction=False)
+        for agent_id, event_time in missed.items():
+            pipe.publish(_channel(agent_id), json.dumps({'gap': event_time.isoformat()}))
+        for agent_id, events_of_agent in events_by_agent.items():
+            pipe.publish(_channel(agent_id), json.dumps(events_of_agent, separators=(',', ':')))
+        pipe.execute()
+    except redis.RedisError as exc:
+        _miss(missed)
+        _miss(_first_event_times(events))
+        _paused_until = time.monotonic() + LIVE_TAIL_RETRY_SECONDS
+        logger.warning('Live tail publish failed, pausing for %ss: %s', LIVE_TAIL_RETRY_SECONDS, exc)
+
+
+class Subscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    async def next_batch(self, timeout):
+        """
+        The next published list of events or gap marker dict, or None if
+        nothing arrived within timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None and message['type'] == 'message':
+                return json.loads(message['data'])
+        return None
+
+    async def batches(self, heartbeat=LIVE_TAIL_HEARTBEAT_SECONDS, lifetime=LIVE_TAIL_MAX_SECONDS):
+        """
+        Yields each published list of events or gap marker, or None after
+        heartbeat seconds without one, until lifetime seconds have passed.
+        """
+        end = time.monotonic() + lifetime
+        while (remaining := end - time.monotonic()) > 0:
+            yield await self.next_batch(min(heartbeat, remaining))
+
+
+@asynccontextmanager
+async def subscribe(agent_id):
+    """
+    Async context manager subscribed to agent_id's channel for its duration,
+    yielding a Subscription. Raises redis.RedisError if Redis is unreachable.
+    """
+    client = redis.asyncio.Redis.from_url(LIVE_TAIL_REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(_channel(agent_id))
+        yield Subscription(pubsub)
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+def sse_frame(data=None, *, event=None, event_id=None, comment=None, retry=None):
+    """
+    One Server-Sent Events frame. data is sent as JSON.
+    """
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if data is not None:
+        lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+import uuid
+
+import jwt
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from events.fast_ingest import IngestApplication
+from events.models import (
+    AgentPathDailyRollup, AgentPathHourlyRollup, BackendEvent, BackendEventPayload, PathTemplate, SessionSummary,
+)
+from events.utils import _sdk_key_cache, _sdk_key_digest
+
+SCENARIOS = ('capture', 'reject')
+
+EVENT_BODY = (
+    b'{"project_id":"benchmark","path":"/api/v1/orders/%d","method":"POST","status_code":201,'
+    b'"latency_ms":12.5,"request_size_bytes":164,"response_size_bytes":98,'
+    b'"request_headers":{"content-type":"application/json","user-agent":"otas-sdk/1.0"},'
+    b'"request_body":"{\\"sku\\":\\"A-100\\",\\"quantity\\":2}",'
+    b'"response_body":"{\\"id\\":1234,\\"status\\":\\"created\\"}"}'
+)
+
+
+async def _post(app, path, headers, body):
+    """
+    One request through the ASGI app, as the server would make it. Returns
+    the response status.
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 8000),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Nobody disconnects; Django cancels its disconnect listener.
+            await asyncio.Event().wait()
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure single-event ingest throughput of the bare ASGI ingest app (events/fast_ingest.py) "
+        "against the Django views, in process, on POST /api/v1/backend/log/sdk/. "
+        "'capture' writes real events under a throwaway project and deletes them afterwards; "
+        "'reject' fails the session token after the SDK key check and never reaches the database, "
+        "so it measures the per-request overhead alone. The SDK key is seeded into the key cache, "
+        "so UASAM is not called. Req/s per core is 1 / process CPU time per request, including the "
+        "ORM threads but not Postgres. Django's per-request 4xx warnings are silenced while it runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Measured requests per app and scenario.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once.')
+        parser.add_argument('--warmup', type=int, default=100, help='Unmeasured requests before each run.')
+        parser.add_argument(
+            '--scenario', choices=SCENARIOS + ('all',), default='all', help='Which scenario to run.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        scenarios = SCENARIOS if options['scenario'] == 'all' else (options['scenario'],)
+
+        project_id = str(uuid.uuid4())
+        agent_id = str(uuid.uuid4())
+        sdk_key = f'benchmark-{uuid.uuid4().hex}'
+        _sdk_key_cache.set(_sdk_key_digest(sdk_key), {'id': project_id, 'name': 'benchmark'})
+
+        django_application = get_asgi_application()
+        apps = (
+            ('django', django_application),
+            ('fast', IngestApplication(django_application)),
+        )
+        self.path = reverse('backend-sdk-event-capture')
+        self.stdout.write(
+            f"{'app':<8} {'scenario':<9} {'requests':>9} {'errors':>7} {'wall s':>8} "
+            f"{'req/s':>9} {'cpu us/req':>11} {'req/s/core':>11}"
+        )
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for scenario in scenarios:
+                for name, app in apps:
+                    self._run(name, app, scenario, sdk_key, agent_id, options)
+        finally:
+            request_logger.setLevel(level)
+            _sdk_key_cache.delete(_sdk_key_digest(sdk_key))
+            if 'capture' in scenarios:
+                self._cleanup(project_id)
+
+    def _headers(self, sdk_key, agent_id, scenario):
+        if scenario == 'reject':
+            token = 'not-a-token'
+        else:
+            token = jwt.encode(
+                {'agent_id': agent_id, 'agent_session_id': str(uuid.uuid4())}, settings.JWT_SECRET, algorithm='HS256',
+            )
+        return [
+            (b'host', b'localhost:8000'),
+            (b'content-type', b'application/json'),
+            (b'x-otas-sdk-key', sdk_key.encode()),
+            (b'x-otas-agent-session-token', token.encode()),
+        ]
+
+    def _run(self, name, app, scenario, sdk_key, agent_id, options):
+        expected = (401,) if scenario == 'reject' else (201, 202)
+        concurrency = options['concurrency']
+
+        async def worker(count, headers, errors):
+            for i in range(count):
+                status = await _post(app, self.path, headers, EVENT_BODY % i)
+                if status not in expected:
+                    errors.append(status)
+
+        async def run(total):
+            errors = []
+            # One agent session per worker, as with that many SDK clients.
+            await asyncio.gather(*(
+                worker(total // concurrency + (i < total % concurrency), self._headers(sdk_key, agent_id, scenario), errors)
+                for i in range(concurrency)
+            ))
+            return errors
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run(options['warmup']))
+            cpu = time.process_time()
+            wall = time.perf_counter()
+            errors = loop.run_until_complete(run(options['requests']))
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+        finally:
+            loop.close()
+
+        requests = options['requests']
+        self.stdout.write(
+            f'{name:<8} {scenario:<9} {requests:>9,} {len(errors):>7,} {wall:>8.2f} '
+            f'{requests / wall:>9,.0f} {cpu / requests * 1e6:>11,.0f} {requests / cpu:>11,.0f}'
+        )
+        if errors:
+            self.stderr.write(f'  unexpected statuses: {sorted(set(errors), key=str)}')
+
+    def _cleanup(self, project_id):
+        events = BackendEvent.objects.filter(project_id=project_id)
+        BackendEventPayload.objects.filter(event_id__in=events.values('event_id')).delete()
+        deleted, _ = events.delete()
+        AgentPathDailyRollup.objects.filter(project_id=project_id).delete()
+        AgentPathHourlyRollup.objects.filter(project_id=project_id).delete()
+        SessionSummary.objects.filter(project_id=project_id).delete()
+        PathTemplate.objects.filter(project_id=project_id).delete()
+        self.stdout.write(f'Deleted {deleted:,} benchmark events of project {project_id}.')
@@ -0,0 +1,87 @@
+import csv
+import time
+
+import zstandard
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import PAYLOAD_FIELDS
+from events.payload_codec import (
+    EVENT_PAYLOAD_DICT_SAMPLES, EVENT_PAYLOAD_DICT_SIZE, EVENT_PAYLOAD_ZSTD_LEVEL,
+    encode_payload, new_compressor, sample_payloads, train_dictionary,
+)
+
+
+def read_csv_samples(path, limit):
+    with open(path, newline='', encoding='utf-8') as stream:
+        samples = []
+        for record in csv.DictReader(stream):
+            values = {field: record.get(field) or None for field in PAYLOAD_FIELDS}
+            if any(values.values()):
+                samples.append(encode_payload(values))
+            if len(samples) >= limit:
+                break
+    return samples
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the zstd payload codec (events/payload_codec.py) on real payloads: "
+        "storage ratio and CPU cost per row, with and without a trained dictionary. "
+        "The dictionary is trained on half of the samples and measured on the other half."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--project', help='Sample recent payloads of this project from the database.')
+        source.add_argument('--csv', help='Sample payloads from a CSV export, e.g. dummy_events.csv.')
+        parser.add_argument('--samples', type=int, default=EVENT_PAYLOAD_DICT_SAMPLES, help='Payloads to sample.')
+        parser.add_argument('--days', type=int, default=7, help='With --project, how many days back to sample.')
+        parser.add_argument('--level', type=int, default=EVENT_PAYLOAD_ZSTD_LEVEL, help='zstd compression level.')
+        parser.add_argument('--dict-size', type=int, default=EVENT_PAYLOAD_DICT_SIZE, help='Dictionary size in bytes.')
+
+    def _measure(self, name, compressor, decompressor, samples, raw_bytes):
+        start = time.perf_counter()
+        frames = [compressor.compress(sample) for sample in samples]
+        compress_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for frame in frames:
+            decompressor.decompress(frame)
+        decompress_s = time.perf_counter() - start
+        packed_bytes = sum(map(len, frames))
+        self.stdout.write(
+            f'{name:<12} {packed_bytes:>12,} {raw_bytes / packed_bytes:>8.2f}x '
+            f'{compress_s / len(samples) * 1e6:>12.1f} {decompress_s / len(samples) * 1e6:>14.1f}'
+        )
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            samples = read_csv_samples(options['csv'], options['samples'])
+        else:
+            samples = sample_payloads(options['project'], options['samples'], options['days'])
+        if len(samples) < 2:
+            raise CommandError('Not enough payloads to benchmark.')
+
+        training, measured = samples[::2], samples[1::2]
+        start = time.perf_counter()
+        try:
+            dictionary = train_dictionary(training, options['dict_size'], options['level'])
+        except zstandard.ZstdError as exc:
+            raise CommandError(f'Could not train a dictionary ({exc}); use more --samples or a smaller --dict-size.')
+        train_s = time.perf_counter() - start
+        zdict = zstandard.ZstdCompressionDict(dictionary)
+
+        raw_bytes = sum(map(len, measured))
+        self.stdout.write(
+            f'{len(training)} training / {len(measured)} measured payloads, '
+            f'{raw_bytes / len(measured):,.0f} bytes average; dictionary {len(dictionary):,} bytes, '
+            f'trained in {train_s * 1000:,.0f} ms'
+        )
+        self.stdout.write(f"{'codec':<12} {'bytes':>12} {'ratio':>9} {'compress us':>12} {'decompress us':>14}")
+        self.stdout.write(f"{'plain':<12} {raw_bytes:>12,} {1:>8.2f}x {0:>12.1f} {0:>14.1f}")
+        self._measure(
+            'zstd', new_compressor(level=options['level']), zstandard.ZstdDecompressor(), measured, raw_bytes,
+        )
+        self._measure(
+            'zstd+dict', new_compressor(zdict, options['level']), zstandard.ZstdDecompressor(dict_data=zdict),
+            measured, raw_bytes,
+        )
@@ -0,0 +1,149 @@
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+
+from events.models import BackendEvent
+from events.utils import Percentile, after_event_cursor
+
+_EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+_BUFFERS = re.compile(r'Buffers: shared(?: hit=(\d+))?(?: read=(\d+))?')
+
+INDEX_STATS_SQL = """
+SELECT count(DISTINCT i.indexrelid) FILTER (WHERE c.relkind = 'I'),
+       coalesce(sum(pg_relation_size(i.indexrelid)), 0)
+FROM pg_partition_tree('backend_event') t
+JOIN pg_index i ON i.indrelid = t.relid
+JOIN pg_class c ON c.oid = i.indexrelid
+"""
+
+INSERT_BENCHMARK_SQL = """
+INSERT INTO backend_event (
+    event_id, event_time, event_date, project_id, agent_id, agent_session_id,
+    path, method, status_code, latency_ms, request_size_bytes, response_size_bytes,
+    created_at
+)
+SELECT gen_random_uuid(), now(), current_date, md5('explain-project')::uuid, md5('explain-agent')::uuid,
+       md5((n / 100)::text)::uuid, '/explain/' || mod(n, 50), 'GET', 200, mod(n, 1000)::float8,
+       0, 0, now()
+FROM generate_series(1, %s) AS n
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN ANALYZE the BackendEvent query shapes used by the analytics, "
+        "session and export endpoints, and report index count, index size and "
+        "bulk insert cost. Run before and after index changes to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the fastest is reported.')
+        parser.add_argument('--insert-rows', type=int, default=5000, help='Rows for the (rolled back) insert benchmark; 0 to skip.')
+        parser.add_argument('--plans', action='store_true', help='Print the full plan of each query.')
+
+    def _sample(self):
+        busiest = (
+            BackendEvent.objects.exclude(agent_session_id=None)
+            .values('project_id', 'agent_id', 'agent_session_id')
+            .annotate(events=Count('event_id'))
+            .order_by('-events')
+            .first()
+        )
+        if not busiest:
+            raise CommandError('backend_event is empty; load some events first.')
+        bounds = BackendEvent.objects.filter(agent_id=busiest['agent_id']).aggregate(
+            first=Min('event_time'), last=Max('event_time'),
+        )
+        return busiest, bounds
+
+    def _queries(self, sample, bounds):
+        agent_id = sample['agent_id']
+        first_day, last_day = bounds['first'].date(), bounds['last'].date()
+        session = BackendEvent.objects.filter(
+            agent_id=agent_id, project_id=sample['project_id'], agent_session_id=sample['agent_session_id'],
+        ).order_by('event_time', 'event_id')
+        middle = session.only('event_time', 'event_id')[sample['events'] // 2]
+        hour_start = bounds['first'] + (bounds['last'] - bounds['first']) / 2
+
+        return {
+            'agent_path_counts': (
+                BackendEvent.objects.filter(agent_id=agent_id, event_date__gte=first_day, event_date__lte=last_day)
+                .values('path_template', 'event_date').annotate(count=Count('event_id'))
+            ),
+            'latency_exact': (
+                BackendEvent.objects.filter(agent_id=agent_id, event_date__gte=first_day, event_date__lte=last_day)
+                .values('event_date').annotate(p95=Percentile('latency_ms', 0.95))
+            ),
+            'agent_hour_window': (
+                BackendEvent.objects.filter(
+                    agent_id=agent_id,
+                    event_date=hour_start.date(),
+                    event_time__gte=hour_start,
+                    event_time__lt=hour_start + timedelta(hours=1),
+                ).values('latency_ms')
+            ),
+            'session_first_page': session.only('event_time', 'event_id', 'path', 'status_code')[:201],
+            'session_deep_page': after_event_cursor(session, middle.event_time, middle.event_id)
+            .only('event_time', 'event_id', 'path', 'status_code')[:201],
+            'project_export_head': (
+                BackendEvent.objects.filter(project_id=sample['project_id'])
+                .order_by('event_time', 'event_id').only('event_id', 'event_time')[:2000]
+            ),
+        }
+
+    def _explain(self, qs, repeat):
+        best = None
+        for _ in range(max(1, repeat)):
+            plan = qs.explain(analyze=True, buffers=True)
+            elapsed = float(_EXECUTION_TIME.search(plan).group(1))
+            if best is None or elapsed < best[0]:
+                best = (elapsed, plan)
+        elapsed, plan = best
+        buffers = _BUFFERS.search(plan)
+        hit, read = (int(buffers.group(1) or 0), int(buffers.group(2) or 0)) if buffers else (0, 0)
+        return elapsed, hit + read, plan
+
+    def _insert_benchmark(self, rows):
+        """
+        Times a server-side INSERT of synthetic rows, so the figure is index
+        and heap maintenance rather than Python object overhead.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            started = time.perf_counter()
+            cursor.execute(INSERT_BENCHMARK_SQL, [rows])
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return elapsed
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_queries requires PostgreSQL.')
+
+        sample, bounds = self._sample()
+        self.stdout.write(
+            f"Sample: agent {sample['agent_id']}, session {sample['agent_session_id']} "
+            f"({sample['events']} events), {bounds['first']:%Y-%m-%d}..{bounds['last']:%Y-%m-%d}"
+        )
+        self.stdout.write(f"{'query':<22} {'ms':>10} {'buffers':>10}  plan")
+        for name, qs in self._queries(sample, bounds).items():
+            elapsed, buffers, plan = self._explain(qs, options['repeat'])
+            top = plan.splitlines()[0].split('  (')[0].strip()
+            self.stdout.write(f'{name:<22} {elapsed:>10.2f} {buffers:>10}  {top}')
+            if options['plans']:
+                self.stdout.write(plan + '\n')
+
+        with connection.cursor() as cursor:
+            cursor.execute(INDEX_STATS_SQL)
+            index_count, index_bytes = cursor.fetchone()
+        self.stdout.write(f'indexes on backend_event: {index_count}, {index_bytes / 2 ** 20:,.1f} MiB across partitions')
+
+        if options['insert_rows']:
+            elapsed = self._insert_benchmark(options['insert_rows'])
+            self.stdout.write(
+                f"bulk insert {options['insert_rows']} rows: {elapsed * 1000:,.0f} ms "
+                f"({options['insert_rows'] / elapsed:,.0f} rows/s, rolled back)"
+            )
@@ -0,0 +1,60 @@
+import sys
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.export import EXPORT_FORMATS, export_queryset, resolve_fields, stream_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream BackendEvent rows for a project, agent, session and/or date range "
+        "as NDJSON or CSV. Output ending in .gz is gzip-compressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=uuid.UUID, help='project_id to export.')
+        parser.add_argument('--agent', type=uuid.UUID, help='agent_id to export.')
+        parser.add_argument('--session', type=uuid.UUID, help='agent_session_id to export.')
+        parser.add_argument('--start', type=date.fromisoformat, help='First event date (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last event date (YYYY-MM-DD).')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help='Output format (default: from --output, else ndjson).')
+        parser.add_argument('--fields', help='Comma-separated event fields (default: all).')
+        parser.add_argument('--output', '-o', default='-', help="File to write ('-' for stdout).")
+        parser.add_argument('--gzip', action='store_true', help='Compress the output (implied by a .gz output name).')
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ('project', 'agent', 'session', 'start', 'end')):
+            raise CommandError('Give at least one of --project, --agent, --session, --start, --end.')
+
+        try:
+            fields = resolve_fields(options['fields'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        fmt = options['format'] or ('csv' if output.removesuffix('.gz').endswith('.csv') else 'ndjson')
+
+        qs = export_queryset(
+            project_id=options['project'],
+            agent_id=options['agent'],
+            session_id=options['session'],
+            start=options['start'],
+            end=options['end'],
+            fields=fields,
+        )
+
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        written = 0
+        try:
+            for block in stream_events(qs, fmt, fields=fields, compress=compress):
+                stream.write(block)
+                written += len(block)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written:,} bytes to {output}.'))
@@ -0,0 +1,403 @@
+import csv
+import io
+import json
+import multiprocessing
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+
+from events.models import BackendEvent, PAYLOAD_FIELDS
+from events.partitions import ensure_partitions
+from events.paths import resolve_path_ids
+from events.payload_codec import pack_payload
+from events.response_cache import bump_ingest_watermarks
+from events.rollups import rollup_merge_sql
+from events.utils import canonical_uuid, event_float, event_int
+
+# Column order used for the staging table, the COPY stream and the merge.
+# Matches the header of dummy_events.csv.
+COLUMNS = [
+    'event_id', 'event_time', 'event_date', 'project_id', 'agent_id', 'agent_session_id',
+    'path', 'method', 'status_code', 'latency_ms',
+    'request_size_bytes', 'response_size_bytes',
+    'request_headers', 'request_body', 'query_params', 'post_data',
+    'response_headers', 'response_body',
+    'request_content_type', 'response_content_type',
+    'custom_properties', 'error', 'metadata', 'created_at',
+]
+
+STAGING_TABLE = 'backend_event_staging'
+
+# Staging rows also carry path_id (events/paths.py), resolved per chunk.
+EVENT_COLUMNS = [column for column in COLUMNS if column not in PAYLOAD_FIELDS] + ['path_id']
+# Payload columns as stored, see events/payload_codec.py. The staging rows
+# carry either the text fields or the packed ones.
+PAYLOAD_COLUMNS = [*PAYLOAD_FIELDS, 'dictionary_id', 'packed']
+_PAYLOAD_INDEXES = [COLUMNS.index(field) for field in PAYLOAD_FIELDS]
+
+CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}
+(LIKE backend_event INCLUDING DEFAULTS, {', '.join(f'{field} text' for field in PAYLOAD_FIELDS)},
+ dictionary_id bigint, packed bytea)
+ON COMMIT DELETE ROWS
+"""
+
+COPY_SQL = f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}, path_id, dictionary_id, packed) FROM STDIN WITH (FORMAT csv)"
+
+# Inserts new rows and the payloads of those that have one, stages them for
+# the agent/path rollups and returns the number inserted.
+MERGE_SQL = rollup_merge_sql(
+    f"INSERT INTO backend_event ({', '.join(EVENT_COLUMNS)}) "
+    f"SELECT {', '.join(EVENT_COLUMNS)} FROM {STAGING_TABLE} "
+    f"ON CONFLICT (event_id, event_date) DO NOTHING",
+    extra=[
+        f"payloads AS ("
+        f"INSERT INTO backend_event_payload (event_id, event_date, {', '.join(PAYLOAD_COLUMNS)}) "
+        f"SELECT s.event_id, s.event_date, {', '.join(f's.{column}' for column in PAYLOAD_COLUMNS)} "
+        f"FROM {STAGING_TABLE} s JOIN inserted USING (event_id, event_date) "
+        f"WHERE num_nonnulls({', '.join(f's.{field}' for field in PAYLOAD_FIELDS)}, s.packed) > 0)"
+    ],
+)
+
+_TEXT_FIELDS = (
+    'request_headers', 'request_body', 'query_params', 'post_data',
+    'response_headers', 'response_body',
+    'request_content_type', 'response_content_type',
+)
+
+
+class BadRow(ValueError):
+    pass
+
+
+def _text(value, field):
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    if '\x00' in value:
+        raise BadRow(f'{field} contains a NUL byte')
+    return value
+
+
+def _uuid(value, field, required=False):
+    if value is None or value == '':
+        if required:
+            raise BadRow(f'{field} is required')
+        return None
+    value = canonical_uuid(value)
+    if value is None:
+        raise BadRow(f'{field} is not a UUID')
+    return value
+
+
+def _timestamp(value, field):
+    """
+    Returns (value to COPY, UTC date). Naive timestamps are taken as UTC,
+    which matches the UTC session time zone Django sets on the connection.
+    """
+    if not value:
+        raise BadRow(f'{field} is required')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BadRow(f'{field} is not an ISO timestamp')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt_timezone.utc)
+    return value, parsed.date()
+
+
+def _number(value, field, check, default=None):
+    if value is None or value == '':
+        if default is None:
+            raise BadRow(f'{field} is required')
+        return default
+    try:
+        return check(value)
+    except (TypeError, ValueError, OverflowError):
+        raise BadRow(f'{field} is not a valid non-negative {"integer" if check is event_int else "number"}')
+
+
+def _json_text(value, field):
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        try:
+            json.loads(value)
+        except json.JSONDecodeError:
+            raise BadRow(f'{field} is not valid JSON')
+        return _text(value, field)
+    return json.dumps(value)
+
+
+def parse_row(row):
+    """
+    Validates one CSV/NDJSON record and returns its values in COLUMNS order.
+    Raises BadRow with a reason when the record cannot be loaded.
+    """
+    if not isinstance(row, dict):
+        raise BadRow('record is not an object')
+    get = row.get
+
+    try:
+        event_id = uuid.UUID(get('event_id')).hex
+    except (TypeError, ValueError, AttributeError):
+        raise BadRow('event_id is not a UUID')
+
+    event_time, event_date = _timestamp(get('event_time'), 'event_time')
+    created_at = _timestamp(get('created_at'), 'created_at')[0] if get('created_at') else event_time
+
+    project_id = _uuid(get('project_id'), 'project_id', required=True)
+    path, method = get('path'), get('method')
+    if not path:
+        raise BadRow('path is required')
+    if not method:
+        raise BadRow('method is required')
+    if len(method) > BackendEvent._meta.get_field('method').max_length:
+        raise BadRow('method is too long')
+
+    text = {field: _text(get(field), field) for field in _TEXT_FIELDS}
+    for field in ('request_content_type', 'response_content_type'):
+        if text[field] and len(text[field]) > BackendEvent._meta.get_field(field).max_length:
+            raise BadRow(f'{field} is too long')
+
+    return [
+        event_id,
+        event_time,
+        event_date,
+        project_id,
+        _uuid(get('agent_id'), 'agent_id'),
+        _uuid(get('agent_session_id'), 'agent_session_id'),
+        _text(path, 'path'),
+        _text(method, 'method'),
+        _number(get('status_code'), 'status_code', event_int),
+        _number(get('latency_ms'), 'latency_ms', event_float),
+        _number(get('request_size_bytes'), 'request_size_bytes', event_int, default=0),
+        _number(get('response_size_bytes'), 'response_size_bytes', event_int, default=0),
+        text['request_headers'],
+        text['request_body'],
+        text['query_params'],
+        text['post_data'],
+        text['response_headers'],
+        text['response_body'],
+        text['request_content_type'],
+        text['response_content_type'],
+        _json_text(get('custom_properties'), 'custom_properties'),
+        _text(get('error'), 'error'),
+        _json_text(get('metadata'), 'metadata'),
+        created_at,
+    ]
+
+
+def pack_row(values):
+    """
+    Appends the packed payload columns to row values, emptying the payload
+    text fields when the payload gets packed (EVENT_PAYLOAD_CODEC).
+    """
+    payload = {field: values[index] for field, index in zip(PAYLOAD_FIELDS, _PAYLOAD_INDEXES)}
+    packed = None
+    if any(value is not None for value in payload.values()):
+        packed = pack_payload(values[3], payload)
+    if packed is None:
+        return values + [None, None]
+    for index in _PAYLOAD_INDEXES:
+        values[index] = None
+    dictionary_id, data = packed
+    return values + [dictionary_id, '\\x' + data.hex()]
+
+
+def _copy_buffer(rows):
+    """
+    Encodes rows for COPY ... WITH (FORMAT csv). None is written as an
+    unquoted empty field, which COPY reads as NULL; parse_row never emits ''.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(values for _, values in rows)
+    buf.seek(0)
+    return buf
+
+
+def _copy_and_merge(cursor, rows):
+    cursor.copy_expert(COPY_SQL, _copy_buffer(rows))
+    cursor.execute(MERGE_SQL)
+    inserted = cursor.fetchone()[0]
+    cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+    return inserted
+
+
+def _load_rows(cursor, rows, bad_rows):
+    """
+    COPYs rows into staging and merges them. If the database rejects the
+    chunk, it is bisected inside savepoints until the offending rows are
+    isolated, so one bad value never aborts the rest of the load.
+    """
+    try:
+        with transaction.atomic():
+            return _copy_and_merge(cursor, rows)
+    except (DatabaseError, connection.Database.Error) as exc:
+        # copy_expert runs on the raw driver cursor, so its errors are not
+        # wrapped in Django's DatabaseError.
+        if len(rows) == 1:
+            bad_rows.append((rows[0][0], str(exc).strip().splitlines()[0]))
+            return 0
+        middle = len(rows) // 2
+        return _load_rows(cursor, rows[:middle], bad_rows) + _load_rows(cursor, rows[middle:], bad_rows)
+
+
+def load_chunk(chunk):
+    """
+    Validates and loads one chunk of (line_number, record) pairs.
+    Returns (inserted, duplicates, bad_rows).
+    """
+    bad_rows = []
+    rows = []
+    for line_number, record in chunk:
+        try:
+            rows.append((line_number, parse_row(record)))
+        except BadRow as exc:
+            bad_rows.append((line_number, str(exc)))
+    if rows:
+        path_ids = resolve_path_ids((values[3], values[6]) for _, values in rows)
+        rows = [(line_number, pack_row(values + [path_ids[(values[3], values[6])]])) for line_number, values in rows]
+
+    inserted = 0
+    rejected_before = len(bad_rows)
+    if rows:
+        # Backfills mostly target past dates; give them real partitions
+        # instead of letting them pile up in backend_event_default.
+        dates = [values[2] for _, values in rows]
+        ensure_partitions(min(dates), max(dates) + timedelta(days=1))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING_SQL)
+            inserted = _load_rows(cursor, rows, bad_rows)
+        if inserted:
+            bump_ingest_watermarks({(values[4], values[2]) for _, values in rows})
+    duplicates = len(rows) - (len(bad_rows) - rejected_before) - inserted
+    return inserted, duplicates, bad_rows
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connection.
+    connections.close_all()
+
+
+def imap_bounded(pool, func, chunks, max_in_flight):
+    """
+    pool.imap that reads ahead at most max_in_flight chunks: imap submits the
+    whole input as fast as it can read it, holding every pending chunk in
+    memory. Yields results in input order.
+    """
+    in_flight = deque()
+    for chunk in chunks:
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().get()
+        in_flight.append(pool.apply_async(func, (chunk,)))
+    while in_flight:
+        yield in_flight.popleft().get()
+
+
+def read_records(path, fmt, chunk_size):
+    """
+    Streams (line_number, record) chunks from a CSV or NDJSON file.
+    """
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        chunk = []
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for record in reader:
+                chunk.append((reader.line_num, record))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                chunk.append((line_number, record))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load BackendEvent rows from CSV or NDJSON using COPY into a staging "
+        "table, merged with ON CONFLICT (event_id, event_date) DO NOTHING."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="CSV/NDJSON files to load ('-' for stdin).")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from file extension).')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per COPY/merge transaction.')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel loader processes.')
+        parser.add_argument('--bad-rows', help='Write rejected rows as "path:line<TAB>reason" to this file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('load_events requires PostgreSQL (COPY FROM STDIN).')
+
+        chunk_size = max(1, options['chunk_size'])
+        workers = max(1, options['workers'])
+        bad_rows_out = open(options['bad_rows'], 'w') if options['bad_rows'] else None
+
+        totals = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'bad': 0}
+        started = time.monotonic()
+
+        pool = None
+        if workers > 1:
+            connections.close_all()
+            pool = multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker)
+
+        try:
+            for path in options['paths']:
+                fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+                chunks = read_records(path, fmt, chunk_size)
+                # Two chunks per worker: one loading, one queued behind it.
+                results = imap_bounded(pool, load_chunk, chunks, 2 * workers) if pool else map(load_chunk, chunks)
+
+                for inserted, duplicates, bad_rows in results:
+                    totals['inserted'] += inserted
+                    totals['duplicates'] += duplicates
+                    totals['bad'] += len(bad_rows)
+                    totals['rows'] += inserted + duplicates + len(bad_rows)
+                    for line_number, reason in bad_rows:
+                        message = f'{path}:{line_number}\t{reason}'
+                        if bad_rows_out:
+                            bad_rows_out.write(message + '\n')
+                        else:
+                            self.stderr.write(message)
+                    if options['verbosity'] > 1:
+                        elapsed = time.monotonic() - started
+                        self.stdout.write(
+                            f"{totals['rows']} rows processed "
+                            f"({totals['rows'] / max(elapsed, 1e-9):,.0f} rows/s)"
+                        )
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+            if bad_rows_out:
+                bad_rows_out.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {elapsed:.1f}s: {totals['inserted']} inserted, "
+            f"{totals['duplicates']} duplicates skipped, {totals['bad']} bad rows "
+            f"({totals['rows'] / max(elapsed, 1e-9):,.0f} rows/s)."
+        ))
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from events import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming backend_event/backend_event_payload partitions and apply "
+        "EVENT_RETENTION_DAYS. Runs hourly from celery beat; use --start/--end to "
+        "cover a backfill range. --rewrite compacts the existing backend_event "
+        "partitions instead (VACUUM FULL, one partition locked at a time)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='Also cover dates from this day (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='...up to and including this day.')
+        parser.add_argument('--list', action='store_true', help='Print the current partitions and exit.')
+        parser.add_argument(
+            '--rewrite', action='store_true',
+            help='Rewrite every backend_event partition with VACUUM FULL, e.g. to reclaim the space '
+                 'of the payload columns moved out by migration 0008, and exit.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('manage_partitions requires PostgreSQL.')
+
+        if options['list']:
+            with connection.cursor() as cursor:
+                for parent in partitions.PARTITIONED_TABLES:
+                    for name, lower, upper in partitions.list_partitions(cursor, parent):
+                        self.stdout.write(f'{name}\t[{lower}, {upper})')
+            return
+
+        if options['rewrite']:
+            rewritten = partitions.rewrite_partitions()
+            self.stdout.write(self.style.SUCCESS(f'{len(rewritten)} partitions rewritten.'))
+            return
+
+        created = []
+        if options['start'] or options['end']:
+            if not (options['start'] and options['end']) or options['start'] > options['end']:
+                raise CommandError('--start and --end must be given together, with start <= end.')
+            created += partitions.ensure_partitions(options['start'], options['end'] + timedelta(days=1))
+
+        scheduled, expired = partitions.manage_partitions()
+        created += scheduled
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(created)} partitions created, {len(expired)} expired.'
+        ))
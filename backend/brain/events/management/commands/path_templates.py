@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from events import paths
+from events.models import PathTemplate
+
+
+class Command(BaseCommand):
+    help = (
+        "List, configure or learn the path templates of a project (events/paths.py). "
+        "Configured templates use {name} for a variable segment, e.g. "
+        "/users/{user_id}/orders/{order_id}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_id')
+        parser.add_argument('--add', action='append', default=[], metavar='TEMPLATE', help='Configure a template (repeatable).')
+        parser.add_argument('--learn', action='store_true', help='Learn {param} templates now instead of waiting for celery beat.')
+
+    def handle(self, *args, **options):
+        project_id = options['project_id']
+        for template in options['add']:
+            if not template.startswith('/'):
+                raise CommandError(f'{template}: templates start with "/".')
+            path_template, merged = paths.add_template(project_id, template)
+            self.stdout.write(f'{path_template.template}: id {path_template.id}, {merged} automatic templates merged')
+        if options['learn']:
+            for path_template in paths.learn_path_templates(project_id):
+                self.stdout.write(f'learned {path_template.template}: id {path_template.id}')
+
+        templates = (
+            PathTemplate.objects.filter(project_id=project_id, merged_into=None)
+            .annotate(merged_count=Count('merged')).order_by('template')
+        )
+        for path_template in templates:
+            merged = f', {path_template.merged_count} merged' if path_template.merged_count else ''
+            self.stdout.write(f'{path_template.id}\t{path_template.template}\t{path_template.source}{merged}')
@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from events.models import BackendEvent
+from events.response_cache import invalidate_all
+from events.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute agent_path_daily_rollup and agent_path_hourly_rollup from raw "
+        "backend_event rows, e.g. after enabling rollups on existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First event date (default: oldest event).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last event date (default: newest event).')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('rebuild_rollups requires PostgreSQL.')
+
+        bounds = BackendEvent.objects.aggregate(first=Min('event_date'), last=Max('event_date'))
+        start = options['start'] or bounds['first']
+        end = options['end'] or bounds['last']
+        if start is None or end is None:
+            self.stdout.write('No events to roll up.')
+            return
+        if start > end:
+            raise CommandError('--start must be before or equal to --end.')
+
+        total = 0
+        for day, rows in rebuild_rollups(start, end):
+            total += rows
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{day}: {rows} rollup rows')
+        invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups for {start}..{end}: {total} daily rows.'
+        ))
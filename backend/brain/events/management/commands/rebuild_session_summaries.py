@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from events.models import BackendEvent
+from events.rollups import rebuild_session_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute session_summary from raw backend_event rows for every session "
+        "with events in the date range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First event date (default: oldest event).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last event date (default: newest event).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('rebuild_session_summaries requires PostgreSQL.')
+
+        bounds = BackendEvent.objects.aggregate(first=Min('event_date'), last=Max('event_date'))
+        start = options['start'] or bounds['first']
+        end = options['end'] or bounds['last']
+        if start is None or end is None:
+            self.stdout.write('No events to summarize.')
+            return
+        if start > end:
+            raise CommandError('--start must be before or equal to --end.')
+
+        total = 0
+        for sessions in rebuild_session_summaries(start, end, options['batch_size']):
+            total += sessions
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{total} sessions')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt session summaries for {start}..{end}: {total} sessions.'
+        ))
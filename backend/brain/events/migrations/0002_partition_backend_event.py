@@ -0,0 +1,102 @@
+# Converts backend_event into a table partitioned by RANGE (event_date).
+#
+# Existing rows are copied into a single history partition covering
+# [min(event_date), today) plus a partition for today; anything newer lands in
+# backend_event_default. events.partitions.manage_partitions() (celery beat,
+# or `manage.py manage_partitions`) creates the daily/weekly partitions from
+# there on. Postgres requires the partition key in every unique constraint, so
+# the primary key becomes (event_id, event_date). Index names are preserved.
+
+from django.db import migrations
+
+PARTITION_SQL = """
+DO $$
+DECLARE
+    idx record;
+    index_defs text[] := ARRAY[]::text[];
+    index_def text;
+    first_day date;
+BEGIN
+    FOR idx IN
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND tablename = 'backend_event'
+          AND indexname <> 'backend_event_pkey'
+    LOOP
+        index_defs := index_defs || idx.indexdef;
+        EXECUTE format('DROP INDEX %I', idx.indexname);
+    END LOOP;
+
+    ALTER TABLE backend_event RENAME TO backend_event_unpartitioned;
+    ALTER TABLE backend_event_unpartitioned
+        RENAME CONSTRAINT backend_event_pkey TO backend_event_unpartitioned_pkey;
+
+    CREATE TABLE backend_event (
+        LIKE backend_event_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+        CONSTRAINT backend_event_pkey PRIMARY KEY (event_id, event_date)
+    ) PARTITION BY RANGE (event_date);
+
+    CREATE TABLE backend_event_default PARTITION OF backend_event DEFAULT;
+
+    SELECT min(event_date) INTO first_day FROM backend_event_unpartitioned;
+    IF first_day < current_date THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF backend_event FOR VALUES FROM (%L) TO (%L)',
+            'backend_event_p' || to_char(first_day, 'YYYYMMDD'), first_day, current_date
+        );
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF backend_event FOR VALUES FROM (%L) TO (%L)',
+        'backend_event_p' || to_char(current_date, 'YYYYMMDD'), current_date, current_date + 1
+    );
+
+    INSERT INTO backend_event SELECT * FROM backend_event_unpartitioned;
+    DROP TABLE backend_event_unpartitioned;
+
+    FOREACH index_def IN ARRAY index_defs LOOP
+        EXECUTE index_def;
+    END LOOP;
+END $$;
+"""
+
+UNPARTITION_SQL = """
+DO $$
+DECLARE
+    idx record;
+    index_defs text[] := ARRAY[]::text[];
+    index_def text;
+BEGIN
+    FOR idx IN
+        SELECT indexdef FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND tablename = 'backend_event'
+          AND indexname <> 'backend_event_pkey'
+    LOOP
+        index_defs := index_defs || replace(idx.indexdef, ' ON ONLY ', ' ON ');
+    END LOOP;
+
+    ALTER TABLE backend_event RENAME TO backend_event_partitioned;
+
+    CREATE TABLE backend_event (
+        LIKE backend_event_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    );
+    INSERT INTO backend_event SELECT * FROM backend_event_partitioned;
+    DROP TABLE backend_event_partitioned;
+
+    ALTER TABLE backend_event ADD CONSTRAINT backend_event_pkey PRIMARY KEY (event_id);
+    FOREACH index_def IN ARRAY index_defs LOOP
+        EXECUTE index_def;
+    END LOOP;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, UNPARTITION_SQL),
+    ]
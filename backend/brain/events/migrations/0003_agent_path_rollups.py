@@ -0,0 +1,134 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:44
+#
+# Adds the agent/path rollups (events/rollups.py) and fills them from the
+# existing events, one day per transaction, so the rollups start out
+# complete. Until the backfill reaches a day, analytics read it as empty.
+#
+# The SQL below is a frozen copy of events.rollups as of this migration, so
+# later changes to that module do not change what it does.
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models, transaction
+
+ROLLUP_TABLES = ('agent_path_daily_rollup', 'agent_path_hourly_rollup')
+
+METRICS = (
+    ('request_count', 'count(*)'),
+    ('error_count', "count(*) FILTER (WHERE error IS NOT NULL AND error <> '')"),
+    ('status_2xx', 'count(*) FILTER (WHERE status_code BETWEEN 200 AND 299)'),
+    ('status_3xx', 'count(*) FILTER (WHERE status_code BETWEEN 300 AND 399)'),
+    ('status_4xx', 'count(*) FILTER (WHERE status_code BETWEEN 400 AND 499)'),
+    ('status_5xx', 'count(*) FILTER (WHERE status_code BETWEEN 500 AND 599)'),
+    ('latency_sum', 'sum(latency_ms)'),
+    ('latency_min', 'min(latency_ms)'),
+    ('latency_max', 'max(latency_ms)'),
+    ('request_bytes', 'sum(request_size_bytes)'),
+    ('response_bytes', 'sum(response_size_bytes)'),
+)
+
+
+def _rollup_sql(table, bucket_column, bucket_sql):
+    """
+    Fills one day of table from backend_event; the day is the parameter.
+    """
+    columns = ', '.join(column for column, _ in METRICS)
+    aggregates = ', '.join(aggregate for _, aggregate in METRICS)
+    return (
+        f"INSERT INTO {table} (project_id, agent_id, path, {bucket_column}, {columns}) "
+        f"SELECT project_id, COALESCE(agent_id, ''), path, {bucket_sql}, {aggregates} "
+        f"FROM backend_event WHERE event_date = %s GROUP BY 1, 2, 3, 4"
+    )
+
+
+DAILY_ROLLUP_SQL = _rollup_sql('agent_path_daily_rollup', 'event_date', 'event_date')
+HOURLY_ROLLUP_SQL = _rollup_sql('agent_path_hourly_rollup', 'bucket', "date_trunc('hour', event_time)")
+
+
+def backfill_rollups(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT min(event_date), max(event_date) FROM backend_event')
+        start, end = cursor.fetchone()
+    day = start
+    while day is not None and day <= end:
+        day_start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE")
+            cursor.execute('DELETE FROM agent_path_daily_rollup WHERE event_date = %s', [day])
+            cursor.execute(
+                'DELETE FROM agent_path_hourly_rollup WHERE bucket >= %s AND bucket < %s',
+                [day_start, day_start + timedelta(days=1)],
+            )
+            cursor.execute(DAILY_ROLLUP_SQL, [day])
+            cursor.execute(HOURLY_ROLLUP_SQL, [day])
+        day += timedelta(days=1)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0002_partition_backend_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentPathDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.CharField(max_length=255)),
+                ('agent_id', models.CharField(default='', max_length=255)),
+                ('path', models.TextField()),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('status_2xx', models.BigIntegerField(default=0)),
+                ('status_3xx', models.BigIntegerField(default=0)),
+                ('status_4xx', models.BigIntegerField(default=0)),
+                ('status_5xx', models.BigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField()),
+                ('latency_max', models.FloatField()),
+                ('request_bytes', models.BigIntegerField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+                ('event_date', models.DateField()),
+            ],
+            options={
+                'db_table': 'agent_path_daily_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='AgentPathHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.CharField(max_length=255)),
+                ('agent_id', models.CharField(default='', max_length=255)),
+                ('path', models.TextField()),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('status_2xx', models.BigIntegerField(default=0)),
+                ('status_3xx', models.BigIntegerField(default=0)),
+                ('status_4xx', models.BigIntegerField(default=0)),
+                ('status_5xx', models.BigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField()),
+                ('latency_max', models.FloatField()),
+                ('request_bytes', models.BigIntegerField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+                ('bucket', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'agent_path_hourly_rollup',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agentpathdailyrollup',
+            constraint=models.UniqueConstraint(fields=('agent_id', 'event_date', 'path', 'project_id'), name='agent_path_daily_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='agentpathhourlyrollup',
+            constraint=models.UniqueConstraint(fields=('agent_id', 'bucket', 'path', 'project_id'), name='agent_path_hourly_rollup_key'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
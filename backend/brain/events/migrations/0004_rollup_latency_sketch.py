@@ -0,0 +1,59 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:46
+
+from django.db import migrations, models
+
+# Merging two DDSketches adds their counts key by key. NULL acts as the empty
+# sketch, so ddsketch_merge_agg() skips rollup rows without a sketch.
+DDSKETCH_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION ddsketch_merge(a jsonb, b jsonb) RETURNS jsonb
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE (
+            SELECT jsonb_object_agg(key, total)
+            FROM (
+                SELECT key, sum(value::bigint) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(a)
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(b)
+                ) bins
+                GROUP BY key
+            ) merged
+        )
+    END
+$$;
+
+CREATE AGGREGATE ddsketch_merge_agg(jsonb) (
+    SFUNC = ddsketch_merge,
+    STYPE = jsonb,
+    PARALLEL = SAFE
+);
+"""
+
+DROP_DDSKETCH_FUNCTIONS_SQL = """
+DROP AGGREGATE IF EXISTS ddsketch_merge_agg(jsonb);
+DROP FUNCTION IF EXISTS ddsketch_merge(jsonb, jsonb);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_agent_path_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentpathdailyrollup',
+            name='latency_sketch',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agentpathhourlyrollup',
+            name='latency_sketch',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunSQL(DDSKETCH_FUNCTIONS_SQL, DROP_DDSKETCH_FUNCTIONS_SQL),
+    ]
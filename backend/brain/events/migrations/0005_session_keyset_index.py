@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_rollup_latency_sketch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=models.Index(fields=['agent_session_id', 'event_time', 'event_id'], name='backend_event_session_time_idx'),
+        ),
+    ]
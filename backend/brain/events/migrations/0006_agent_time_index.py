@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_session_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=models.Index(fields=['agent_id', 'event_time'], name='backend_event_agent_time_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.1 on 2026-10-17 17:53
+
+import django.contrib.postgres.indexes
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_agent_time_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_eve_project_2fd6d4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_eve_agent_i_8a5da8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_eve_agent_s_dbac23_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_eve_path_6a48b8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_eve_event_d_10dd9b_idx',
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='agent_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='agent_session_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='event_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='event_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='path',
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name='backendevent',
+            name='project_id',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=models.Index(fields=['agent_id', 'event_date', 'path'], include=('latency_ms',), name='backend_event_agent_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=models.Index(fields=['project_id', 'event_time'], name='backend_event_project_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['event_date', 'event_time'], name='backend_event_time_brin'),
+        ),
+    ]
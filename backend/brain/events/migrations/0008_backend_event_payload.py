@@ -0,0 +1,134 @@
+# Moves the six request/response payload columns of backend_event into the
+# 1:1 side table backend_event_payload, so analytics scans of backend_event
+# read narrow rows.
+#
+# backend_event_payload is partitioned by RANGE (event_date) like
+# backend_event, with the same partition bounds (backend_event_p<YYYYMMDD> ->
+# backend_event_payload_p<YYYYMMDD>); events.partitions manages both tables
+# from here on. Only events that carry a payload get a row.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CREATE_PAYLOAD_TABLE_SQL = """
+DO $$
+DECLARE
+    part record;
+BEGIN
+    CREATE TABLE backend_event_payload (
+        event_id uuid NOT NULL,
+        event_date date NOT NULL,
+        request_headers text NULL,
+        request_body text NULL,
+        query_params text NULL,
+        post_data text NULL,
+        response_headers text NULL,
+        response_body text NULL,
+        CONSTRAINT backend_event_payload_pkey PRIMARY KEY (event_id, event_date)
+    ) PARTITION BY RANGE (event_date);
+
+    CREATE TABLE backend_event_payload_default PARTITION OF backend_event_payload DEFAULT;
+
+    FOR part IN
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'backend_event'::regclass
+    LOOP
+        CONTINUE WHEN part.bound = 'DEFAULT';
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF backend_event_payload %s',
+            regexp_replace(part.relname, '^backend_event_', 'backend_event_payload_'), part.bound
+        );
+    END LOOP;
+END $$;
+"""
+
+DROP_PAYLOAD_TABLE_SQL = "DROP TABLE backend_event_payload"
+
+COPY_PAYLOADS_SQL = """
+INSERT INTO backend_event_payload (
+    event_id, event_date,
+    request_headers, request_body, query_params, post_data, response_headers, response_body
+)
+SELECT
+    event_id, event_date,
+    request_headers, request_body, query_params, post_data, response_headers, response_body
+FROM backend_event
+WHERE request_headers IS NOT NULL
+   OR request_body IS NOT NULL
+   OR query_params IS NOT NULL
+   OR post_data IS NOT NULL
+   OR response_headers IS NOT NULL
+   OR response_body IS NOT NULL
+"""
+
+RESTORE_PAYLOADS_SQL = """
+UPDATE backend_event e SET
+    request_headers = p.request_headers,
+    request_body = p.request_body,
+    query_params = p.query_params,
+    post_data = p.post_data,
+    response_headers = p.response_headers,
+    response_body = p.response_body
+FROM backend_event_payload p
+WHERE p.event_id = e.event_id AND p.event_date = e.event_date
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_composite_and_brin_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_PAYLOAD_TABLE_SQL, DROP_PAYLOAD_TABLE_SQL),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='BackendEventPayload',
+                    fields=[
+                        ('event', models.OneToOneField(db_column='event_id', db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='events.backendevent')),
+                        ('event_date', models.DateField()),
+                        ('request_headers', models.TextField(blank=True, null=True)),
+                        ('request_body', models.TextField(blank=True, null=True)),
+                        ('query_params', models.TextField(blank=True, null=True)),
+                        ('post_data', models.TextField(blank=True, null=True)),
+                        ('response_headers', models.TextField(blank=True, null=True)),
+                        ('response_body', models.TextField(blank=True, null=True)),
+                    ],
+                    options={
+                        'db_table': 'backend_event_payload',
+                    },
+                ),
+            ],
+        ),
+        migrations.RunSQL(COPY_PAYLOADS_SQL, RESTORE_PAYLOADS_SQL),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='post_data',
+        ),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='query_params',
+        ),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='request_body',
+        ),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='request_headers',
+        ),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='response_body',
+        ),
+        migrations.RemoveField(
+            model_name='backendevent',
+            name='response_headers',
+        ),
+    ]
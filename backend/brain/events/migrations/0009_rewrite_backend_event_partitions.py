@@ -0,0 +1,18 @@
+# Dropped columns keep their bytes in existing rows until the rows are
+# rewritten, so after 0008 the partitions that already held data stay as wide
+# as before. This migration used to VACUUM FULL every partition, which locks
+# each one (ACCESS EXCLUSIVE) for its whole rewrite in the middle of a deploy.
+# The rewrite is now an optional, separate step, to run off-peak:
+#
+#     python manage.py manage_partitions --rewrite
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_backend_event_payload'),
+    ]
+
+    operations = []
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.1 on 2026-10-17 18:24
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PAYLOAD_FIELDS = (
+    'request_headers', 'request_body', 'query_params', 'post_data',
+    'response_headers', 'response_body',
+)
+
+
+def unpack_payloads(apps, schema_editor):
+    # Reverse only: writes packed payloads back to the text columns before
+    # the packed ones are dropped.
+    import zstandard
+
+    BackendEventPayload = apps.get_model('events', 'BackendEventPayload')
+    PayloadDictionary = apps.get_model('events', 'PayloadDictionary')
+    decompressors = {None: zstandard.ZstdDecompressor()}
+    for dictionary in PayloadDictionary.objects.all():
+        zdict = zstandard.ZstdCompressionDict(bytes(dictionary.data))
+        decompressors[dictionary.pk] = zstandard.ZstdDecompressor(dict_data=zdict)
+
+    batch = []
+    for payload in BackendEventPayload.objects.exclude(packed=None).iterator(chunk_size=2000):
+        values = json.loads(decompressors[payload.dictionary_id].decompress(payload.packed))
+        for field in PAYLOAD_FIELDS:
+            setattr(payload, field, values.get(field))
+        batch.append(payload)
+        if len(batch) >= 2000:
+            BackendEventPayload.objects.bulk_update(batch, PAYLOAD_FIELDS)
+            batch = []
+    BackendEventPayload.objects.bulk_update(batch, PAYLOAD_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_rewrite_backend_event_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backendeventpayload',
+            name='packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PayloadDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.CharField(max_length=255)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'payload_dictionary',
+                'indexes': [models.Index(fields=['project_id', '-created_at'], name='payload_dict_project_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='backendeventpayload',
+            name='dictionary',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='events.payloaddictionary'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, unpack_payloads),
+    ]
@@ -0,0 +1,238 @@
+# Adds path templates (events/paths.py): backend_event gets path_id next to
+# the raw path, and the rollups are keyed by path_id instead of the raw path.
+#
+# Existing events get their automatic templates, partition by partition and
+# BACKFILL_BLOCKS heap pages per transaction, as in 0012. The rollups are
+# emptied, re-keyed and rebuilt from backend_event one day per transaction;
+# until the rebuild reaches a day, analytics read it as empty. Migrating
+# backwards empties them again, so run that release's
+# `manage.py rebuild_rollups` afterwards.
+#
+# auto_template() and the rollup SQL below are frozen copies of events.paths
+# and events.rollups as of this migration, so later changes to those modules
+# do not change what it does.
+
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from math import log
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BACKFILL_BLOCKS = 2000
+
+ROLLUP_TABLES = ('agent_path_daily_rollup', 'agent_path_hourly_rollup')
+TRUNCATE_ROLLUPS_SQL = f"TRUNCATE {', '.join(ROLLUP_TABLES)}"
+
+PARTITIONS_SQL = (
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'backend_event'::regclass ORDER BY c.relname"
+)
+
+ID_SEGMENT = '{id}'
+MAX_TEMPLATE_LENGTH = 1024
+_ID_RE = re.compile(
+    r'\d+'
+    r'|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+    r'|[0-9a-fA-F]{16,}'
+    r'|(?=[A-Za-z_-]*\d)[A-Za-z0-9_-]{20,}'
+)
+
+RELATIVE_ACCURACY = getattr(settings, 'LATENCY_SKETCH_RELATIVE_ACCURACY', 0.01)
+SKETCH_KEY_SQL = (
+    "CASE WHEN latency_ms IN ('NaN', 'Infinity', '-Infinity') THEN NULL "
+    "WHEN latency_ms < 0.001 THEN 'z' "
+    f"ELSE ceil(ln(latency_ms) / {log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))!r})::int::text END"
+)
+
+METRICS = (
+    # column, aggregate over events, combination of the per-sketch-key partials
+    ('request_count', 'count(*)', 'sum(request_count)'),
+    ('error_count', "count(*) FILTER (WHERE error IS NOT NULL AND error <> '')", 'sum(error_count)'),
+    ('status_2xx', 'count(*) FILTER (WHERE status_code BETWEEN 200 AND 299)', 'sum(status_2xx)'),
+    ('status_3xx', 'count(*) FILTER (WHERE status_code BETWEEN 300 AND 399)', 'sum(status_3xx)'),
+    ('status_4xx', 'count(*) FILTER (WHERE status_code BETWEEN 400 AND 499)', 'sum(status_4xx)'),
+    ('status_5xx', 'count(*) FILTER (WHERE status_code BETWEEN 500 AND 599)', 'sum(status_5xx)'),
+    ('latency_sum', 'sum(latency_ms)', 'sum(latency_sum)'),
+    ('latency_min', 'min(latency_ms)', 'min(latency_min)'),
+    ('latency_max', 'max(latency_ms)', 'max(latency_max)'),
+    ('request_bytes', 'sum(request_size_bytes)', 'sum(request_bytes)'),
+    ('response_bytes', 'sum(response_size_bytes)', 'sum(response_bytes)'),
+)
+
+
+def _rollup_sql(table, bucket_column, bucket_sql):
+    """
+    Rebuilds one day of table from backend_event; the day is the parameter.
+    """
+    columns = ', '.join(column for column, _, _ in METRICS)
+    partials = ', '.join(f'{aggregate} AS {column}' for column, aggregate, _ in METRICS)
+    combined = ', '.join(combine for _, _, combine in METRICS)
+    return (
+        f"INSERT INTO {table} (project_id, agent_id, path_id, {bucket_column}, {columns}, latency_sketch) "
+        f"SELECT project_id, agent_id, path_id, bucket, {combined}, "
+        f"COALESCE(jsonb_object_agg(sketch_key, request_count) FILTER (WHERE sketch_key IS NOT NULL), '{{}}') "
+        f"FROM (SELECT project_id::text AS project_id, COALESCE(agent_id::text, '') AS agent_id, path_id, "
+        f"{bucket_sql} AS bucket, {SKETCH_KEY_SQL} AS sketch_key, {partials} "
+        f"FROM backend_event WHERE event_date = %s GROUP BY 1, 2, 3, 4, 5) partials "
+        f"GROUP BY 1, 2, 3, 4"
+    )
+
+
+DAILY_ROLLUP_SQL = _rollup_sql('agent_path_daily_rollup', 'event_date', 'event_date')
+HOURLY_ROLLUP_SQL = _rollup_sql('agent_path_hourly_rollup', 'bucket', "date_trunc('hour', event_time)")
+
+
+def auto_template(path):
+    segments = (str(path).split('?', 1)[0].split('#', 1)[0] or '/').split('/')
+    template = '/'.join(ID_SEGMENT if _ID_RE.fullmatch(segment) else segment for segment in segments)
+    return template[:MAX_TEMPLATE_LENGTH]
+
+
+def backfill_path_ids(apps, schema_editor):
+    PathTemplate = apps.get_model('events', 'PathTemplate')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT DISTINCT project_id, path FROM backend_event')
+        pairs = [(project_id, path, auto_template(path)) for project_id, path in cursor.fetchall()]
+        PathTemplate.objects.bulk_create(
+            [PathTemplate(project_id=project_id, template=template) for project_id, template in {
+                (project_id, template) for project_id, _, template in pairs
+            }],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        ids = {
+            (project_id, template): path_id
+            for path_id, project_id, template in PathTemplate.objects.values_list('id', 'project_id', 'template')
+        }
+
+        cursor.execute('DROP TABLE IF EXISTS path_id_map')
+        cursor.execute(
+            'CREATE TEMP TABLE path_id_map (project_id varchar(255), path text, path_id integer, '
+            'PRIMARY KEY (project_id, path))'
+        )
+        for offset in range(0, len(pairs), 1000):
+            batch = pairs[offset:offset + 1000]
+            cursor.execute(
+                'INSERT INTO path_id_map VALUES ' + ', '.join(['(%s, %s, %s)'] * len(batch)),
+                [value for project_id, path, template in batch for value in (project_id, path, ids[(project_id, template)])],
+            )
+        cursor.execute('ANALYZE path_id_map')
+
+        cursor.execute(PARTITIONS_SQL)
+        for (name,) in cursor.fetchall():
+            cursor.execute(
+                "SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int", [name],
+            )
+            pages = cursor.fetchone()[0]
+            for first in range(0, pages, BACKFILL_BLOCKS):
+                cursor.execute(
+                    f"UPDATE {name} e SET path_id = m.path_id FROM path_id_map m "
+                    f"WHERE e.ctid >= '({first},0)'::tid AND e.ctid < '({first + BACKFILL_BLOCKS},0)'::tid "
+                    f"AND e.path_id IS NULL AND e.project_id = m.project_id AND e.path = m.path"
+                )
+        cursor.execute('DROP TABLE path_id_map')
+
+
+def rebuild_rollups(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT min(event_date), max(event_date) FROM backend_event')
+        start, end = cursor.fetchone()
+    day = start
+    while day is not None and day <= end:
+        day_start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE")
+            cursor.execute('DELETE FROM agent_path_daily_rollup WHERE event_date = %s', [day])
+            cursor.execute(
+                'DELETE FROM agent_path_hourly_rollup WHERE bucket >= %s AND bucket < %s',
+                [day_start, day_start + timedelta(days=1)],
+            )
+            cursor.execute(DAILY_ROLLUP_SQL, [day])
+            cursor.execute(HOURLY_ROLLUP_SQL, [day])
+        day += timedelta(days=1)
+
+
+def truncate_rollups(apps, schema_editor):
+    schema_editor.execute(TRUNCATE_ROLLUPS_SQL)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0010_payload_codec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PathTemplate',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('project_id', models.CharField(max_length=255)),
+                ('template', models.TextField()),
+                ('source', models.CharField(default='auto', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('merged_into', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='merged', to='events.pathtemplate')),
+            ],
+            options={
+                'db_table': 'path_template',
+                'constraints': [models.UniqueConstraint(fields=('project_id', 'template'), name='path_template_key')],
+            },
+        ),
+        migrations.AddField(
+            model_name='backendevent',
+            name='path_template',
+            field=models.ForeignKey(blank=True, db_column='path_id', db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='events.pathtemplate'),
+        ),
+        migrations.RunPython(backfill_path_ids, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='backendevent',
+            name='backend_event_agent_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='backendevent',
+            index=models.Index(fields=['agent_id', 'event_date', 'path_template'], include=('latency_ms',), name='backend_event_agent_date_idx'),
+        ),
+        migrations.RunSQL(TRUNCATE_ROLLUPS_SQL, TRUNCATE_ROLLUPS_SQL),
+        migrations.RemoveConstraint(
+            model_name='agentpathdailyrollup',
+            name='agent_path_daily_rollup_key',
+        ),
+        migrations.RemoveConstraint(
+            model_name='agentpathhourlyrollup',
+            name='agent_path_hourly_rollup_key',
+        ),
+        migrations.RemoveField(
+            model_name='agentpathdailyrollup',
+            name='path',
+        ),
+        migrations.RemoveField(
+            model_name='agentpathhourlyrollup',
+            name='path',
+        ),
+        migrations.AddField(
+            model_name='agentpathdailyrollup',
+            name='path_template',
+            field=models.ForeignKey(db_column='path_id', db_constraint=False, db_index=False, default=0, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='events.pathtemplate'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='agentpathhourlyrollup',
+            name='path_template',
+            field=models.ForeignKey(db_column='path_id', db_constraint=False, db_index=False, default=0, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='events.pathtemplate'),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='agentpathdailyrollup',
+            constraint=models.UniqueConstraint(fields=('agent_id', 'event_date', 'path_template', 'project_id'), name='agent_path_daily_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='agentpathhourlyrollup',
+            constraint=models.UniqueConstraint(fields=('agent_id', 'bucket', 'path_template', 'project_id'), name='agent_path_hourly_rollup_key'),
+        ),
+        migrations.RunPython(rebuild_rollups, truncate_rollups),
+    ]
@@ -0,0 +1,338 @@
+# Stores backend_event.project_id, agent_id and agent_session_id as native
+# uuid (16 bytes) instead of varchar(255) (37 bytes for a UUID string). It
+# runs against a live table, so nothing here holds a lock for longer than a
+# short catalog change:
+#   1. add uuid shadow columns; a trigger fills them on every insert/update;
+#   2. backfill existing rows partition by partition, BACKFILL_BLOCKS heap
+#      pages per transaction;
+#   3. validate project_uuid IS NOT NULL without blocking writes;
+#   4. build the replacement indexes one partition at a time with CREATE
+#      INDEX CONCURRENTLY, attached to an index created ON ONLY the parent;
+#   5. canonicalise the varchar project/agent keys of the rollups and path
+#      templates (below);
+#   6. swap: drop the old columns (which drops their indexes), rename the
+#      shadow columns and indexes into place, drop the trigger.
+# Steps 1-5 can be re-run if the migration is interrupted.
+#
+# Legacy values that are not UUIDs become md5(value)::uuid, which keeps
+# distinct values distinct; empty strings become NULL. New values are
+# validated at ingest.
+#
+# The rollups and path_template keep project_id/agent_id as varchar, and from
+# here on ingest writes them as canonical UUID text (lowercase, hyphenated).
+# Legacy rows keyed by any other spelling of an id ('ABC...', unhyphenated,
+# non-UUID values) would no longer match the events they summarise, so step 5
+# rewrites them to brain_text_uuid(value)::text:
+#   - rollup rows are deleted and re-merged into the canonical row of the
+#     same path and bucket, one table per transaction;
+#   - a legacy path template is renamed to its canonical project id, or, when
+#     the canonical project already has that template, merged into it
+#     (merged_into), which path_labels() follows when reporting rollups.
+#
+# The indexes shrink right away. The heap does not: the backfill writes a new
+# version of every row, and the dropped varchar bytes stay in existing rows
+# (see 0009). Partitions return to their compact size when they are
+# rewritten (`manage.py manage_partitions --rewrite`, off-peak) or age out under
+# EVENT_RETENTION_DAYS.
+#
+# Migrating backwards converts the columns back with ALTER COLUMN TYPE,
+# which rewrites backend_event under an ACCESS EXCLUSIVE lock.
+
+from django.db import migrations, models, transaction
+
+BACKFILL_BLOCKS = 2000
+
+ID_COLUMNS = (
+    ('project_id', 'project_uuid'),
+    ('agent_id', 'agent_uuid'),
+    ('agent_session_id', 'session_uuid'),
+)
+
+# index name -> column list; the same as the current indexes, on the uuid columns.
+INDEXES = {
+    'backend_event_agent_date_idx': '(agent_uuid, event_date, path_id) INCLUDE (latency_ms)',
+    'backend_event_agent_time_idx': '(agent_uuid, event_time)',
+    'backend_event_session_time_idx': '(session_uuid, event_time, event_id)',
+    'backend_event_project_time_idx': '(project_uuid, event_time)',
+}
+
+TEXT_UUID_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION brain_text_uuid(value text) RETURNS uuid
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN value IS NULL OR value = '' THEN NULL
+        WHEN value ~* '^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$' THEN value::uuid
+        ELSE md5(value)::uuid
+    END
+$$;
+"""
+
+ADD_SHADOW_COLUMNS_SQL = TEXT_UUID_FUNCTION_SQL + """
+CREATE OR REPLACE FUNCTION backend_event_fill_uuids() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.project_uuid := brain_text_uuid(NEW.project_id);
+    NEW.agent_uuid := brain_text_uuid(NEW.agent_id);
+    NEW.session_uuid := brain_text_uuid(NEW.agent_session_id);
+    RETURN NEW;
+END
+$$;
+
+ALTER TABLE backend_event
+    ADD COLUMN IF NOT EXISTS project_uuid uuid,
+    ADD COLUMN IF NOT EXISTS agent_uuid uuid,
+    ADD COLUMN IF NOT EXISTS session_uuid uuid;
+
+CREATE OR REPLACE TRIGGER backend_event_fill_uuids
+    BEFORE INSERT OR UPDATE ON backend_event
+    FOR EACH ROW EXECUTE FUNCTION backend_event_fill_uuids();
+
+ALTER TABLE backend_event DROP CONSTRAINT IF EXISTS backend_event_project_uuid_not_null;
+ALTER TABLE backend_event
+    ADD CONSTRAINT backend_event_project_uuid_not_null CHECK (project_uuid IS NOT NULL) NOT VALID;
+"""
+
+DROP_SHADOW_COLUMNS_SQL = """
+ALTER TABLE backend_event DROP CONSTRAINT IF EXISTS backend_event_project_uuid_not_null;
+DROP TRIGGER IF EXISTS backend_event_fill_uuids ON backend_event;
+ALTER TABLE backend_event
+    DROP COLUMN IF EXISTS project_uuid,
+    DROP COLUMN IF EXISTS agent_uuid,
+    DROP COLUMN IF EXISTS session_uuid;
+DROP FUNCTION IF EXISTS backend_event_fill_uuids();
+DROP FUNCTION IF EXISTS brain_text_uuid(text);
+"""
+
+VALIDATE_SQL = 'ALTER TABLE backend_event VALIDATE CONSTRAINT backend_event_project_uuid_not_null'
+
+# Every partition, the default one included.
+PARTITIONS_SQL = (
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'backend_event'::regclass ORDER BY c.relname"
+)
+
+
+# Canonical varchar form of a legacy id; '' (no agent) stays ''.
+def _canonical_sql(column):
+    return f"COALESCE(brain_text_uuid({column})::text, '')"
+
+
+NON_CANONICAL_SQL = (
+    f"(project_id <> {_canonical_sql('project_id')} OR agent_id <> {_canonical_sql('agent_id')})"
+)
+
+# rollup table -> bucket column; the delta table (0014) and session_summary
+# (0013) do not exist yet and are written from the converted columns.
+ROLLUP_TABLES = {
+    'agent_path_daily_rollup': 'event_date',
+    'agent_path_hourly_rollup': 'bucket',
+}
+
+# Frozen copy of events.rollups as of this migration: how partial rows of one
+# key combine (ROLLUP_COMBINE_SQL) and how a combined row is merged into an
+# existing one on conflict (ROLLUP_MERGE_SQL).
+ROLLUP_COMBINE_SQL = {
+    'request_count': 'sum(request_count)',
+    'error_count': 'sum(error_count)',
+    'status_2xx': 'sum(status_2xx)',
+    'status_3xx': 'sum(status_3xx)',
+    'status_4xx': 'sum(status_4xx)',
+    'status_5xx': 'sum(status_5xx)',
+    'latency_sum': 'sum(latency_sum)',
+    'latency_min': 'min(latency_min)',
+    'latency_max': 'max(latency_max)',
+    'request_bytes': 'sum(request_bytes)',
+    'response_bytes': 'sum(response_bytes)',
+    'latency_sketch': 'ddsketch_merge_agg(latency_sketch)',
+}
+ROLLUP_MERGE_SQL = {
+    'latency_min': 'LEAST(t.latency_min, EXCLUDED.latency_min)',
+    'latency_max': 'GREATEST(t.latency_max, EXCLUDED.latency_max)',
+    'latency_sketch': 'ddsketch_merge(t.latency_sketch, EXCLUDED.latency_sketch)',
+}
+
+
+def _canonicalise_rollup_sql(table, bucket_column):
+    columns = ', '.join(ROLLUP_COMBINE_SQL)
+    merges = ', '.join(
+        f"{column} = {ROLLUP_MERGE_SQL.get(column, f't.{column} + EXCLUDED.{column}')}"
+        for column in ROLLUP_COMBINE_SQL
+    )
+    return (
+        f"WITH legacy AS (DELETE FROM {table} WHERE {NON_CANONICAL_SQL} RETURNING *) "
+        f"INSERT INTO {table} AS t (project_id, agent_id, path_id, {bucket_column}, {columns}) "
+        f"SELECT {_canonical_sql('project_id')}, {_canonical_sql('agent_id')}, path_id, {bucket_column}, "
+        f"{', '.join(ROLLUP_COMBINE_SQL.values())} FROM legacy GROUP BY 1, 2, 3, 4 "
+        f"ON CONFLICT (agent_id, {bucket_column}, path_id, project_id) DO UPDATE SET {merges}"
+    )
+
+
+# Legacy templates whose canonical project already has the same template are
+# merged into it (or into what it is merged into, as path_labels() follows a
+# single hop), together with the templates merged into them.
+MERGE_PATH_TEMPLATES_SQL = f"""
+WITH twins AS (
+    SELECT legacy.id AS legacy_id, COALESCE(canonical.merged_into_id, canonical.id) AS canonical_id
+    FROM path_template legacy
+    JOIN path_template canonical
+      ON canonical.project_id = {_canonical_sql('legacy.project_id')}
+     AND canonical.template = legacy.template
+    WHERE legacy.project_id <> canonical.project_id
+)
+UPDATE path_template p SET merged_into_id = twins.canonical_id
+FROM twins
+WHERE p.id = twins.legacy_id OR p.merged_into_id = twins.legacy_id
+"""
+
+# The remaining legacy templates move to the canonical project id, one per
+# (canonical project, template); a second MERGE_PATH_TEMPLATES_SQL folds in
+# other spellings of the same project.
+RENAME_PATH_TEMPLATES_SQL = f"""
+UPDATE path_template SET project_id = {_canonical_sql('project_id')}
+WHERE id IN (
+    SELECT DISTINCT ON ({_canonical_sql('legacy.project_id')}, legacy.template) legacy.id
+    FROM path_template legacy
+    WHERE legacy.project_id <> {_canonical_sql('legacy.project_id')}
+      AND NOT EXISTS (
+        SELECT 1 FROM path_template canonical
+        WHERE canonical.project_id = {_canonical_sql('legacy.project_id')}
+          AND canonical.template = legacy.template
+      )
+    ORDER BY {_canonical_sql('legacy.project_id')}, legacy.template, legacy.id
+)
+"""
+
+
+def canonicalise_rollup_keys(apps, schema_editor):
+    """
+    Step 5: rewrites non-canonical project/agent ids in the rollups and
+    path_template, one table per transaction. Needs brain_text_uuid().
+    """
+    connection = schema_editor.connection
+    for table, bucket_column in ROLLUP_TABLES.items():
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            # Keeps ingest from adding a row for a key while it is re-merged.
+            cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+            cursor.execute(_canonicalise_rollup_sql(table, bucket_column))
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('LOCK TABLE path_template IN EXCLUSIVE MODE')
+        cursor.execute(MERGE_PATH_TEMPLATES_SQL)
+        cursor.execute(RENAME_PATH_TEMPLATES_SQL)
+        cursor.execute(MERGE_PATH_TEMPLATES_SQL)
+
+
+def _partitions(cursor):
+    cursor.execute(PARTITIONS_SQL)
+    return [name for (name,) in cursor.fetchall()]
+
+
+def backfill(apps, schema_editor):
+    assignments = ', '.join(f'{new} = brain_text_uuid({old})' for old, new in ID_COLUMNS)
+    with schema_editor.connection.cursor() as cursor:
+        for name in _partitions(cursor):
+            cursor.execute(
+                "SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int", [name],
+            )
+            pages = cursor.fetchone()[0]
+            # Rows that updates or new inserts place beyond `pages` already
+            # went through the trigger.
+            for first in range(0, pages, BACKFILL_BLOCKS):
+                cursor.execute(
+                    f"UPDATE {name} SET {assignments} "
+                    f"WHERE ctid >= '({first},0)'::tid AND ctid < '({first + BACKFILL_BLOCKS},0)'::tid "
+                    f"AND project_uuid IS NULL"
+                )
+            cursor.execute(f'VACUUM (ANALYZE) {name}')
+
+
+def build_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        partitions = _partitions(cursor)
+        for index, columns in INDEXES.items():
+            parent_index = f'{index}_uuid'
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {parent_index} ON ONLY backend_event {columns}')
+            for name in partitions:
+                child_index = f'{name}_{index[len("backend_event_"):]}_uuid'
+                # A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind.
+                cursor.execute(
+                    'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [child_index],
+                )
+                row = cursor.fetchone()
+                if row and not row[0]:
+                    cursor.execute(f'DROP INDEX CONCURRENTLY {child_index}')
+                cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {child_index} ON {name} {columns}')
+                cursor.execute(f'ALTER INDEX {parent_index} ATTACH PARTITION {child_index}')
+
+
+def swap_columns(apps, schema_editor):
+    with transaction.atomic(using=schema_editor.connection.alias), schema_editor.connection.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = '10s'")
+        cursor.execute('LOCK TABLE backend_event IN ACCESS EXCLUSIVE MODE')
+        # Backed by the validated CHECK constraint, so no table scan.
+        cursor.execute('ALTER TABLE backend_event ALTER COLUMN project_uuid SET NOT NULL')
+        cursor.execute('ALTER TABLE backend_event DROP CONSTRAINT backend_event_project_uuid_not_null')
+        cursor.execute('DROP TRIGGER backend_event_fill_uuids ON backend_event')
+        cursor.execute(
+            'ALTER TABLE backend_event ' + ', '.join(f'DROP COLUMN {old}' for old, _ in ID_COLUMNS)
+        )
+        for old, new in ID_COLUMNS:
+            cursor.execute(f'ALTER TABLE backend_event RENAME COLUMN {new} TO {old}')
+        for index in INDEXES:
+            cursor.execute(f'ALTER INDEX {index}_uuid RENAME TO {index}')
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass AND c.relname LIKE '%%\\_uuid'",
+                [index],
+            )
+            for (child,) in cursor.fetchall():
+                cursor.execute(f'ALTER INDEX {child} RENAME TO {child[:-len("_uuid")]}')
+        cursor.execute('DROP FUNCTION backend_event_fill_uuids()')
+        cursor.execute('DROP FUNCTION brain_text_uuid(text)')
+
+
+def unswap_columns(apps, schema_editor):
+    with transaction.atomic(using=schema_editor.connection.alias), schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'ALTER TABLE backend_event ' + ', '.join(
+                f'ALTER COLUMN {old} TYPE varchar(255) USING {old}::text' for old, _ in ID_COLUMNS
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0011_path_templates'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ADD_SHADOW_COLUMNS_SQL, DROP_SHADOW_COLUMNS_SQL),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RunSQL(VALIDATE_SQL, migrations.RunSQL.noop),
+        migrations.RunPython(build_indexes, migrations.RunPython.noop),
+        migrations.RunPython(canonicalise_rollup_keys, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(swap_columns, unswap_columns),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='backendevent',
+                    name='project_id',
+                    field=models.UUIDField(),
+                ),
+                migrations.AlterField(
+                    model_name='backendevent',
+                    name='agent_id',
+                    field=models.UUIDField(blank=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='backendevent',
+                    name='agent_session_id',
+                    field=models.UUIDField(blank=True, null=True),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Adds session_summary (events/rollups.py) and fills it from the existing
+# events. Not atomic, so each batch of sessions commits on its own; a batch
+# locks only its own session_summary rows.
+#
+# The SQL below is a frozen copy of events.rollups.rebuild_session_summaries
+# as of this migration, so later changes to that module do not change what
+# it does.
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+SESSIONS_SQL = (
+    'SELECT agent_session_id::text, min(event_date), max(event_date) FROM backend_event '
+    'WHERE agent_session_id IS NOT NULL GROUP BY agent_session_id'
+)
+
+# Empty rows to lock for sessions without one; they are filled in (or
+# deleted) before the batch commits.
+CLAIM_SQL = """
+INSERT INTO session_summary (
+    agent_session_id, project_id, agent_id, first_event_time, last_event_time,
+    request_count, error_count, latency_sum, latency_max, request_bytes, response_bytes
+)
+SELECT id, id, NULL, now(), now(), 0, 0, 0, 0, 0, 0 FROM unnest(%s::uuid[]) AS id ORDER BY id
+ON CONFLICT (agent_session_id) DO NOTHING
+"""
+
+LOCK_SQL = 'SELECT 1 FROM session_summary WHERE agent_session_id = ANY(%s::uuid[]) ORDER BY agent_session_id FOR UPDATE'
+
+SUMMARY_SQL = """
+UPDATE session_summary AS t SET
+    project_id = s.project_id, agent_id = s.agent_id,
+    first_event_time = s.first_event_time, last_event_time = s.last_event_time,
+    request_count = s.request_count, error_count = s.error_count,
+    latency_sum = s.latency_sum, latency_max = s.latency_max,
+    request_bytes = s.request_bytes, response_bytes = s.response_bytes
+FROM (
+    SELECT agent_session_id, (array_agg(project_id))[1] AS project_id, (array_agg(agent_id))[1] AS agent_id,
+        min(event_time) AS first_event_time, max(event_time) AS last_event_time,
+        count(*) AS request_count, count(*) FILTER (WHERE error IS NOT NULL AND error <> '') AS error_count,
+        sum(latency_ms) AS latency_sum, max(latency_ms) AS latency_max,
+        sum(request_size_bytes) AS request_bytes, sum(response_size_bytes) AS response_bytes
+    FROM backend_event
+    WHERE agent_session_id = ANY(%s::uuid[]) AND event_date BETWEEN %s AND %s
+    GROUP BY agent_session_id
+) s
+WHERE t.agent_session_id = s.agent_session_id
+"""
+
+DELETE_EMPTY_SQL = 'DELETE FROM session_summary WHERE agent_session_id = ANY(%s::uuid[]) AND request_count = 0'
+
+
+def rebuild_session_summaries(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(SESSIONS_SQL)
+        # Batches of sessions that started around the same day read few partitions.
+        sessions = sorted(cursor.fetchall(), key=lambda row: (row[1], row[0]))
+    for offset in range(0, len(sessions), BATCH_SIZE):
+        rows = sessions[offset:offset + BATCH_SIZE]
+        batch = sorted(session_id for session_id, _, _ in rows)
+        first = min(row[1] for row in rows)
+        last = max(row[2] for row in rows)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(CLAIM_SQL, [batch])
+            cursor.execute(LOCK_SQL, [batch])
+            cursor.execute(SUMMARY_SQL, [batch, first, last])
+            cursor.execute(DELETE_EMPTY_SQL, [batch])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('events', '0012_native_uuid_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSummary',
+            fields=[
+                ('agent_session_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('project_id', models.UUIDField()),
+                ('agent_id', models.UUIDField(blank=True, null=True)),
+                ('first_event_time', models.DateTimeField()),
+                ('last_event_time', models.DateTimeField()),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_max', models.FloatField()),
+                ('request_bytes', models.BigIntegerField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'session_summary',
+            },
+        ),
+        migrations.RunPython(rebuild_session_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_session_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentPathRollupDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.CharField(max_length=255)),
+                ('agent_id', models.CharField(default='', max_length=255)),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('status_2xx', models.BigIntegerField(default=0)),
+                ('status_3xx', models.BigIntegerField(default=0)),
+                ('status_4xx', models.BigIntegerField(default=0)),
+                ('status_5xx', models.BigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField()),
+                ('latency_max', models.FloatField()),
+                ('request_bytes', models.BigIntegerField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+                ('latency_sketch', models.JSONField(blank=True, null=True)),
+                ('event_date', models.DateField()),
+                ('bucket', models.DateTimeField()),
+                ('path_template', models.ForeignKey(db_column='path_id', db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='events.pathtemplate')),
+            ],
+            options={
+                'db_table': 'agent_path_rollup_delta',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 19:24
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_rollup_deltas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payloaddictionary',
+            name='compression_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='backendeventpayload',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['dictionary'], name='event_payload_dict_brin'),
+        ),
+    ]
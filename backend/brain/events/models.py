@@ -1,20 +1,72 @@
 import uuid
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from django.utils import timezone
 
 
+class PathTemplate(models.Model):
+    """
+    A templated request path of a project, e.g. "/users/{id}/orders/{id}".
+    BackendEvent and the rollups reference it by its integer id (path_id)
+    so path breakdowns group on a few templates instead of every raw path;
+    see events/paths.py. An automatic template merged into a learned or
+    configured one reports under that one.
+    """
+
+    AUTO = "auto"
+    LEARNED = "learned"
+    CONFIGURED = "configured"
+
+    id = models.AutoField(primary_key=True)
+    project_id = models.CharField(max_length=255)
+    template = models.TextField()
+    source = models.CharField(max_length=16, default=AUTO)
+    merged_into = models.ForeignKey(
+        "self",
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="merged",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "path_template"
+        constraints = [
+            models.UniqueConstraint(fields=["project_id", "template"], name="path_template_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.template} ({self.source})"
+
+
 class BackendEvent(models.Model):
+    # The table is range-partitioned on event_date (migration 0002, managed by
+    # events/partitions.py); in the database the primary key is
+    # (event_id, event_date). Filter on event_date to get partition pruning.
 
     event_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
-    event_time = models.DateTimeField(default=timezone.now, db_index=True)
-    event_date = models.DateField(editable=False, db_index=True)
+    event_time = models.DateTimeField(default=timezone.now)
+    event_date = models.DateField(editable=False)
 
-    project_id = models.CharField(max_length=255, db_index=True)
-    agent_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
-    agent_session_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    # Native uuid columns (migration 0012); ingest rejects ids that are not UUIDs.
+    project_id = models.UUIDField()
+    agent_id = models.UUIDField(blank=True, null=True)
+    agent_session_id = models.UUIDField(blank=True, null=True)
 
-    path = models.TextField(db_index=True)
+    # The raw path, for drill-down; analytics group by path_template.
+    path = models.TextField()
+    path_template = models.ForeignKey(
+        PathTemplate,
+        blank=True,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        db_column="path_id",
+        related_name="+",
+    )
     method = models.CharField(max_length=20)
     status_code = models.PositiveIntegerField()
 
@@ -22,13 +74,7 @@ class BackendEvent(models.Model):
     request_size_bytes = models.PositiveIntegerField(default=0)
     response_size_bytes = models.PositiveIntegerField(default=0)
 
-    request_headers = models.TextField(blank=True, null=True)
-    request_body = models.TextField(blank=True, null=True)
-    query_params = models.TextField(blank=True, null=True)
-    post_data = models.TextField(blank=True, null=True)
-
-    response_headers = models.TextField(blank=True, null=True)
-    response_body = models.TextField(blank=True, null=True)
+    # Headers and bodies live in BackendEventPayload (event.payload).
 
     request_content_type = models.CharField(max_length=255, blank=True, null=True)
     response_content_type = models.CharField(max_length=255, blank=True, null=True)
@@ -41,12 +87,39 @@ class BackendEvent(models.Model):
 
     class Meta:
         db_table = "backend_event"
+        # Indexes follow the read paths; every extra one costs each insert.
+        # event_date needs none of its own: it is the partition key.
         indexes = [
-            models.Index(fields=["project_id"]),
-            models.Index(fields=["agent_id"]),
-            models.Index(fields=["agent_session_id"]),
-            models.Index(fields=["path"]),
-            models.Index(fields=["event_date"]),
+            # Raw per-agent analytics over an event_date range (exact
+            # percentiles, rollup rebuilds); latency_ms rides along so those
+            # can be answered from the index alone.
+            models.Index(
+                fields=["agent_id", "event_date", "path_template"],
+                include=["latency_ms"],
+                name="backend_event_agent_date_idx",
+            ),
+            # Minute/5m bucketed analytics read raw events by agent and time.
+            models.Index(
+                fields=["agent_id", "event_time"],
+                name="backend_event_agent_time_idx",
+            ),
+            # Keyset pagination of a session's events (AgentSessionEventsView).
+            models.Index(
+                fields=["agent_session_id", "event_time", "event_id"],
+                name="backend_event_session_time_idx",
+            ),
+            # Project-wide exports in event_time order.
+            models.Index(
+                fields=["project_id", "event_time"],
+                name="backend_event_project_time_idx",
+            ),
+            # Rows arrive in time order, so a BRIN index is enough for plain
+            # time-range scans at a fraction of a B-tree's size and upkeep.
+            BrinIndex(
+                fields=["event_date", "event_time"],
+                autosummarize=True,
+                name="backend_event_time_brin",
+            ),
         ]
 
     def save(self, *args, **kwargs):
@@ -57,3 +130,208 @@ class BackendEvent(models.Model):
 
     def __str__(self):
         return f"{self.method} {self.path} - {self.status_code}"
+
+
+class BackendEventPayload(models.Model):
+    """
+    The large request/response columns of a BackendEvent, in a 1:1 side table
+    so scans of backend_event stay narrow. Partitioned like backend_event
+    (migration 0008, events/partitions.py), with primary key
+    (event_id, event_date) in the database; the ORM relation cannot be a
+    foreign key because event_id alone is not unique there.
+    Rows are written only for events that carry a payload.
+
+    Under EVENT_PAYLOAD_CODEC = 'zstd' the text columns stay empty and the
+    fields are kept zstd-compressed in `packed`, see events/payload_codec.py;
+    read them with payload_codec.payload_values().
+    """
+
+    event = models.OneToOneField(
+        BackendEvent,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_column="event_id",
+        related_name="payload",
+    )
+    event_date = models.DateField()
+
+    request_headers = models.TextField(blank=True, null=True)
+    request_body = models.TextField(blank=True, null=True)
+    query_params = models.TextField(blank=True, null=True)
+    post_data = models.TextField(blank=True, null=True)
+
+    response_headers = models.TextField(blank=True, null=True)
+    response_body = models.TextField(blank=True, null=True)
+
+    packed = models.BinaryField(blank=True, null=True)
+    dictionary = models.ForeignKey(
+        "PayloadDictionary",
+        blank=True,
+        null=True,
+        on_delete=models.PROTECT,
+        db_index=False,
+        related_name="+",
+    )
+
+    class Meta:
+        db_table = "backend_event_payload"
+        indexes = [
+            # Dictionaries are used in creation order, so ids follow the
+            # heap; enough to find (or rule out) rows still using one.
+            BrinIndex(fields=["dictionary"], autosummarize=True, name="event_payload_dict_brin"),
+        ]
+
+    def __str__(self):
+        return f"payload of {self.event_id}"
+
+
+PAYLOAD_FIELDS = (
+    "request_headers", "request_body", "query_params", "post_data",
+    "response_headers", "response_body",
+)
+
+
+class PayloadDictionary(models.Model):
+    """
+    A zstd dictionary trained on one project's payloads. The newest one per
+    project compresses new payloads; older ones are kept for as long as rows
+    written with them remain.
+    """
+
+    project_id = models.CharField(max_length=255)
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField()
+    # Raw / packed bytes on samples held out of training; NULL for
+    # dictionaries trained before it was recorded.
+    compression_ratio = models.FloatField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "payload_dictionary"
+        indexes = [
+            models.Index(fields=["project_id", "-created_at"], name="payload_dict_project_idx"),
+        ]
+
+    def __str__(self):
+        return f"dictionary {self.pk} of {self.project_id} ({len(self.data)} bytes)"
+
+
+class AgentPathRollup(models.Model):
+    """
+    Pre-aggregated BackendEvent metrics for one (project, agent, path template) in one
+    time bucket. Maintained incrementally by events/rollups.py, which folds in
+    the deltas staged as events are written; `manage.py rebuild_rollups`
+    recomputes a date range from raw events.
+    agent_id is '' for events captured without an agent.
+    """
+
+    project_id = models.CharField(max_length=255)
+    agent_id = models.CharField(max_length=255, default="")
+    path_template = models.ForeignKey(
+        PathTemplate,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        db_column="path_id",
+        related_name="+",
+    )
+
+    request_count = models.BigIntegerField(default=0)
+    error_count = models.BigIntegerField(default=0)
+    status_2xx = models.BigIntegerField(default=0)
+    status_3xx = models.BigIntegerField(default=0)
+    status_4xx = models.BigIntegerField(default=0)
+    status_5xx = models.BigIntegerField(default=0)
+
+    latency_sum = models.FloatField(default=0)
+    latency_min = models.FloatField()
+    latency_max = models.FloatField()
+
+    request_bytes = models.BigIntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+
+    # DDSketch of latency_ms, see events/sketch.py.
+    latency_sketch = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class AgentPathDailyRollup(AgentPathRollup):
+    event_date = models.DateField()
+
+    class Meta:
+        db_table = "agent_path_daily_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent_id", "event_date", "path_template", "project_id"],
+                name="agent_path_daily_rollup_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} {self.path_template_id} {self.event_date}: {self.request_count}"
+
+
+class AgentPathHourlyRollup(AgentPathRollup):
+    bucket = models.DateTimeField()
+
+    class Meta:
+        db_table = "agent_path_hourly_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent_id", "bucket", "path_template", "project_id"],
+                name="agent_path_hourly_rollup_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} {self.path_template_id} {self.bucket:%Y-%m-%d %H:00}: {self.request_count}"
+
+
+class AgentPathRollupDelta(AgentPathRollup):
+    """
+    Metrics of newly written events for one rollup key, day and hour, staged
+    by events/rollups.py in the transaction that writes the events and folded
+    into both rollups by fold_rollups. Ingest only appends here, so concurrent
+    writers do not wait on each other for the rollup rows.
+    """
+
+    event_date = models.DateField()
+    bucket = models.DateTimeField()
+
+    class Meta:
+        db_table = "agent_path_rollup_delta"
+
+    def __str__(self):
+        return f"delta {self.agent_id} {self.path_template_id} {self.bucket:%Y-%m-%d %H:00}: {self.request_count}"
+
+
+class SessionSummary(models.Model):
+    """
+    Running totals of one agent session's BackendEvents, so session lists
+    need no scan of backend_event. Maintained by events/rollups.py in the
+    transaction that writes the events; `manage.py rebuild_session_summaries`
+    recomputes them from raw events.
+    """
+
+    agent_session_id = models.UUIDField(primary_key=True)
+    project_id = models.UUIDField()
+    agent_id = models.UUIDField(blank=True, null=True)
+
+    first_event_time = models.DateTimeField()
+    last_event_time = models.DateTimeField()
+
+    request_count = models.BigIntegerField(default=0)
+    error_count = models.BigIntegerField(default=0)
+    latency_sum = models.FloatField(default=0)
+    latency_max = models.FloatField()
+    request_bytes = models.BigIntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "session_summary"
+
+    def __str__(self):
+        return f"session {self.agent_session_id}: {self.request_count}"
@@ -0,0 +1,197 @@
+"""
+Range partition management for the backend_event and backend_event_payload
+tables.
+
+Both are partitioned by RANGE (event_date), see migrations
+0002_partition_backend_event and 0008_backend_event_payload, and always get
+the same ranges. Partitions are named <table>_p<YYYYMMDD> after their lower
+bound and sized by EVENT_PARTITION_INTERVAL ('day' or 'week'). A DEFAULT
+partition (<table>_default) catches rows outside every range; when a range is
+later created, its rows are moved out of the default partition.
+"""
+import logging
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .payload_codec import delete_unused_payload_dictionaries
+from .response_cache import invalidate_all
+
+logger = logging.getLogger(__name__)
+
+EVENT_PARTITION_INTERVAL = getattr(settings, 'EVENT_PARTITION_INTERVAL', 'day')
+EVENT_PARTITION_PRECREATE_DAYS = getattr(settings, 'EVENT_PARTITION_PRECREATE_DAYS', 14)
+EVENT_RETENTION_DAYS = getattr(settings, 'EVENT_RETENTION_DAYS', None)
+EVENT_RETENTION_DETACH_ONLY = getattr(settings, 'EVENT_RETENTION_DETACH_ONLY', False)
+
+PARENT_TABLE = 'backend_event'
+PARTITIONED_TABLES = (PARENT_TABLE, 'backend_event_payload')
+_LOCK_NAME = 'backend_event_partitions'
+
+_BOUND_RE = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def _next_boundary(day):
+    if EVENT_PARTITION_INTERVAL == 'week':
+        return day + timedelta(days=7 - day.weekday())
+    return day + timedelta(days=1)
+
+
+def list_partitions(cursor, parent=PARENT_TABLE):
+    """
+    Returns [(name, lower, upper)] for every range partition of parent,
+    ordered by lower bound. The default partition is not included.
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        [parent],
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND_RE.search(bound or '')
+        if match:
+            partitions.append((name, date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def _column_list(cursor, table):
+    """
+    The quoted column names of table, in order, for copying rows by name:
+    partitions can order their columns differently from their parent.
+    """
+    cursor.execute(
+        'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped '
+        'ORDER BY attnum',
+        [table],
+    )
+    return ', '.join(connection.ops.quote_name(name) for (name,) in cursor.fetchall())
+
+
+def _create_partition(cursor, lower, upper, parent):
+    """
+    Creates the [lower, upper) partition, first moving any rows for that
+    range out of the default partition so the ATTACH does not fail. The
+    default partition stays locked until the transaction ends, so no row
+    for the range can land in it between the move and the ATTACH.
+    """
+    name = f'{parent}_p{lower:%Y%m%d}'
+    default = f'{parent}_default'
+    cursor.execute(f'CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(f'LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE')
+    columns = _column_list(cursor, parent)
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {default} WHERE event_date >= %s AND event_date < %s RETURNING {columns}) '
+        f'INSERT INTO {name} ({columns}) SELECT {columns} FROM moved',
+        [lower, upper],
+    )
+    cursor.execute(
+        f'ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+        [lower, upper],
+    )
+    logger.info('Created partition %s [%s, %s)', name, lower, upper)
+    return name
+
+
+def _fill_gaps(cursor, parent, start, end):
+    gaps = []
+    position = start
+    for _, lower, upper in list_partitions(cursor, parent):
+        if upper <= position:
+            continue
+        if lower >= end:
+            break
+        if lower > position:
+            gaps.append((position, lower))
+        position = max(position, upper)
+    if position < end:
+        gaps.append((position, end))
+
+    created = []
+    for gap_start, gap_end in gaps:
+        lower = gap_start
+        while lower < gap_end:
+            upper = min(_next_boundary(lower), gap_end)
+            created.append(_create_partition(cursor, lower, upper, parent))
+            lower = upper
+    return created
+
+
+def ensure_partitions(start, end):
+    """
+    Makes sure every date in [start, end) falls into a range partition of
+    every table in PARTITIONED_TABLES, creating interval-aligned partitions
+    for the gaps. Safe to call concurrently; callers are serialised by an
+    advisory lock. Returns the names of the partitions created.
+    """
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [_LOCK_NAME])
+        for parent in PARTITIONED_TABLES:
+            created += _fill_gaps(cursor, parent, start, end)
+    return created
+
+
+def expire_partitions(retention_days, detach_only=False):
+    """
+    Detaches (and unless detach_only, drops) every partition of the tables in
+    PARTITIONED_TABLES whose whole range is older than retention_days.
+    Cached analytics may include the expired events, so they are invalidated
+    once the partitions are gone, and payload dictionaries that only dropped
+    rows used are deleted. Returns the affected partition names.
+    """
+    cutoff = timezone.now().date() - timedelta(days=retention_days)
+    expired = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [_LOCK_NAME])
+        for parent in PARTITIONED_TABLES:
+            for name, _, upper in list_partitions(cursor, parent):
+                if upper > cutoff:
+                    continue
+                cursor.execute(f'ALTER TABLE {parent} DETACH PARTITION {name}')
+                if not detach_only:
+                    cursor.execute(f'DROP TABLE {name}')
+                logger.info('%s expired partition %s', 'Detached' if detach_only else 'Dropped', name)
+                expired.append(name)
+        if expired:
+            transaction.on_commit(invalidate_all)
+            if not detach_only:
+                # Detached partitions may still be read, with their dictionaries.
+                transaction.on_commit(delete_unused_payload_dictionaries)
+    return expired
+
+
+def rewrite_partitions(parent=PARENT_TABLE):
+    """
+    Rewrites every partition of parent compactly with VACUUM (FULL, ANALYZE),
+    one at a time, e.g. to reclaim the bytes of the columns 0008 dropped.
+    Each rewrite holds an ACCESS EXCLUSIVE lock on its partition, blocking
+    ingest into it, so run this off-peak. VACUUM cannot run inside a
+    transaction. Returns the names of the partitions rewritten.
+    """
+    with connection.cursor() as cursor:
+        names = [name for name, _, _ in list_partitions(cursor, parent)] + [f'{parent}_default']
+        for name in names:
+            cursor.execute(f'VACUUM (FULL, ANALYZE) {name}')
+            logger.info('Rewrote partition %s', name)
+    return names
+
+
+def manage_partitions():
+    """
+    Pre-creates partitions through today + EVENT_PARTITION_PRECREATE_DAYS and
+    applies EVENT_RETENTION_DAYS. Returns (created, expired).
+    """
+    today = timezone.now().date()
+    created = ensure_partitions(today, today + timedelta(days=EVENT_PARTITION_PRECREATE_DAYS + 1))
+    expired = []
+    if EVENT_RETENTION_DAYS:
+        expired = expire_partitions(EVENT_RETENTION_DAYS, EVENT_RETENTION_DETACH_ONLY)
+    return created, expired
@@ -0,0 +1,217 @@
+"""
+Path templates: the low-cardinality form of BackendEvent.path.
+
+At ingest every raw path is mapped to a PathTemplate of its project, and the
+event stores that template's integer id (path_id) next to the raw path.
+Rollups and path breakdowns group by path_id, so "/users/123/orders/987"
+and "/users/124/orders/5" are one series, "/users/{id}/orders/{id}".
+
+A path gets the first of:
+    1. the most specific configured or learned template of its project that
+       matches it segment by segment ("{...}" matches any one segment);
+    2. its automatic template: the path without query string, with numeric,
+       UUID and long hash-like segments replaced by {id}. Automatic
+       templates are created the first time they are seen.
+
+learn_path_templates() looks for segment positions where many automatic
+templates of a project differ only by a literal (e.g. /users/alice,
+/users/bob) and learns a template with {param} there. Adding a configured
+or learned template merges the automatic templates it covers into it
+(merged_into); path_labels() follows that, so rollups written before it
+report under the new template too.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from ttl_cache import TTLCache, MISSING
+from .models import PathTemplate
+
+PATH_TEMPLATE_CACHE_TTL = getattr(settings, 'PATH_TEMPLATE_CACHE_TTL', 300)
+PATH_TEMPLATE_CACHE_MAXSIZE = getattr(settings, 'PATH_TEMPLATE_CACHE_MAXSIZE', 100000)
+PATH_TEMPLATE_LEARN_MIN_VARIANTS = getattr(settings, 'PATH_TEMPLATE_LEARN_MIN_VARIANTS', 50)
+
+ID_SEGMENT = '{id}'
+PARAM_SEGMENT = '{param}'
+# Keeps the (project_id, template) unique index within B-tree limits.
+MAX_TEMPLATE_LENGTH = 1024
+
+_ID_RE = re.compile(
+    r'\d+'
+    r'|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+    r'|[0-9a-fA-F]{16,}'
+    r'|(?=[A-Za-z_-]*\d)[A-Za-z0-9_-]{20,}'
+)
+
+# (project_id, raw path) -> path_id
+_path_ids = TTLCache(maxsize=PATH_TEMPLATE_CACHE_MAXSIZE, ttl=PATH_TEMPLATE_CACHE_TTL)
+# project_id -> [(segments, path_id)] of configured and learned templates,
+# most specific first
+_patterns = TTLCache(maxsize=10000, ttl=PATH_TEMPLATE_CACHE_TTL)
+
+
+def _is_placeholder(segment):
+    return segment.startswith('{') and segment.endswith('}')
+
+
+def _strip_query(path):
+    return str(path).split('?', 1)[0].split('#', 1)[0] or '/'
+
+
+def auto_template(path):
+    """
+    The automatic template of a raw path.
+    """
+    segments = _strip_query(path).split('/')
+    template = '/'.join(ID_SEGMENT if _ID_RE.fullmatch(segment) else segment for segment in segments)
+    return template[:MAX_TEMPLATE_LENGTH]
+
+
+def _matches(pattern, segments):
+    return len(pattern) == len(segments) and all(
+        expected == segment or _is_placeholder(expected) for expected, segment in zip(pattern, segments)
+    )
+
+
+def _project_patterns(project_id):
+    patterns = _patterns.get(project_id)
+    if patterns is MISSING:
+        rows = PathTemplate.objects.filter(
+            project_id=project_id, source__in=(PathTemplate.LEARNED, PathTemplate.CONFIGURED),
+        ).values_list('template', 'id')
+        patterns = sorted(
+            ((template.split('/'), path_id) for template, path_id in rows),
+            key=lambda item: (-sum(not _is_placeholder(segment) for segment in item[0]), '/'.join(item[0])),
+        )
+        _patterns.set(project_id, patterns)
+    return patterns
+
+
+def _match(project_id, path):
+    segments = _strip_query(path).split('/')
+    for pattern, path_id in _project_patterns(project_id):
+        if _matches(pattern, segments):
+            return path_id
+    return None
+
+
+def resolve_path_ids(pairs):
+    """
+    Returns {(project_id, path): path_id} for an iterable of (project_id,
+    raw path), creating the automatic templates that do not exist yet.
+    """
+    resolved = {}
+    missing = {}
+    for key in set(pairs):
+        path_id = _path_ids.get(key)
+        if path_id is MISSING:
+            path_id = _match(*key)
+        if path_id is None:
+            missing[key] = auto_template(key[1])
+        else:
+            resolved[key] = path_id
+
+    if missing:
+        wanted = set((project_id, template) for (project_id, _), template in missing.items())
+        PathTemplate.objects.bulk_create(
+            [PathTemplate(project_id=project_id, template=template) for project_id, template in wanted],
+            ignore_conflicts=True,
+        )
+        lookup = Q()
+        for project_id, template in wanted:
+            lookup |= Q(project_id=project_id, template=template)
+        ids = {
+            (project_id, template): path_id
+            for path_id, project_id, template in PathTemplate.objects.filter(lookup).values_list(
+                'id', 'project_id', 'template',
+            )
+        }
+        for key, template in missing.items():
+            resolved[key] = ids[(key[0], template)]
+
+    for key, path_id in resolved.items():
+        _path_ids.set(key, path_id)
+    return resolved
+
+
+def path_labels(path_ids):
+    """
+    {path_id: (label path_id, label template)} for the given ids, following
+    merged_into, for reporting rollup rows.
+    """
+    labels = {}
+    rows = PathTemplate.objects.filter(id__in=set(path_ids)).values_list(
+        'id', 'template', 'merged_into_id', 'merged_into__template',
+    )
+    for path_id, template, merged_id, merged_template in rows:
+        labels[path_id] = (merged_id, merged_template) if merged_id else (path_id, template)
+    return labels
+
+
+def add_template(project_id, template, source=PathTemplate.CONFIGURED):
+    """
+    Registers a configured (or learned) template and merges the automatic
+    templates it covers into it. Returns (PathTemplate, merged count).
+    Other processes pick it up within PATH_TEMPLATE_CACHE_TTL seconds.
+    """
+    path_template, _ = PathTemplate.objects.get_or_create(
+        project_id=project_id, template=template, defaults={'source': source},
+    )
+    autos = PathTemplate.objects.filter(project_id=project_id, source=PathTemplate.AUTO)
+    if source == PathTemplate.LEARNED:
+        # Learning never overrides an explicit configuration.
+        autos = autos.filter(merged_into=None)
+    pattern = template.split('/')
+    covered = [
+        path_id for path_id, auto in autos.values_list('id', 'template')
+        if _matches(pattern, auto.split('/'))
+    ]
+    merged = PathTemplate.objects.filter(pk__in=covered).update(merged_into=path_template)
+    _patterns.delete(project_id)
+    return path_template, merged
+
+
+def learn_path_templates(project_id, min_variants=PATH_TEMPLATE_LEARN_MIN_VARIANTS):
+    """
+    Learns a {param} template wherever at least min_variants unmerged
+    automatic templates of the project differ only in one literal segment.
+    The first segment is left alone, as it usually names distinct APIs.
+    Returns the learned PathTemplates.
+    """
+    groups = {}
+    for path_id, template in PathTemplate.objects.filter(
+        project_id=project_id, source=PathTemplate.AUTO, merged_into=None,
+    ).values_list('id', 'template'):
+        segments = template.split('/')
+        for position in range(2, len(segments)):
+            if segments[position] and not _is_placeholder(segments[position]):
+                key = '/'.join(segments[:position] + [PARAM_SEGMENT] + segments[position + 1:])
+                groups.setdefault(key, set()).add(path_id)
+
+    learned = []
+    taken = set()
+    for key, path_ids in sorted(groups.items(), key=lambda item: (-len(item[1]), item[0])):
+        if len(path_ids - taken) < min_variants:
+            continue
+        path_template, _ = add_template(project_id, key, PathTemplate.LEARNED)
+        taken |= path_ids
+        learned.append(path_template)
+    return learned
+
+
+def learn_all_path_templates():
+    """
+    Runs learn_path_templates for every project with enough unmerged
+    automatic templates. Returns the learned PathTemplates.
+    """
+    projects = (
+        PathTemplate.objects.filter(source=PathTemplate.AUTO, merged_into=None)
+        .values('project_id').annotate(templates=Count('id'))
+        .filter(templates__gte=PATH_TEMPLATE_LEARN_MIN_VARIANTS)
+        .values_list('project_id', flat=True)
+    )
+    learned = []
+    for project_id in projects:
+        learned += learn_path_templates(project_id)
+    return learned
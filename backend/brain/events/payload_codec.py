@@ -0,0 +1,279 @@
+"""
+Optional zstd storage codec for event payloads (BackendEventPayload).
+
+With EVENT_PAYLOAD_CODEC = 'zstd', the payload fields of an event are stored
+as a single zstd frame of their JSON in BackendEventPayload.packed, and the
+text columns stay empty. The frame is compressed with the newest
+PayloadDictionary of the event's project. Before the first dictionary is
+trained, no dictionary is used. Agents repeat the same headers and body
+shapes on every request, so a dictionary trained on a project's own payloads
+compresses even rows of a few hundred bytes well, which plain zstd (and
+Postgres' TOAST compression, which skips values under ~2kB) cannot.
+
+'plain' (the default) writes the text columns. payload_values() reads rows
+written under either codec, so the setting can be changed at any time.
+
+Dictionaries are retrained by retrain_payload_dictionaries (celery beat,
+EVENT_PAYLOAD_DICT_RETRAIN_INTERVAL) once a project's payloads compress
+noticeably worse than when its dictionary was trained. Rows keep
+referencing the dictionary they were written with, so a superseded one is
+deleted only when retention has dropped the last of them
+(delete_unused_payload_dictionaries, after expire_partitions).
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import zstandard
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import AgentPathDailyRollup, BackendEventPayload, PayloadDictionary, PAYLOAD_FIELDS
+
+logger = logging.getLogger(__name__)
+
+EVENT_PAYLOAD_CODEC = getattr(settings, 'EVENT_PAYLOAD_CODEC', 'plain')
+EVENT_PAYLOAD_ZSTD_LEVEL = getattr(settings, 'EVENT_PAYLOAD_ZSTD_LEVEL', 3)
+EVENT_PAYLOAD_DICT_SIZE = getattr(settings, 'EVENT_PAYLOAD_DICT_SIZE', 32 * 1024)
+EVENT_PAYLOAD_DICT_SAMPLES = getattr(settings, 'EVENT_PAYLOAD_DICT_SAMPLES', 5000)
+EVENT_PAYLOAD_DICT_MIN_SAMPLES = getattr(settings, 'EVENT_PAYLOAD_DICT_MIN_SAMPLES', 200)
+EVENT_PAYLOAD_DICT_SAMPLE_DAYS = getattr(settings, 'EVENT_PAYLOAD_DICT_SAMPLE_DAYS', 7)
+EVENT_PAYLOAD_DICT_CACHE_TTL = getattr(settings, 'EVENT_PAYLOAD_DICT_CACHE_TTL', 300)
+EVENT_PAYLOAD_DICT_MAX_DEGRADATION = getattr(settings, 'EVENT_PAYLOAD_DICT_MAX_DEGRADATION', 0.1)
+
+# Share of the samples held out of training to measure the compression ratio.
+_HOLDOUT = 0.2
+
+# dictionary id -> ZstdCompressionDict, least recently used first;
+# dictionaries never change.
+_dictionaries = OrderedDict()
+_dictionaries_lock = threading.Lock()
+_MAX_DICTIONARIES = 256
+# project_id -> (expires_at, newest dictionary id or None)
+_current = {}
+# (De)compressors are not thread-safe, so each thread keeps its own.
+_local = threading.local()
+_MAX_CODERS = 256
+
+
+def encode_payload(values):
+    """
+    The bytes that get compressed: the non-null fields of values as JSON.
+    Dictionaries are trained on this same encoding.
+    """
+    return json.dumps(
+        {field: values[field] for field in PAYLOAD_FIELDS if values.get(field) is not None},
+        separators=(',', ':'),
+    ).encode()
+
+
+def _dictionary(dictionary_id):
+    if dictionary_id is None:
+        return None
+    with _dictionaries_lock:
+        zdict = _dictionaries.get(dictionary_id)
+        if zdict is not None:
+            _dictionaries.move_to_end(dictionary_id)
+            return zdict
+    data = PayloadDictionary.objects.values_list('data', flat=True).get(pk=dictionary_id)
+    zdict = zstandard.ZstdCompressionDict(bytes(data))
+    with _dictionaries_lock:
+        _dictionaries[dictionary_id] = zdict
+        while len(_dictionaries) > _MAX_DICTIONARIES:
+            _dictionaries.popitem(last=False)
+    return zdict
+
+
+def new_compressor(zdict=None, level=EVENT_PAYLOAD_ZSTD_LEVEL):
+    # Rows store their dictionary id and need no checksum; skip both.
+    return zstandard.ZstdCompressor(level=level, dict_data=zdict, write_checksum=False, write_dict_id=False)
+
+
+def _coder(kind, dictionary_id, level=None):
+    coders = _local.__dict__.setdefault(kind, {})
+    key = (dictionary_id, level)
+    coder = coders.get(key)
+    if coder is None:
+        if len(coders) >= _MAX_CODERS:
+            coders.clear()
+        zdict = _dictionary(dictionary_id)
+        if kind == 'compressors':
+            coder = new_compressor(zdict, level)
+        else:
+            coder = zstandard.ZstdDecompressor(dict_data=zdict)
+        coders[key] = coder
+    return coder
+
+
+def compress(data, dictionary_id=None, level=None):
+    level = EVENT_PAYLOAD_ZSTD_LEVEL if level is None else level
+    return _coder('compressors', dictionary_id, level).compress(data)
+
+
+def decompress(data, dictionary_id=None):
+    return _coder('decompressors', dictionary_id).decompress(data)
+
+
+def current_dictionary_id(project_id):
+    """
+    Newest dictionary of the project, re-read every
+    EVENT_PAYLOAD_DICT_CACHE_TTL seconds so retrained ones get picked up.
+    """
+    now = time.monotonic()
+    cached = _current.get(project_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    dictionary_id = (
+        PayloadDictionary.objects.filter(project_id=project_id)
+        .order_by('-created_at').values_list('pk', flat=True).first()
+    )
+    _current[project_id] = (now + EVENT_PAYLOAD_DICT_CACHE_TTL, dictionary_id)
+    return dictionary_id
+
+
+def pack_payload(project_id, values):
+    """
+    Returns (dictionary_id, packed bytes) for the payload values of an event
+    of project_id, or None when the payload should be stored as plain text:
+    under the 'plain' codec, or when compression would not make it smaller.
+    """
+    if EVENT_PAYLOAD_CODEC != 'zstd':
+        return None
+    raw = encode_payload(values)
+    dictionary_id = current_dictionary_id(project_id)
+    packed = compress(raw, dictionary_id)
+    if len(packed) >= len(raw):
+        return None
+    return dictionary_id, packed
+
+
+def build_payload(event, values):
+    """
+    Unsaved BackendEventPayload of event holding values, packed per
+    EVENT_PAYLOAD_CODEC.
+    """
+    packed = pack_payload(event.project_id, values)
+    if packed is None:
+        return BackendEventPayload(event=event, event_date=event.event_date, **values)
+    dictionary_id, data = packed
+    return BackendEventPayload(event=event, event_date=event.event_date, dictionary_id=dictionary_id, packed=data)
+
+
+def payload_values(payload):
+    """
+    {field: value} for every PAYLOAD_FIELDS entry of payload, decompressing
+    packed rows (once per instance).
+    """
+    values = getattr(payload, '_values', None)
+    if values is None:
+        if payload.packed is None:
+            values = {field: getattr(payload, field) for field in PAYLOAD_FIELDS}
+        else:
+            unpacked = json.loads(decompress(payload.packed, payload.dictionary_id))
+            values = {field: unpacked.get(field) for field in PAYLOAD_FIELDS}
+        payload._values = values
+    return values
+
+
+def sample_payloads(project_id, limit=EVENT_PAYLOAD_DICT_SAMPLES, days=EVENT_PAYLOAD_DICT_SAMPLE_DAYS):
+    """
+    Encoded payloads of up to `limit` recent events of the project, for
+    training and benchmarks.
+    """
+    since = timezone.now().date() - timedelta(days=days)
+    payloads = BackendEventPayload.objects.filter(
+        event_date__gte=since, event__event_date__gte=since, event__project_id=project_id,
+    )[:limit]
+    return [encode_payload(payload_values(payload)) for payload in payloads]
+
+
+def train_dictionary(samples, size=EVENT_PAYLOAD_DICT_SIZE, level=EVENT_PAYLOAD_ZSTD_LEVEL):
+    """
+    Raw dictionary bytes trained on samples. Raises zstandard.ZstdError when
+    the samples are too few or too small for a dictionary of that size.
+    """
+    return zstandard.train_dictionary(size, samples, level=level).as_bytes()
+
+
+def compression_ratio(samples, zdict=None):
+    """
+    Raw / packed bytes of samples compressed with zdict.
+    """
+    compressor = new_compressor(zdict)
+    packed = sum(len(compressor.compress(sample)) for sample in samples)
+    return sum(len(sample) for sample in samples) / max(packed, 1)
+
+
+def retrain_payload_dictionaries():
+    """
+    Trains a new dictionary for every project with at least
+    EVENT_PAYLOAD_DICT_MIN_SAMPLES payloads in the last
+    EVENT_PAYLOAD_DICT_SAMPLE_DAYS days that has none yet, or whose
+    current one compresses those payloads more than
+    EVENT_PAYLOAD_DICT_MAX_DEGRADATION worse than when it was trained.
+    Returns the created dictionaries.
+    """
+    since = timezone.now().date() - timedelta(days=EVENT_PAYLOAD_DICT_SAMPLE_DAYS)
+    projects = (
+        AgentPathDailyRollup.objects.filter(event_date__gte=since)
+        .values_list('project_id', flat=True).distinct()
+    )
+    created = []
+    for project_id in projects:
+        samples = sample_payloads(project_id)
+        if len(samples) < EVENT_PAYLOAD_DICT_MIN_SAMPLES:
+            continue
+        current = PayloadDictionary.objects.filter(project_id=project_id).order_by('-created_at').first()
+        if current is not None:
+            ratio = compression_ratio(samples, _dictionary(current.pk))
+            if current.compression_ratio is None:
+                # Trained before ratios were recorded: today's is its baseline.
+                current.compression_ratio = ratio
+                current.save(update_fields=['compression_ratio'])
+                continue
+            if ratio >= current.compression_ratio * (1 - EVENT_PAYLOAD_DICT_MAX_DEGRADATION):
+                continue
+        holdout = samples[:max(1, int(len(samples) * _HOLDOUT))]
+        training = samples[len(holdout):]
+        try:
+            data = train_dictionary(training)
+        except zstandard.ZstdError as exc:
+            logger.warning('Could not train a payload dictionary for %s: %s', project_id, exc)
+            continue
+        created.append(PayloadDictionary.objects.create(
+            project_id=project_id, data=data, sample_count=len(training),
+            compression_ratio=compression_ratio(holdout, zstandard.ZstdCompressionDict(data)),
+        ))
+    return created
+
+
+def delete_unused_payload_dictionaries():
+    """
+    Deletes superseded dictionaries that no payload row references any more,
+    e.g. once expire_partitions has dropped the rows written with them. A
+    dictionary superseded less than EVENT_PAYLOAD_DICT_CACHE_TTL ago may
+    still be packing rows in some process, so it is kept until the next run.
+    Returns the number deleted.
+    """
+    superseded = PayloadDictionary.objects.filter(
+        project_id=OuterRef('project_id'),
+        created_at__gt=OuterRef('created_at'),
+        created_at__lt=timezone.now() - timedelta(seconds=EVENT_PAYLOAD_DICT_CACHE_TTL),
+    )
+    unused = list(
+        PayloadDictionary.objects.filter(Exists(superseded))
+        .exclude(Exists(BackendEventPayload.objects.filter(dictionary=OuterRef('pk'))))
+        .values_list('pk', flat=True)
+    )
+    if not unused:
+        return 0
+    PayloadDictionary.objects.filter(pk__in=unused).delete()
+    with _dictionaries_lock:
+        for dictionary_id in unused:
+            _dictionaries.pop(dictionary_id, None)
+    logger.info('Deleted %d unused payload dictionaries', len(unused))
+    return len(unused)
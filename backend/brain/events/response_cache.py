@@ -0,0 +1,220 @@
+"""
+Response cache for the agent analytics views, stored in the Django cache
+(Redis in production).
+
+Entries are keyed on the view, the agent, the normalized query string and
+the agent's ingest watermarks:
+    - the "history" watermark moves when events for a past date arrive;
+    - the "live" watermark moves when events for today arrive and is only
+      part of the key when the requested range reaches today.
+Writes therefore invalidate only the writing agent's entries, and ranges
+that end before today survive live ingest and are kept for
+ANALYTICS_CACHE_PAST_TTL instead of ANALYTICS_CACHE_LIVE_TTL.
+
+Concurrent identical misses are coalesced: one request takes a short lock
+and computes, the others wait for its result.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .blocking import run_blocking
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_ENABLED = getattr(settings, 'ANALYTICS_CACHE_ENABLED', True)
+ANALYTICS_CACHE_ALIAS = getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')
+ANALYTICS_CACHE_LIVE_TTL = getattr(settings, 'ANALYTICS_CACHE_LIVE_TTL', 30)
+ANALYTICS_CACHE_PAST_TTL = getattr(settings, 'ANALYTICS_CACHE_PAST_TTL', 24 * 3600)
+ANALYTICS_CACHE_LOCK_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_LOCK_TIMEOUT', 10)
+
+_PREFIX = 'analytics'
+_GENERATION_KEY = f'{_PREFIX}:generation'
+_POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[ANALYTICS_CACHE_ALIAS]
+
+
+def _watermark_key(agent_id, kind):
+    return f'{_PREFIX}:wm:{kind}:{agent_id}'
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def bump_ingest_watermarks(agent_dates):
+    """
+    Invalidates cached analytics for every agent in agent_dates, an iterable
+    of (agent_id, event_date) for newly written events. Call it once the
+    write has committed.
+    """
+    if not ANALYTICS_CACHE_ENABLED:
+        return
+    today = timezone.now().date()
+    kinds = defaultdict(set)
+    for agent_id, event_date in agent_dates:
+        if agent_id:
+            kinds[agent_id].add('live' if event_date >= today else 'history')
+    try:
+        cache = _cache()
+        for agent_id, agent_kinds in kinds.items():
+            for kind in agent_kinds:
+                _bump(cache, _watermark_key(agent_id, kind))
+    except Exception:
+        logger.warning('Could not bump analytics watermarks', exc_info=True)
+
+
+def invalidate_all():
+    """
+    Invalidates every cached analytics response, e.g. after a rollup rebuild.
+    """
+    try:
+        _bump(_cache(), _GENERATION_KEY)
+    except Exception:
+        logger.warning('Could not invalidate the analytics cache', exc_info=True)
+
+
+def _cache_key(cache, view_name, request):
+    """
+    Returns (key, ttl), or (None, None) when the request should not be cached.
+    """
+    agent_id = str(request.auth_agent_id)
+    try:
+        end = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return None, None  # the view answers 400; nothing worth caching
+    live = end >= timezone.now().date()
+
+    keys = [_GENERATION_KEY, _watermark_key(agent_id, 'history')]
+    if live:
+        keys.append(_watermark_key(agent_id, 'live'))
+    marks = cache.get_many(keys)
+
+    params = '&'.join(
+        f'{name}={value}'
+        for name, value in sorted(request.GET.items())
+        if value != ''
+    )
+    digest = hashlib.sha256(
+        '|'.join([view_name, agent_id, str(request.auth_project_id), params]).encode()
+    ).hexdigest()
+    watermark = ':'.join(str(marks.get(key, 0)) for key in keys)
+    ttl = ANALYTICS_CACHE_LIVE_TTL if live else ANALYTICS_CACHE_PAST_TTL
+    return f'{_PREFIX}:resp:{digest}:{watermark}', ttl
+
+
+def _to_response(entry, status):
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    response['X-Cache'] = status
+    return response
+
+
+def _lookup(view_name, request):
+    """
+    Returns (key, ttl, cached entry); key is None when the request should
+    not be cached.
+    """
+    cache = _cache()
+    key, ttl = _cache_key(cache, view_name, request)
+    return key, ttl, cache.get(key) if key else None
+
+
+def _store(key, ttl, response):
+    try:
+        _cache().set(key, {
+            'status': response.status_code,
+            'content': response.content,
+            'content_type': response['Content-Type'],
+        }, timeout=ttl)
+    except Exception:
+        logger.warning('Could not store analytics response', exc_info=True)
+
+
+def _acquire(lock_key):
+    return _cache().add(lock_key, 1, timeout=ANALYTICS_CACHE_LOCK_TIMEOUT)
+
+
+def _release(lock_key):
+    try:
+        _cache().delete(lock_key)
+    except Exception:
+        logger.warning('Could not release analytics cache lock', exc_info=True)
+
+
+def _poll(key, lock_key):
+    """
+    One check while another request computes key. Returns (entry, lock held).
+    """
+    cache = _cache()
+    entry = cache.get(key)
+    return entry, entry is None and cache.get(lock_key) is not None
+
+
+def cached_analytics_response(view_method):
+    """
+    Caches successful responses of an async analytics View.get. Goes inside
+    agent_user_auth_required, which provides auth_agent_id/auth_project_id.
+    Cache round trips run on the blocking pool; waiting for a coalesced
+    response does not hold a thread.
+    """
+    @wraps(view_method)
+    async def wrapper(self, request, *args, **kwargs):
+        if not ANALYTICS_CACHE_ENABLED:
+            return await view_method(self, request, *args, **kwargs)
+
+        try:
+            key, ttl, entry = await run_blocking(_lookup, type(self).__name__, request)
+        except Exception:
+            logger.warning('Analytics cache unavailable', exc_info=True)
+            return await view_method(self, request, *args, **kwargs)
+
+        if key is None:
+            return await view_method(self, request, *args, **kwargs)
+        if entry is not None:
+            return _to_response(entry, 'HIT')
+
+        lock_key = f'{key}:lock'
+        try:
+            owner = await run_blocking(_acquire, lock_key)
+        except Exception:
+            owner = True
+        if not owner:
+            # Someone else is computing this response; wait for it.
+            deadline = time.monotonic() + ANALYTICS_CACHE_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_POLL_INTERVAL)
+                try:
+                    entry, locked = await run_blocking(_poll, key, lock_key)
+                except Exception:
+                    break
+                if entry is not None:
+                    return _to_response(entry, 'COALESCED')
+                if not locked:
+                    break
+
+        try:
+            response = await view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                await run_blocking(_store, key, ttl, response)
+            response['X-Cache'] = 'MISS'
+            return response
+        finally:
+            if owner:
+                await run_blocking(_release, lock_key)
+
+    return wrapper
@@ -0,0 +1,459 @@
+"""
+Incremental maintenance of the agent_path_{daily,hourly}_rollup tables and of
+session_summary.
+
+Every write path stages the rollup metrics of the events it inserts in
+agent_path_rollup_delta inside the same transaction, so rollups never drift
+from backend_event:
+    - bulk_save_events (single/batch capture, buffer flush) calls rollup_events
+    - load_events merges through rollup_merge_sql
+Staging only appends rows, so concurrent ingest transactions never wait on
+each other for the few hot rollup rows (today's hour of a busy path).
+fold_rollups, a celery beat task, moves the staged deltas into the rollups,
+so they trail ingest by about ROLLUP_FOLD_INTERVAL. Session summaries are
+per session rather than hot and are upserted directly.
+Upserts are issued in key order so concurrent writers lock rows consistently.
+"""
+import json
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import AgentPathDailyRollup, AgentPathHourlyRollup, AgentPathRollupDelta, SessionSummary
+from .response_cache import bump_ingest_watermarks
+from .sketch import KEY_SQL as SKETCH_KEY_SQL, DDSketch
+
+RollupTable = namedtuple('RollupTable', 'table bucket_column bucket_sql')
+
+DAILY = RollupTable(AgentPathDailyRollup._meta.db_table, 'event_date', 'event_date')
+HOURLY = RollupTable(AgentPathHourlyRollup._meta.db_table, 'bucket', "date_trunc('hour', event_time)")
+ROLLUP_TABLES = (DAILY, HOURLY)
+
+METRIC_COLUMNS = [
+    'request_count', 'error_count',
+    'status_2xx', 'status_3xx', 'status_4xx', 'status_5xx',
+    'latency_sum', 'latency_min', 'latency_max',
+    'request_bytes', 'response_bytes',
+    'latency_sketch',
+]
+KEY_COLUMNS = ['project_id', 'agent_id', 'path_id']
+
+DELTA_TABLE = AgentPathRollupDelta._meta.db_table
+DELTA_COLUMNS = KEY_COLUMNS + ['event_date', 'bucket'] + METRIC_COLUMNS
+
+ROLLUP_FOLD_BATCH_SIZE = getattr(settings, 'ROLLUP_FOLD_BATCH_SIZE', 10000)
+
+# SQL aggregate for each metric column over raw backend_event rows, grouped
+# by rollup key and sketch bucket (latency_sketch is assembled afterwards).
+_METRIC_SQL = {
+    'request_count': 'count(*)',
+    'error_count': "count(*) FILTER (WHERE error IS NOT NULL AND error <> '')",
+    'status_2xx': 'count(*) FILTER (WHERE status_code BETWEEN 200 AND 299)',
+    'status_3xx': 'count(*) FILTER (WHERE status_code BETWEEN 300 AND 399)',
+    'status_4xx': 'count(*) FILTER (WHERE status_code BETWEEN 400 AND 499)',
+    'status_5xx': 'count(*) FILTER (WHERE status_code BETWEEN 500 AND 599)',
+    'latency_sum': 'sum(latency_ms)',
+    'latency_min': 'min(latency_ms)',
+    'latency_max': 'max(latency_ms)',
+    'request_bytes': 'sum(request_size_bytes)',
+    'response_bytes': 'sum(response_size_bytes)',
+}
+
+# How the per-sketch-bucket partials above combine into one rollup row.
+_COMBINE_SQL = {
+    'latency_min': 'min(latency_min)',
+    'latency_max': 'max(latency_max)',
+    'latency_sketch': (
+        "COALESCE(jsonb_object_agg(sketch_key, request_count) FILTER (WHERE sketch_key IS NOT NULL), '{}')"
+    ),
+}
+
+# How staged deltas combine into one rollup row when they are folded.
+_FOLD_SQL = {
+    'latency_min': 'min(latency_min)',
+    'latency_max': 'max(latency_max)',
+    'latency_sketch': 'ddsketch_merge_agg(latency_sketch)',
+}
+
+# Columns that the raw-event aggregations need from backend_event.
+SOURCE_COLUMNS = [
+    'project_id', 'agent_id', 'agent_session_id', 'path_id', 'event_date', 'event_time',
+    'status_code', 'latency_ms', 'error', 'request_size_bytes', 'response_size_bytes',
+]
+
+SESSION_SUMMARY_TABLE = SessionSummary._meta.db_table
+SESSION_METRIC_COLUMNS = [
+    'first_event_time', 'last_event_time',
+    'request_count', 'error_count', 'latency_sum', 'latency_max',
+    'request_bytes', 'response_bytes',
+]
+SESSION_COLUMNS = ['agent_session_id', 'project_id', 'agent_id'] + SESSION_METRIC_COLUMNS
+
+_SESSION_METRIC_SQL = dict(_METRIC_SQL, first_event_time='min(event_time)', last_event_time='max(event_time)')
+
+
+def _merge_sql(column):
+    if column == 'latency_min':
+        return 'latency_min = LEAST(t.latency_min, EXCLUDED.latency_min)'
+    if column == 'latency_max':
+        return 'latency_max = GREATEST(t.latency_max, EXCLUDED.latency_max)'
+    if column == 'latency_sketch':
+        return 'latency_sketch = ddsketch_merge(t.latency_sketch, EXCLUDED.latency_sketch)'
+    if column == 'first_event_time':
+        return 'first_event_time = LEAST(t.first_event_time, EXCLUDED.first_event_time)'
+    if column == 'last_event_time':
+        return 'last_event_time = GREATEST(t.last_event_time, EXCLUDED.last_event_time)'
+    return f'{column} = t.{column} + EXCLUDED.{column}'
+
+
+def _columns(rollup):
+    return KEY_COLUMNS + [rollup.bucket_column] + METRIC_COLUMNS
+
+
+def _on_conflict_sql(rollup):
+    return (
+        f"ON CONFLICT (agent_id, {rollup.bucket_column}, path_id, project_id) DO UPDATE SET "
+        + ', '.join(_merge_sql(column) for column in METRIC_COLUMNS)
+    )
+
+
+def _aggregate_select_sql(source, buckets):
+    """
+    SELECT of the rollup key, the `buckets` ({column: expression}) and the
+    metric columns over the rows of `source` (a table name or CTE).
+    """
+    partials = ', '.join(
+        f'{_METRIC_SQL[column]} AS {column}' for column in METRIC_COLUMNS if column in _METRIC_SQL
+    )
+    combined = ', '.join(_COMBINE_SQL.get(column, f'sum({column})') for column in METRIC_COLUMNS)
+    groups = len(KEY_COLUMNS) + len(buckets)
+    return (
+        f"SELECT {', '.join(KEY_COLUMNS + list(buckets))}, {combined} FROM ("
+        f"SELECT project_id::text AS project_id, COALESCE(agent_id::text, '') AS agent_id, path_id, "
+        + ''.join(f'{sql} AS {column}, ' for column, sql in buckets.items())
+        + f"{SKETCH_KEY_SQL} AS sketch_key, {partials} "
+        f"FROM {source} GROUP BY {', '.join(str(n) for n in range(1, groups + 2))}"
+        f") partials GROUP BY {', '.join(str(n) for n in range(1, groups + 1))}"
+    )
+
+
+def aggregate_sql(rollup, source):
+    """
+    INSERT ... SELECT that folds the rows of `source` (a table name or CTE)
+    into rollup, adding to any existing counters.
+    """
+    return (
+        f"INSERT INTO {rollup.table} AS t ({', '.join(_columns(rollup))}) "
+        + _aggregate_select_sql(source, {'bucket': rollup.bucket_sql})
+        + " ORDER BY 2, 4, 3, 1 "
+        + _on_conflict_sql(rollup)
+    )
+
+
+def stage_sql(source):
+    """
+    INSERT ... SELECT that stages the rows of `source` in
+    agent_path_rollup_delta, one delta per rollup key, day and hour.
+    """
+    return (
+        f"INSERT INTO {DELTA_TABLE} ({', '.join(DELTA_COLUMNS)}) "
+        + _aggregate_select_sql(source, {'event_date': DAILY.bucket_sql, 'bucket': HOURLY.bucket_sql})
+    )
+
+
+_SESSION_ON_CONFLICT_SQL = (
+    "ON CONFLICT (agent_session_id) DO UPDATE SET "
+    + ', '.join(_merge_sql(column) for column in SESSION_METRIC_COLUMNS)
+)
+
+
+def session_summary_sql(source):
+    """
+    INSERT ... SELECT that folds the rows of `source` into session_summary,
+    adding to the totals of sessions that already have a row. Rows without
+    a session are skipped.
+    """
+    metrics = ', '.join(_SESSION_METRIC_SQL[column] for column in SESSION_METRIC_COLUMNS)
+    return (
+        f"INSERT INTO {SESSION_SUMMARY_TABLE} AS t ({', '.join(SESSION_COLUMNS)}) "
+        f"SELECT agent_session_id, (array_agg(project_id))[1], (array_agg(agent_id))[1], {metrics} "
+        f"FROM {source} WHERE agent_session_id IS NOT NULL "
+        f"GROUP BY agent_session_id ORDER BY agent_session_id "
+        + _SESSION_ON_CONFLICT_SQL
+    )
+
+
+def rollup_merge_sql(insert_sql, extra=()):
+    """
+    Wraps an `INSERT INTO backend_event ... ON CONFLICT DO NOTHING` so that
+    only the rows it actually inserts are staged for the rollups. `extra` are
+    further data-modifying CTEs run in the same statement, which may read
+    the "inserted" CTE (it returns event_id, event_date and the rollup source
+    columns). The statement returns a single row holding the number of
+    inserted events.
+    """
+    statements = [f"inserted AS ({insert_sql} RETURNING event_id, {', '.join(SOURCE_COLUMNS)})"]
+    statements += extra
+    statements.append(f"staged AS ({stage_sql('inserted')})")
+    statements.append(f"sessions AS ({session_summary_sql('inserted')})")
+    return f"WITH {', '.join(statements)} SELECT count(*) FROM inserted"
+
+
+def _status_class(status_code):
+    return f'status_{status_code // 100}xx' if 200 <= status_code < 600 else None
+
+
+def _hour(event_time):
+    return event_time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _aggregate(events):
+    """
+    Folds saved BackendEvent objects into {(key..., event_date, hour): metrics}.
+    """
+    deltas = {}
+    for event in events:
+        status_class = _status_class(event.status_code)
+        key = (
+            str(event.project_id), str(event.agent_id or ''), event.path_template_id,
+            event.event_date, _hour(event.event_time),
+        )
+        metrics = deltas.get(key)
+        if metrics is None:
+            metrics = deltas[key] = dict.fromkeys(METRIC_COLUMNS, 0)
+            metrics['latency_min'] = metrics['latency_max'] = event.latency_ms
+            metrics['latency_sketch'] = DDSketch()
+        metrics['request_count'] += 1
+        if event.error:
+            metrics['error_count'] += 1
+        if status_class:
+            metrics[status_class] += 1
+        metrics['latency_sum'] += event.latency_ms
+        metrics['latency_min'] = min(metrics['latency_min'], event.latency_ms)
+        metrics['latency_max'] = max(metrics['latency_max'], event.latency_ms)
+        metrics['latency_sketch'].add(event.latency_ms)
+        metrics['request_bytes'] += event.request_size_bytes or 0
+        metrics['response_bytes'] += event.response_size_bytes or 0
+    return deltas
+
+
+def _summarize_sessions(events):
+    """
+    Folds saved BackendEvent objects into {agent_session_id: session_summary row}.
+    """
+    sessions = {}
+    for event in events:
+        if not event.agent_session_id:
+            continue
+        summary = sessions.get(str(event.agent_session_id))
+        if summary is None:
+            summary = sessions[str(event.agent_session_id)] = dict.fromkeys(SESSION_METRIC_COLUMNS, 0)
+            summary['project_id'] = str(event.project_id)
+            summary['agent_id'] = str(event.agent_id) if event.agent_id else None
+            summary['first_event_time'] = summary['last_event_time'] = event.event_time
+            summary['latency_max'] = event.latency_ms
+        summary['first_event_time'] = min(summary['first_event_time'], event.event_time)
+        summary['last_event_time'] = max(summary['last_event_time'], event.event_time)
+        summary['request_count'] += 1
+        if event.error:
+            summary['error_count'] += 1
+        summary['latency_sum'] += event.latency_ms
+        summary['latency_max'] = max(summary['latency_max'], event.latency_ms)
+        summary['request_bytes'] += event.request_size_bytes or 0
+        summary['response_bytes'] += event.response_size_bytes or 0
+    return sessions
+
+
+def rollup_events(events):
+    """
+    Stages already-inserted BackendEvent objects for the rollups and adds
+    them to their session summaries. Call it in the transaction that
+    inserted them.
+    """
+    if not events:
+        return
+    with connection.cursor() as cursor:
+        deltas = _aggregate(events)
+        placeholders = '(' + ', '.join(['%s'] * len(DELTA_COLUMNS)) + ')'
+        params = []
+        for key, metrics in deltas.items():
+            metrics['latency_sketch'] = json.dumps(metrics['latency_sketch'].to_json())
+            params.extend(key)
+            params.extend(metrics[column] for column in METRIC_COLUMNS)
+        cursor.execute(
+            f"INSERT INTO {DELTA_TABLE} ({', '.join(DELTA_COLUMNS)}) "
+            f"VALUES {', '.join([placeholders] * len(deltas))}",
+            params,
+        )
+
+        sessions = _summarize_sessions(events)
+        if sessions:
+            placeholders = '(' + ', '.join(['%s'] * len(SESSION_COLUMNS)) + ')'
+            params = []
+            for session_id in sorted(sessions):
+                summary = sessions[session_id]
+                params.append(session_id)
+                params.extend(summary[column] for column in SESSION_COLUMNS[1:])
+            cursor.execute(
+                f"INSERT INTO {SESSION_SUMMARY_TABLE} AS t ({', '.join(SESSION_COLUMNS)}) "
+                f"VALUES {', '.join([placeholders] * len(sessions))} "
+                + _SESSION_ON_CONFLICT_SQL,
+                params,
+            )
+
+
+def _fold_sql(rollup):
+    combined = ', '.join(_FOLD_SQL.get(column, f'sum({column})') for column in METRIC_COLUMNS)
+    return (
+        f"INSERT INTO {rollup.table} AS t ({', '.join(_columns(rollup))}) "
+        f"SELECT {', '.join(KEY_COLUMNS)}, {rollup.bucket_column}, {combined} FROM claimed "
+        f"GROUP BY 1, 2, 3, 4 ORDER BY 2, 4, 3, 1 "
+        + _on_conflict_sql(rollup)
+    )
+
+
+# Deletes up to %s staged deltas and folds them into both rollups in one
+# statement; returns (agent_id, event_date, deltas) for the folded deltas.
+_FOLD_BATCH_SQL = (
+    f"WITH claimed AS (DELETE FROM {DELTA_TABLE} WHERE id IN ("
+    f"SELECT id FROM {DELTA_TABLE} ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED"
+    f") RETURNING {', '.join(DELTA_COLUMNS)}), "
+    + ', '.join(f"rollup_{index} AS ({_fold_sql(rollup)})" for index, rollup in enumerate(ROLLUP_TABLES))
+    + " SELECT agent_id, event_date, count(*) FROM claimed GROUP BY 1, 2"
+)
+
+
+def fold_rollups(batch_size=None):
+    """
+    Moves staged deltas into both rollups, batch_size deltas per transaction,
+    until a batch comes up short. Safe to run from several workers at once:
+    each delta is claimed by exactly one of them. Cached analytics of the
+    affected agents are invalidated as each batch commits.
+    Returns the number of deltas folded.
+    """
+    batch_size = batch_size or ROLLUP_FOLD_BATCH_SIZE
+    folded = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Taken before any delta is claimed, so a running rebuild_rollups
+            # (EXCLUSIVE) finishes discarding its day's deltas first.
+            cursor.execute(f"LOCK TABLE {DAILY.table}, {HOURLY.table} IN ROW EXCLUSIVE MODE")
+            cursor.execute(_FOLD_BATCH_SQL, [batch_size])
+            rows = cursor.fetchall()
+        bump_ingest_watermarks((agent_id, event_date) for agent_id, event_date, _ in rows)
+        count = sum(deltas for _, _, deltas in rows)
+        folded += count
+        if count < batch_size:
+            return folded
+
+
+def rebuild_rollups(start, end):
+    """
+    Recomputes both rollups for event dates in [start, end] from backend_event,
+    one day per transaction. The tables are locked against fold_rollups for
+    the duration of each day, and the day's staged deltas are discarded in
+    the statement that reads its events, which keeps the result exact under
+    concurrent ingest.
+    Yields (day, number of daily rollup rows) as each day completes.
+    """
+    day = start
+    while day <= end:
+        day_start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+        source = (
+            f"(SELECT {', '.join(SOURCE_COLUMNS)} FROM backend_event "
+            f"WHERE event_date = %s) AS events"
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {DAILY.table}, {HOURLY.table} IN EXCLUSIVE MODE"
+            )
+            cursor.execute(f"DELETE FROM {DAILY.table} WHERE event_date = %s", [day])
+            cursor.execute(
+                f"DELETE FROM {HOURLY.table} WHERE bucket >= %s AND bucket < %s",
+                [day_start, day_start + timedelta(days=1)],
+            )
+            # One statement, so deltas and events are read from the same snapshot.
+            cursor.execute(
+                f"WITH discarded AS (DELETE FROM {DELTA_TABLE} WHERE event_date = %s), "
+                f"daily AS ({aggregate_sql(DAILY, source)} RETURNING 1), "
+                f"hourly AS ({aggregate_sql(HOURLY, source)}) "
+                f"SELECT count(*) FROM daily",
+                [day, day, day],
+            )
+            daily_rows = cursor.fetchone()[0]
+        yield day, daily_rows
+        day += timedelta(days=1)
+
+
+_SESSION_REBUILD_SQL = (
+    f"UPDATE {SESSION_SUMMARY_TABLE} AS t SET "
+    + ', '.join(f'{column} = s.{column}' for column in SESSION_COLUMNS[1:])
+    + f" FROM (SELECT agent_session_id, (array_agg(project_id))[1] AS project_id, "
+    f"(array_agg(agent_id))[1] AS agent_id, "
+    + ', '.join(f'{_SESSION_METRIC_SQL[column]} AS {column}' for column in SESSION_METRIC_COLUMNS)
+    + " FROM backend_event WHERE agent_session_id = ANY(%s::uuid[]) AND event_date BETWEEN %s AND %s "
+    "GROUP BY agent_session_id) s "
+    "WHERE t.agent_session_id = s.agent_session_id RETURNING t.agent_session_id::text"
+)
+
+
+def rebuild_session_summaries(start, end, batch_size=1000):
+    """
+    Recomputes the summaries of the sessions with events dated in
+    [start, end] from their events, batch_size sessions per transaction.
+
+    Each batch locks only its own session_summary rows (in session order, as
+    ingest does), first inserting empty rows for sessions that have none, so
+    ingest into those sessions waits for the batch and then adds its events
+    on top. Sessions are batched in order of their first event date, and a
+    batch reads only the event dates between its sessions' first and last
+    events, taken from [start, end] and from their current summaries; to
+    rebuild sessions that extend beyond both, widen [start, end].
+    Yields the number of sessions in each batch as it completes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT agent_session_id::text, min(event_date), max(event_date) FROM backend_event "
+            "WHERE event_date BETWEEN %s AND %s AND agent_session_id IS NOT NULL "
+            "GROUP BY agent_session_id",
+            [start, end],
+        )
+        sessions = sorted(cursor.fetchall(), key=lambda row: (row[1], row[0]))
+    for offset in range(0, len(sessions), batch_size):
+        rows = sessions[offset:offset + batch_size]
+        batch = sorted(session_id for session_id, _, _ in rows)
+        first = min(row[1] for row in rows)
+        last = max(row[2] for row in rows)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Empty rows (request_count = 0) only exist inside this transaction.
+            cursor.execute(
+                f"INSERT INTO {SESSION_SUMMARY_TABLE} ({', '.join(SESSION_COLUMNS)}) "
+                f"SELECT id, id, NULL, now(), now(), 0, 0, 0, 0, 0, 0 FROM unnest(%s::uuid[]) AS id ORDER BY id "
+                f"ON CONFLICT (agent_session_id) DO NOTHING",
+                [batch],
+            )
+            cursor.execute(
+                f"SELECT 1 FROM {SESSION_SUMMARY_TABLE} WHERE agent_session_id = ANY(%s::uuid[]) "
+                f"ORDER BY agent_session_id FOR UPDATE",
+                [batch],
+            )
+            cursor.execute(
+                f"SELECT min((first_event_time AT TIME ZONE 'UTC')::date), "
+                f"max((last_event_time AT TIME ZONE 'UTC')::date) "
+                f"FROM {SESSION_SUMMARY_TABLE} WHERE agent_session_id = ANY(%s::uuid[]) AND request_count > 0",
+                [batch],
+            )
+            summary_first, summary_last = cursor.fetchone()
+            cursor.execute(_SESSION_REBUILD_SQL, [
+                batch, min(first, summary_first or first), max(last, summary_last or last),
+            ])
+            rebuilt = {row[0] for row in cursor.fetchall()}
+            # Sessions whose events expired since they were listed.
+            missing = [session_id for session_id in batch if session_id not in rebuilt]
+            if missing:
+                cursor.execute(
+                    f"DELETE FROM {SESSION_SUMMARY_TABLE} WHERE agent_session_id = ANY(%s::uuid[])", [missing],
+                )
+        yield len(batch)
@@ -0,0 +1,87 @@
+"""
+DDSketch latency sketches stored on the agent/path rollups.
+
+A sketch is a JSON object mapping a logarithmic bucket index to the number of
+latencies that fell into it ("z" counts values too small to index). Any
+quantile read back from a sketch is within LATENCY_SKETCH_RELATIVE_ACCURACY of
+the true value, and two sketches merge by adding counts per key, which is what
+the ddsketch_merge()/ddsketch_merge_agg() SQL functions from migration 0004 do.
+
+Changing LATENCY_SKETCH_RELATIVE_ACCURACY changes the bucket layout; run
+`manage.py rebuild_rollups` afterwards so old and new sketches are not mixed.
+"""
+import math
+
+from django.conf import settings
+
+RELATIVE_ACCURACY = getattr(settings, 'LATENCY_SKETCH_RELATIVE_ACCURACY', 0.01)
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LN_GAMMA = math.log(GAMMA)
+# Latencies below this (ms) go to the zero bucket and read back as 0.
+MIN_INDEXABLE = 1e-3
+ZERO_KEY = 'z'
+
+# SQL expression computing the same bucket key as DDSketch.key() for a row:
+# NULL for non-finite latencies, which sketches leave out.
+KEY_SQL = (
+    f"CASE WHEN latency_ms IN ('NaN', 'Infinity', '-Infinity') THEN NULL "
+    f"WHEN latency_ms < {MIN_INDEXABLE!r} THEN '{ZERO_KEY}' "
+    f"ELSE ceil(ln(latency_ms) / {LN_GAMMA!r})::int::text END"
+)
+
+
+class DDSketch:
+
+    def __init__(self, bins=None):
+        self.bins = dict(bins or {})
+
+    @staticmethod
+    def key(value):
+        """
+        The bucket key of value, or None if value is NaN or infinite.
+        """
+        if not math.isfinite(value):
+            return None
+        if value < MIN_INDEXABLE:
+            return ZERO_KEY
+        return str(math.ceil(math.log(value) / LN_GAMMA))
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def add(self, value):
+        """
+        Adds value and returns True; NaN and infinite values are left out
+        (False), so one bad latency cannot fail the rollup it is part of.
+        """
+        key = self.key(value)
+        if key is None:
+            return False
+        self.bins[key] = self.bins.get(key, 0) + 1
+        return True
+
+    def merge(self, other):
+        for key, count in (other.bins if isinstance(other, DDSketch) else other).items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        return self
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile (0 <= q <= 1), or None if empty.
+        """
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.bins, key=lambda k: -math.inf if k == ZERO_KEY else int(k)):
+            seen += self.bins[key]
+            if seen > rank:
+                if key == ZERO_KEY:
+                    return 0.0
+                return 2 * GAMMA ** int(key) / (GAMMA + 1)
+        return None
+
+    def to_json(self):
+        return {key: count for key, count in self.bins.items() if count}
@@ -0,0 +1,75 @@
+import logging
+
+from celery import shared_task
+
+from .buffer import flush_event_buffer, get_buffer_metrics
+from .partitions import manage_partitions
+from .paths import learn_all_path_templates
+from .payload_codec import EVENT_PAYLOAD_CODEC, retrain_payload_dictionaries
+from .rollups import fold_rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def flush_event_buffer_task():
+    """
+    Periodic drain of the ingest buffer, scheduled by celery beat.
+    Run more workers to drain a deeper queue in parallel.
+    """
+    flushed = flush_event_buffer()
+    if flushed:
+        metrics = get_buffer_metrics()
+        logger.info(
+            'Flushed %d buffered events (queue_depth=%s, flush_lag=%ss)',
+            flushed, metrics['queue_depth'], metrics['last_flush_lag_seconds'],
+        )
+
+
+@shared_task(ignore_result=True)
+def fold_rollups_task():
+    """
+    Folds the rollup deltas staged at ingest into the agent/path rollups.
+    Scheduled by celery beat.
+    """
+    folded = fold_rollups()
+    if folded:
+        logger.info('Folded %d rollup deltas', folded)
+
+
+@shared_task(ignore_result=True)
+def manage_event_partitions_task():
+    """
+    Pre-creates upcoming backend_event partitions and detaches or drops the
+    ones past EVENT_RETENTION_DAYS. Scheduled by celery beat.
+    """
+    created, expired = manage_partitions()
+    if created or expired:
+        logger.info('Event partitions: created %s, expired %s', created, expired)
+
+
+@shared_task(ignore_result=True)
+def retrain_payload_dictionaries_task():
+    """
+    Trains fresh per-project zstd payload dictionaries from recent payloads
+    when EVENT_PAYLOAD_CODEC is 'zstd'. Scheduled by celery beat.
+    """
+    if EVENT_PAYLOAD_CODEC != 'zstd':
+        return
+    created = retrain_payload_dictionaries()
+    if created:
+        logger.info(
+            'Trained payload dictionaries: %s',
+            ', '.join(f'{d.project_id} ({d.sample_count} samples)' for d in created),
+        )
+
+
+@shared_task(ignore_result=True)
+def learn_path_templates_task():
+    """
+    Learns {param} path templates for high-cardinality path segments, see
+    events/paths.py. Scheduled by celery beat.
+    """
+    learned = learn_all_path_templates()
+    if learned:
+        logger.info('Learned path templates: %s', ', '.join(f'{t.project_id} {t.template}' for t in learned))
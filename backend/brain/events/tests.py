@@ -1,3 +1,1265 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import importlib
+import json
+import math
+import random
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import httpx
+import jwt
+import redis
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+import decorators
+import uasam_client
+
+from . import blocking, buckets, buffer, fast_ingest, ingest, live_tail, partitions, paths, payload_codec
+from .buckets import BucketError, bucket_counts
+from .models import (
+    AgentPathDailyRollup, AgentPathHourlyRollup, AgentPathRollupDelta, BackendEvent, BackendEventPayload,
+    PathTemplate, PayloadDictionary, SessionSummary,
+)
+from .partitions import ensure_partitions, expire_partitions, list_partitions
+from .paths import add_template, auto_template, learn_all_path_templates, learn_path_templates, resolve_path_ids
+from .payload_codec import delete_unused_payload_dictionaries, retrain_payload_dictionaries, train_dictionary
+from .rollups import DAILY, aggregate_sql, fold_rollups, rebuild_rollups, rebuild_session_summaries
+from .sketch import KEY_SQL, RELATIVE_ACCURACY, DDSketch
+from .utils import (
+    bulk_save_events, decode_event_cursor, encode_event_cursor, parse_date_range, parse_event_batch,
+    validate_event_item,
+)
+from .views import AgentEventTailView, AgentPathTimeseriesView, AgentUserAuthInvalidateView
+
+REQUIRED_FIELDS = ['project_id', 'path', 'method', 'status_code', 'latency_ms']
+
+
+def _dashboard_headers(test, project_id, agent_id, user_id='u'):
+    """
+    Makes UASAM authorize user_id for the agent for the rest of the test
+    (test.uasam is the mocked call) and returns the dashboard auth headers.
+    """
+    decorators._agent_user_auth_cache.clear()
+    test.uasam = mock.patch.object(decorators.uasam_client, 'apost', new=mock.AsyncMock(return_value=mock.Mock(
+        status_code=200,
+        json=lambda: {'agent': {'id': agent_id, 'name': 'a', 'project_id': project_id}},
+    ))).start()
+    test.addCleanup(mock.patch.stopall)
+    return {
+        'HTTP_X_OTAS_USER_TOKEN': jwt.encode({'user_id': user_id}, settings.JWT_SECRET, algorithm='HS256'),
+        'HTTP_X_OTAS_PROJECT_ID': project_id,
+        'HTTP_X_OTAS_AGENT_ID': agent_id,
+    }
+
+
+def _event(**fields):
+    event = {
+        'project_id': 'p',
+        'path': '/orders/1',
+        'method': 'GET',
+        'status_code': 200,
+        'latency_ms': 12.5,
+    }
+    event.update(fields)
+    return event
+
+
+class ParseEventBatchTests(SimpleTestCase):
+
+    def test_json_array(self):
+        self.assertEqual(parse_event_batch(b'[{"a": 1}, {"a": 2}]', 'application/json'), [{'a': 1}, {'a': 2}])
+
+    def test_events_object(self):
+        self.assertEqual(parse_event_batch(b'{"events": [{"a": 1}]}', 'application/json; charset=utf-8'), [{'a': 1}])
+
+    def test_empty_body_is_empty_batch(self):
+        self.assertEqual(parse_event_batch(b'', 'application/json'), [])
+
+    def test_invalid_json(self):
+        with self.assertRaisesMessage(ValueError, 'invalid_json'):
+            parse_event_batch(b'[{', 'application/json')
+
+    def test_not_a_batch(self):
+        for body in (b'{"event": {}}', b'{"events": {}}', b'1', b'"x"'):
+            with self.subTest(body=body), self.assertRaisesMessage(ValueError, 'invalid_batch'):
+                parse_event_batch(body, 'application/json')
+
+    def test_ndjson_keeps_bad_lines_in_place(self):
+        items = parse_event_batch(b'{"a": 1}\n\n{oops\n{"a": 3}\n', 'application/x-ndjson')
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[0], {'a': 1})
+        self.assertEqual(items[2], {'a': 3})
+        self.assertEqual(validate_event_item(items[1], REQUIRED_FIELDS), (None, {'status_description': 'invalid_json'}))
+
+
+class ValidateEventItemTests(SimpleTestCase):
+
+    def assertInvalid(self, field, value):
+        item, rejection = validate_event_item(_event(**{field: value}), REQUIRED_FIELDS)
+        self.assertIsNone(item)
+        self.assertEqual(rejection, {'status_description': 'invalid_field_values', 'invalid_fields': [field]})
+
+    def test_valid_event_is_coerced(self):
+        item, rejection = validate_event_item(
+            _event(status_code='201', latency_ms='3', request_size_bytes=10.0, error=None), REQUIRED_FIELDS,
+        )
+        self.assertIsNone(rejection)
+        self.assertEqual((item['status_code'], item['latency_ms'], item['request_size_bytes']), (201, 3.0, 10))
+
+    def test_not_an_object(self):
+        self.assertEqual(validate_event_item([1], REQUIRED_FIELDS), (None, {'status_description': 'invalid_event'}))
+
+    def test_missing_fields(self):
+        self.assertEqual(
+            validate_event_item({'path': '/'}, REQUIRED_FIELDS),
+            (None, {
+                'status_description': 'missing_required_fields',
+                'missing_fields': ['project_id', 'method', 'status_code', 'latency_ms'],
+            }),
+        )
+
+    def test_non_finite_latency(self):
+        for value in (float('nan'), float('inf'), '-inf', 'nan', 'Infinity'):
+            with self.subTest(value=value):
+                self.assertInvalid('latency_ms', value)
+
+    def test_negative_and_non_numeric(self):
+        self.assertInvalid('latency_ms', -1)
+        self.assertInvalid('latency_ms', 'fast')
+        self.assertInvalid('latency_ms', True)
+        self.assertInvalid('status_code', -200)
+        self.assertInvalid('status_code', None)
+
+    def test_integer_fields(self):
+        self.assertInvalid('status_code', 200.5)
+        self.assertInvalid('status_code', float('inf'))
+        self.assertInvalid('status_code', 2 ** 31)
+        self.assertInvalid('request_size_bytes', float('nan'))
+        self.assertInvalid('response_size_bytes', '1e3')
+
+    def test_text_fields(self):
+        self.assertInvalid('path', 123)
+        self.assertInvalid('path', '/a\x00b')
+        self.assertInvalid('method', 'X' * 21)
+        self.assertInvalid('method', None)
+        self.assertInvalid('request_content_type', 'x' * 256)
+        self.assertInvalid('error', {'message': 'boom'})
+
+    def test_json_fields(self):
+        self.assertInvalid('metadata', {'ratio': float('nan')})
+        self.assertInvalid('custom_properties', ['ok', {'k': 'a\x00'}])
+        item, rejection = validate_event_item(_event(metadata={'a': [1, 'b']}, custom_properties=None), REQUIRED_FIELDS)
+        self.assertIsNone(rejection)
+
+    def test_payload_fields(self):
+        self.assertInvalid('request_body', 'bin\x00ary')
+        item, rejection = validate_event_item(
+            _event(request_headers={'accept': '*/*'}, response_body='ok'), REQUIRED_FIELDS,
+        )
+        self.assertIsNone(rejection)
+
+    def test_reports_every_invalid_field(self):
+        item, rejection = validate_event_item(_event(status_code='x', latency_ms=float('nan')), REQUIRED_FIELDS)
+        self.assertEqual(rejection['invalid_fields'], ['status_code', 'latency_ms'])
+
+
+class EventCursorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.event = SimpleNamespace(
+            event_time=datetime(2024, 3, 1, 23, 59, 59, 123456, tzinfo=timezone.utc), event_id=uuid.uuid4(),
+        )
+
+    def test_round_trip(self):
+        self.assertEqual(
+            decode_event_cursor(encode_event_cursor(self.event)), (self.event.event_time, self.event.event_id),
+        )
+
+    def test_tampered(self):
+        token = encode_event_cursor(self.event)
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        for bad in (tampered, token.replace(':', '', 1), 'not-a-cursor', ''):
+            with self.subTest(token=bad), self.assertRaisesMessage(ValueError, 'invalid_cursor'):
+                decode_event_cursor(bad)
+
+
+def _sketch(values):
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+
+class DDSketchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.random = random.Random(7)
+
+    def test_quantiles_within_relative_accuracy(self):
+        values = [self.random.lognormvariate(3, 1.5) for _ in range(5000)]
+        sketch = _sketch(values)
+        for q in (0, 0.1, 0.5, 0.9, 0.95, 0.99, 1):
+            with self.subTest(q=q):
+                exact = _exact_quantile(values, q)
+                self.assertLessEqual(abs(sketch.quantile(q) - exact), RELATIVE_ACCURACY * exact * (1 + 1e-9))
+
+    def test_tiny_values_read_back_as_zero(self):
+        self.assertEqual(_sketch([0, 0.0001]).quantile(0.5), 0.0)
+
+    def test_empty(self):
+        self.assertIsNone(DDSketch().quantile(0.5))
+
+    def test_non_finite_values_are_left_out(self):
+        sketch = DDSketch()
+        self.assertFalse(sketch.add(float('nan')))
+        self.assertFalse(sketch.add(float('inf')))
+        self.assertTrue(sketch.add(10))
+        self.assertEqual(sketch.to_json(), {DDSketch.key(10): 1})
+
+    def test_merge_is_associative_and_commutative(self):
+        parts = [[self.random.expovariate(0.01) for _ in range(300)] for _ in range(3)]
+        a, b, c = (_sketch(part).to_json() for part in parts)
+        left = DDSketch(a).merge(DDSketch(b)).merge(c).to_json()
+        right = DDSketch(a).merge(DDSketch(b).merge(c)).to_json()
+        swapped = DDSketch(c).merge(a).merge(b).to_json()
+        self.assertEqual(left, right)
+        self.assertEqual(left, swapped)
+        self.assertEqual(left, _sketch(parts[0] + parts[1] + parts[2]).to_json())
+
+
+class DDSketchSqlTests(TestCase):
+
+    def test_key_sql_matches_python(self):
+        values = [0, 0.0005, 0.001, 0.5, 1, 1.01, 12.5, 999.9, 1e6, float('nan'), float('inf'), float('-inf')]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {KEY_SQL} FROM unnest(%s::float8[]) WITH ORDINALITY AS v(latency_ms, n) ORDER BY n",
+                [values],
+            )
+            keys = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(keys, [DDSketch.key(value) for value in values])
+
+    def test_ddsketch_merge_matches_python(self):
+        rng = random.Random(11)
+        sketches = [
+            _sketch([rng.lognormvariate(2, 1) for _ in range(200)]).to_json() for _ in range(4)
+        ] + [None, {}]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT ddsketch_merge(%s::jsonb, %s::jsonb)', [json.dumps(sketches[0]), json.dumps(sketches[1])])
+            pair = json.loads(cursor.fetchone()[0])
+            cursor.execute(
+                'SELECT ddsketch_merge_agg(s::jsonb) FROM unnest(%s::text[]) AS s',
+                [[json.dumps(sketch) if sketch is not None else None for sketch in sketches]],
+            )
+            merged = json.loads(cursor.fetchone()[0])
+        self.assertEqual(pair, DDSketch(sketches[0]).merge(sketches[1]).to_json())
+        expected = DDSketch()
+        for sketch in sketches:
+            expected.merge(sketch or {})
+        self.assertEqual(merged, expected.to_json())
+
+    def test_rollup_sql_leaves_out_non_finite_latencies(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE source_events AS SELECT "
+                "'8a3b6a4e-5a1f-4a34-9b8e-0d6a5c1f2e10'::uuid AS project_id, "
+                "'2f1c1d9e-6b7a-4c2b-8d3e-1a2b3c4d5e6f'::uuid AS agent_id, 1 AS path_id, "
+                "date '2024-01-01' AS event_date, timestamptz '2024-01-01 10:00+00' AS event_time, "
+                "200 AS status_code, latency_ms, NULL::text AS error, "
+                "0 AS request_size_bytes, 0 AS response_size_bytes "
+                "FROM unnest(ARRAY[12.5, 'NaN']::float8[]) AS latency_ms"
+            )
+            cursor.execute(aggregate_sql(DAILY, 'source_events'))
+        rollup = AgentPathDailyRollup.objects.get()
+        self.assertEqual(rollup.request_count, 2)
+        self.assertEqual(rollup.latency_sketch, {DDSketch.key(12.5): 1})
+
+
+class RollupDeltaTests(TestCase):
+
+    def setUp(self):
+        self.project_id = str(uuid.uuid4())
+        self.day = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+
+    def _save(self, *hours_and_latencies):
+        bulk_save_events([
+            dict(_event(project_id=self.project_id, latency_ms=latency), event_time=self.day + timedelta(hours=hours))
+            for hours, latency in hours_and_latencies
+        ])
+
+    def test_ingest_stages_deltas_that_fold_into_both_rollups(self):
+        self._save((0, 10.0), (0, 30.0))
+        self._save((1, 20.0))
+        self.assertFalse(AgentPathDailyRollup.objects.exists())
+        self.assertEqual(AgentPathRollupDelta.objects.count(), 2)
+
+        self.assertEqual(fold_rollups(batch_size=1), 2)
+
+        self.assertFalse(AgentPathRollupDelta.objects.exists())
+        daily = AgentPathDailyRollup.objects.get()
+        self.assertEqual(
+            (daily.request_count, daily.latency_sum, daily.latency_min, daily.latency_max),
+            (3, 60.0, 10.0, 30.0),
+        )
+        self.assertEqual(sum(daily.latency_sketch.values()), 3)
+        self.assertEqual(
+            list(AgentPathHourlyRollup.objects.order_by('bucket').values_list('request_count', flat=True)), [2, 1],
+        )
+
+    def test_rebuild_discards_the_deltas_it_recomputes(self):
+        self._save((0, 10.0))
+        fold_rollups()
+        self._save((1, 20.0))
+
+        self.assertEqual(list(rebuild_rollups(self.day.date(), self.day.date())), [(self.day.date(), 1)])
+        self.assertEqual(fold_rollups(), 0)
+
+        self.assertEqual(AgentPathDailyRollup.objects.get().request_count, 2)
+        self.assertEqual(sum(AgentPathHourlyRollup.objects.values_list('request_count', flat=True)), 2)
+
+
+class NativeUuidMigrationTests(TestCase):
+    migration = importlib.import_module('events.migrations.0012_native_uuid_ids')
+
+    def setUp(self):
+        self.project_id = str(uuid.uuid4())
+        self.agent_id = str(uuid.uuid4())
+        self.day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        with connection.cursor() as cursor:
+            cursor.execute(self.migration.TEXT_UUID_FUNCTION_SQL)
+
+    def _rollups(self, model, bucket, agent_id, path_id, latencies):
+        model.objects.create(
+            project_id=self.project_id, agent_id=agent_id, path_template_id=path_id, **bucket,
+            request_count=len(latencies), latency_sum=sum(latencies),
+            latency_min=min(latencies), latency_max=max(latencies), latency_sketch=_sketch(latencies).to_json(),
+        )
+
+    def _canonicalise(self):
+        self.migration.canonicalise_rollup_keys(None, SimpleNamespace(connection=connection))
+
+    def test_mixed_case_agent_rollups_merge_into_canonical_rows(self):
+        for model, bucket in (
+            (AgentPathDailyRollup, {'event_date': self.day.date()}),
+            (AgentPathHourlyRollup, {'bucket': self.day}),
+        ):
+            self._rollups(model, bucket, self.agent_id.upper(), 1, [10.0, 40.0])
+            self._rollups(model, bucket, self.agent_id, 1, [20.0])
+            self._rollups(model, bucket, 'legacy-agent', 1, [5.0])
+            self._rollups(model, bucket, '', 1, [7.0])
+
+        self._canonicalise()
+        self._canonicalise()
+
+        expected = _sketch([10.0, 40.0, 20.0]).to_json()
+        legacy_agent = str(uuid.UUID(hashlib.md5(b'legacy-agent').hexdigest()))
+        for model in (AgentPathDailyRollup, AgentPathHourlyRollup):
+            rows = {row.agent_id: row for row in model.objects.all()}
+            self.assertEqual(set(rows), {self.agent_id, legacy_agent, ''})
+            merged = rows[self.agent_id]
+            self.assertEqual(
+                (merged.request_count, merged.latency_sum, merged.latency_min, merged.latency_max),
+                (3, 70.0, 10.0, 40.0),
+            )
+            self.assertEqual(merged.latency_sketch, expected)
+            self.assertEqual(rows[legacy_agent].request_count, 1)
+
+    def test_legacy_path_templates_are_renamed_or_merged(self):
+        canonical = PathTemplate.objects.create(project_id=self.project_id, template='/orders/{id}')
+        twin = PathTemplate.objects.create(project_id=self.project_id.upper(), template='/orders/{id}')
+        covered = PathTemplate.objects.create(
+            project_id=self.project_id.upper(), template='/orders/1', merged_into=twin,
+        )
+        spellings = [
+            PathTemplate.objects.create(project_id=project_id, template='/users')
+            for project_id in (self.project_id.upper(), self.project_id.replace('-', ''))
+        ]
+
+        self._canonicalise()
+
+        for path_template in (twin, covered, *spellings):
+            path_template.refresh_from_db()
+        self.assertEqual(twin.merged_into_id, canonical.pk)
+        self.assertEqual(covered.merged_into_id, canonical.pk)
+        self.assertEqual((spellings[0].project_id, spellings[0].merged_into_id), (self.project_id, None))
+        self.assertEqual(spellings[1].merged_into_id, spellings[0].pk)
+
+
+class AutoTemplateTests(SimpleTestCase):
+
+    def test_id_segments_become_placeholders(self):
+        cases = {
+            '/users/123/orders/987': '/users/{id}/orders/{id}',
+            '/sessions/2F1C1D9E-6B7A-4C2B-8D3E-1A2B3C4D5E6F': '/sessions/{id}',
+            '/blobs/9f86d081884c7d659a2feaa0c55ad015': '/blobs/{id}',
+            '/invites/Xy7_kQ2-mN9pLr4sT8vW': '/invites/{id}',
+            '/search?q=1#top': '/search',
+            '': '/',
+        }
+        for path, template in cases.items():
+            self.assertEqual(auto_template(path), template, path)
+
+    def test_words_and_short_tokens_stay(self):
+        for path in ('/v1/users/me', '/api/abc123', '/deadbeef', '/a-very-long-literal-segment-name'):
+            self.assertEqual(auto_template(path), path)
+
+
+class PathTemplateTests(TestCase):
+
+    def setUp(self):
+        self.project_id = str(uuid.uuid4())
+        paths._path_ids.clear()
+        paths._patterns.clear()
+
+    def _resolve(self, *raw_paths):
+        resolved = resolve_path_ids((self.project_id, path) for path in raw_paths)
+        return [resolved[(self.project_id, path)] for path in raw_paths]
+
+    def _template(self, path_id):
+        return PathTemplate.objects.get(pk=path_id).template
+
+    def test_paths_resolve_to_shared_automatic_templates(self):
+        first, second, other = self._resolve('/users/1/orders', '/users/2/orders?x=1', '/users/me')
+        self.assertEqual(first, second)
+        self.assertEqual(self._template(first), '/users/{id}/orders')
+        self.assertEqual(self._template(other), '/users/me')
+        self.assertEqual(self._resolve('/users/3/orders'), [first])
+
+    def test_configured_template_takes_over_covered_paths(self):
+        (auto_id,) = self._resolve('/files/a/raw')
+        path_template, merged = add_template(self.project_id, '/files/{name}/raw')
+        paths._path_ids.clear()
+
+        self.assertEqual(merged, 1)
+        self.assertEqual(PathTemplate.objects.get(pk=auto_id).merged_into, path_template)
+        covered, other = self._resolve('/files/b/raw', '/files/b/other')
+        self.assertEqual(covered, path_template.pk)
+        self.assertNotEqual(other, path_template.pk)
+
+    def test_learning_needs_min_variants(self):
+        names = [f'user{chr(97 + i)}' for i in range(4)]
+        self._resolve(*(f'/users/{name}' for name in names[:3]))
+        self._resolve(*(f'/teams/{name}/members' for name in names))
+
+        self.assertEqual(learn_path_templates(self.project_id, min_variants=4), [
+            PathTemplate.objects.get(project_id=self.project_id, template='/teams/{param}/members'),
+        ])
+        self.assertEqual(learn_path_templates(self.project_id, min_variants=4), [])
+        self.assertEqual(
+            PathTemplate.objects.filter(project_id=self.project_id, template='/teams/{param}/members')
+            .get().merged.count(),
+            4,
+        )
+
+    def test_learning_leaves_the_first_segment_alone(self):
+        self._resolve(*(f'/{name}' for name in ('alpha', 'beta', 'gamma')))
+        self.assertEqual(learn_path_templates(self.project_id, min_variants=3), [])
+
+    def test_learn_all_skips_projects_below_the_threshold(self):
+        self._resolve(*(f'/users/{name}' for name in ('ann', 'bob', 'cat')))
+        with mock.patch.object(paths, 'PATH_TEMPLATE_LEARN_MIN_VARIANTS', 4):
+            self.assertEqual(learn_all_path_templates(), [])
+        with mock.patch.object(paths, 'PATH_TEMPLATE_LEARN_MIN_VARIANTS', 3), \
+                mock.patch.object(paths, 'learn_path_templates', return_value=[]) as learn:
+            learn_all_path_templates()
+        learn.assert_called_once_with(self.project_id)
+
+
+# The view runs its queries on events.blocking's pool threads, which only see
+# committed rows.
+class MergedPathRollupReadTests(TransactionTestCase):
+
+    def test_merged_templates_report_under_their_target(self):
+        project_id, agent_id = str(uuid.uuid4()), str(uuid.uuid4())
+        paths._path_ids.clear()
+        resolved = resolve_path_ids([(project_id, '/users/alice'), (project_id, '/users/bob')])
+        learned, _ = add_template(project_id, '/users/{param}', PathTemplate.LEARNED)
+        day = datetime(2024, 1, 1).date()
+        for path_id, count in zip(resolved.values(), (2, 3)):
+            AgentPathDailyRollup.objects.create(
+                project_id=project_id, agent_id=agent_id, path_template_id=path_id, event_date=day,
+                request_count=count, latency_min=1, latency_max=1,
+            )
+
+        request = RequestFactory().get(
+            '/', {'start_date': '2024-01-01', 'end_date': '2024-01-01'},
+            **_dashboard_headers(self, project_id, agent_id),
+        )
+        response = async_to_sync(AgentPathTimeseriesView.as_view())(request)
+
+        self.assertEqual(json.loads(response.content)['paths'], [{
+            'path': '/users/{param}',
+            'path_id': learned.pk,
+            'data': [{'date': '2024-01-01', 'count': 5}],
+        }])
+
+
+class IngestBufferTests(TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(buffer, '_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.project_id = str(uuid.uuid4())
+
+    def _enqueue(self, *paths, **fields):
+        return buffer.enqueue_events([dict(_event(project_id=self.project_id, path=path), **fields) for path in paths])
+
+    def _queued_paths(self, key=buffer.EVENT_BUFFER_KEY):
+        return [json.loads(raw)['event']['path'] for raw in self.redis.lrange(key, 0, -1)]
+
+    def test_flush_writes_batches_and_releases_its_claim(self):
+        event_ids = self._enqueue('/a', '/b', '/c')
+
+        self.assertEqual(buffer.flush_event_buffer(batch_size=2), 3)
+
+        self.assertEqual(
+            set(BackendEvent.objects.values_list('event_id', flat=True)), set(event_ids),
+        )
+        self.assertEqual(self.redis.llen(buffer.EVENT_BUFFER_KEY), 0)
+        self.assertEqual(self.redis.smembers(buffer.WORKERS_KEY), set())
+        metrics = buffer.get_buffer_metrics()
+        self.assertEqual(
+            (metrics['queue_depth'], metrics['in_flight'], metrics['flushed_total'], metrics['last_flush_count']),
+            (0, 0, 3, 1),
+        )
+
+    def test_claims_hold_a_lease_until_released(self):
+        self._enqueue('/a', '/b', '/c')
+
+        claimed = buffer._claim(self.redis, 'w', 2)
+
+        self.assertEqual([json.loads(raw)['event']['path'] for raw in claimed], ['/a', '/b'])
+        self.assertEqual(self._queued_paths(), ['/c'])
+        self.assertEqual(self._queued_paths(buffer._processing_key('w')), ['/a', '/b'])
+        self.assertLessEqual(self.redis.ttl(buffer._lease_key('w')), buffer.EVENT_BUFFER_CLAIM_TIMEOUT)
+        buffer._release(self.redis, 'w')
+        self.assertTrue(self.redis.exists(buffer._lease_key('w')))
+        self.assertEqual(self.redis.smembers(buffer.WORKERS_KEY), {b'w'})
+
+    def test_expired_claims_go_back_to_the_head_in_order(self):
+        self._enqueue('/a', '/b', '/c')
+        buffer._claim(self.redis, 'live', 1)
+        buffer._claim(self.redis, 'dead', 2)
+        self.redis.delete(buffer._lease_key('dead'))
+
+        with self.assertLogs('events.buffer', 'WARNING'):
+            self.assertEqual(buffer.recover_stale_claims(), 2)
+
+        self.assertEqual(self._queued_paths(), ['/b', '/c'])
+        self.assertEqual(self.redis.smembers(buffer.WORKERS_KEY), {b'live'})
+        self.assertEqual(buffer.get_buffer_metrics()['in_flight'], 1)
+
+    def test_events_saved_before_a_crash_are_not_written_twice(self):
+        first, _ = self._enqueue('/a', '/b')
+        raw = self.redis.lindex(buffer.EVENT_BUFFER_KEY, 0)
+        bulk_save_events([buffer._decode(raw)[1]])
+
+        self.assertEqual(buffer.flush_event_buffer(), 1)
+
+        self.assertEqual(BackendEvent.objects.filter(event_id=first).count(), 1)
+        self.assertEqual(BackendEvent.objects.count(), 2)
+
+    def test_failing_events_are_bisected_into_the_dead_letter_list(self):
+        self._enqueue('/a', '/b', '/c')
+        bad, = self._enqueue('/bad', latency_ms='fast')
+        self.redis.rpush(buffer.EVENT_BUFFER_KEY, b'not json')
+
+        with self.assertLogs('events.buffer', 'ERROR'):
+            self.assertEqual(buffer.flush_event_buffer(), 3)
+
+        self.assertEqual(BackendEvent.objects.count(), 3)
+        dead = self.redis.lrange(buffer.DEAD_LETTER_KEY, 0, -1)
+        self.assertEqual(dead[0], b'not json')
+        envelope = json.loads(dead[1])
+        self.assertEqual((envelope['event']['event_id'], envelope['attempts']), (str(bad), 1))
+        self.assertEqual(buffer.get_buffer_metrics()['dead_letter_depth'], 2)
+
+    def test_transient_errors_requeue_until_max_attempts(self):
+        self._enqueue('/a')
+
+        with mock.patch.object(buffer, 'bulk_save_events', side_effect=OperationalError), \
+                self.assertLogs('events.buffer', 'ERROR'):
+            for attempt in range(1, buffer.EVENT_BUFFER_MAX_ATTEMPTS):
+                self.assertEqual(buffer.flush_event_buffer(), 0)
+                envelope = json.loads(self.redis.lindex(buffer.EVENT_BUFFER_KEY, 0))
+                self.assertEqual(envelope['attempts'], attempt)
+            buffer.flush_event_buffer()
+
+        self.assertEqual(self.redis.llen(buffer.EVENT_BUFFER_KEY), 0)
+        self.assertEqual(self.redis.llen(buffer.DEAD_LETTER_KEY), 1)
+
+    def test_metrics_report_the_oldest_event(self):
+        self.assertIsNone(buffer.get_buffer_metrics()['oldest_event_age_seconds'])
+        with mock.patch.object(buffer.time, 'time', return_value=1000.0):
+            self._enqueue('/a')
+        with mock.patch.object(buffer.time, 'time', return_value=1002.5):
+            metrics = buffer.get_buffer_metrics()
+        self.assertEqual((metrics['queue_depth'], metrics['oldest_event_age_seconds']), (1, 2.5))
+
+
+class BucketCountsTests(TestCase):
+
+    def setUp(self):
+        self.agent_id = str(uuid.uuid4())
+        self.start = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+        bulk_save_events([
+            dict(_event(project_id=str(uuid.uuid4()), path=f'/{name}'), agent_id=self.agent_id, event_time=self.start)
+            for name in ('a', 'b', 'c')
+        ])
+
+    def test_path_series_are_limited_by_paths_times_buckets(self):
+        end = self.start + timedelta(minutes=10)
+        rows = bucket_counts(self.agent_id, 'minute', self.start, end, group_by_path=True)
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(sum(row['request_count'] for row in rows), 3)
+
+        with mock.patch.object(buckets, 'ANALYTICS_MAX_PATH_BUCKETS', 29):
+            with self.assertRaisesMessage(BucketError, '3 paths x 10'):
+                bucket_counts(self.agent_id, 'minute', self.start, end, group_by_path=True)
+
+
+class PayloadDictionaryTests(TestCase):
+
+    def setUp(self):
+        self.project_id = str(uuid.uuid4())
+        rng = random.Random(7)
+        self.samples = [
+            json.dumps({
+                'request_headers': json.dumps({'accept': 'application/json', 'x-request-id': str(uuid.UUID(int=rng.getrandbits(128)))}),
+                'response_body': json.dumps({'order': rng.randrange(10 ** 6), 'status': rng.choice(['open', 'paid'])}),
+            }).encode()
+            for _ in range(400)
+        ]
+
+    def _dictionary(self, age_seconds, **fields):
+        dictionary = PayloadDictionary.objects.create(
+            project_id=self.project_id, data=train_dictionary(self.samples, size=4096), sample_count=400, **fields,
+        )
+        PayloadDictionary.objects.filter(pk=dictionary.pk).update(
+            created_at=datetime.now(timezone.utc) - timedelta(seconds=age_seconds),
+        )
+        return dictionary
+
+    def test_deletes_superseded_dictionaries_no_row_uses(self):
+        unused = self._dictionary(3 * 3600)
+        used = self._dictionary(2 * 3600)
+        recently_superseded = self._dictionary(3600)
+        newest = self._dictionary(60)
+        event, = bulk_save_events([_event(project_id=self.project_id)])
+        BackendEventPayload.objects.create(event=event, event_date=event.event_date, packed=b'x', dictionary=used)
+
+        self.assertEqual(delete_unused_payload_dictionaries(), 1)
+
+        self.assertEqual(
+            set(PayloadDictionary.objects.values_list('pk', flat=True)),
+            {used.pk, recently_superseded.pk, newest.pk},
+        )
+        self.assertNotIn(unused.pk, payload_codec._dictionaries)
+
+    def test_retrains_only_when_compression_degrades(self):
+        AgentPathDailyRollup.objects.create(
+            project_id=self.project_id, path_template_id=1, event_date=datetime.now(timezone.utc).date(),
+            latency_min=1, latency_max=1,
+        )
+        current = self._dictionary(3600)
+        ratio = payload_codec.compression_ratio(self.samples, payload_codec._dictionary(current.pk))
+
+        with mock.patch.object(payload_codec, 'sample_payloads', return_value=self.samples):
+            PayloadDictionary.objects.filter(pk=current.pk).update(compression_ratio=ratio * 1.05)
+            self.assertEqual(retrain_payload_dictionaries(), [])
+            PayloadDictionary.objects.filter(pk=current.pk).update(compression_ratio=ratio * 1.5)
+            created, = retrain_payload_dictionaries()
+
+        self.assertEqual(created.sample_count, 320)
+        self.assertGreater(created.compression_ratio, 1)
+
+
+class RebuildSessionSummariesTests(TestCase):
+
+    def setUp(self):
+        self.project_id = uuid.uuid4()
+        self.long_session = uuid.uuid4()
+        self.short_session = uuid.uuid4()
+        events = [
+            (self.long_session, datetime(2024, 1, 1, 10, tzinfo=timezone.utc), 10.0, None),
+            (self.long_session, datetime(2024, 1, 5, 10, tzinfo=timezone.utc), 30.0, 'boom'),
+            (self.short_session, datetime(2024, 1, 3, 10, tzinfo=timezone.utc), 5.0, None),
+        ]
+        bulk_save_events([
+            dict(
+                _event(project_id=str(self.project_id), latency_ms=latency, error=error, request_size_bytes=7),
+                agent_session_id=str(session_id), event_time=event_time,
+            )
+            for session_id, event_time, latency, error in events
+        ])
+
+    def test_rebuilds_sessions_in_range_from_all_their_events(self):
+        SessionSummary.objects.filter(agent_session_id=self.long_session).update(request_count=99, latency_max=1)
+        SessionSummary.objects.filter(agent_session_id=self.short_session).delete()
+
+        self.assertEqual(sum(rebuild_session_summaries(datetime(2024, 1, 3).date(), datetime(2024, 1, 5).date())), 2)
+
+        long_summary = SessionSummary.objects.get(agent_session_id=self.long_session)
+        # The event of Jan 1 lies before the range; the summary's own bounds cover it.
+        self.assertEqual(
+            (long_summary.request_count, long_summary.error_count, long_summary.latency_sum,
+             long_summary.latency_max, long_summary.request_bytes),
+            (2, 1, 40.0, 30.0, 14),
+        )
+        self.assertEqual(long_summary.first_event_time, datetime(2024, 1, 1, 10, tzinfo=timezone.utc))
+        short_summary = SessionSummary.objects.get(agent_session_id=self.short_session)
+        self.assertEqual((short_summary.request_count, short_summary.project_id), (1, self.project_id))
+
+
+
+class PartitionTests(TestCase):
+
+    def test_moves_rows_out_of_the_default_partition(self):
+        day = datetime(2031, 2, 3, tzinfo=timezone.utc)
+        with connection.cursor() as cursor:
+            self.assertNotIn(day.date(), [lower for _, lower, _ in list_partitions(cursor)])
+        event, = bulk_save_events([dict(_event(project_id=str(uuid.uuid4()), error='boom'), event_time=day)])
+
+        created = ensure_partitions(day.date(), day.date() + timedelta(days=1))
+
+        self.assertIn('backend_event_p20310203', created)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM backend_event_default WHERE event_id = %s', [event.event_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute('SELECT error, latency_ms FROM backend_event_p20310203 WHERE event_id = %s', [event.event_id])
+            self.assertEqual(cursor.fetchone(), ('boom', 12.5))
+        self.assertEqual(BackendEvent.objects.get(event_id=event.event_id).path, '/orders/1')
+
+    def test_expiry_invalidates_cached_analytics(self):
+        day = datetime(2020, 1, 6, tzinfo=timezone.utc).date()
+        ensure_partitions(day, day + timedelta(days=1))
+        retention_days = (datetime.now(timezone.utc).date() - day).days - 30
+
+        with mock.patch.object(partitions, 'invalidate_all') as invalidate_all:
+            with self.captureOnCommitCallbacks(execute=True):
+                expired = expire_partitions(retention_days)
+
+        self.assertIn('backend_event_p20200106', expired)
+        invalidate_all.assert_called_once_with()
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    INTERNAL_API_TOKEN='secret',
+)
+class AgentUserAuthCacheTests(SimpleTestCase):
+    user_id = str(uuid.uuid4())
+    project_id = str(uuid.uuid4())
+    agent_id = str(uuid.uuid4())
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.headers = _dashboard_headers(self, self.project_id, self.agent_id, self.user_id)
+
+        @decorators.agent_user_auth_required
+        async def view(request):
+            return JsonResponse({'agent_id': request.auth_agent_id})
+
+        self.view = view
+
+    async def _authorize(self):
+        response = await self.view(self.factory.get('/', **self.headers))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_decisions_are_cached(self):
+        await self._authorize()
+        await self._authorize()
+        self.assertEqual(self.uasam.await_count, 1)
+
+    async def test_invalidation_drops_cached_decisions(self):
+        for kind in ('user', 'project', 'agent'):
+            await self._authorize()
+            calls = self.uasam.await_count
+            decorators.invalidate_agent_user_auth(**{f'{kind}_ids': [getattr(self, f'{kind}_id').upper()]})
+            await self._authorize()
+            self.assertEqual(self.uasam.await_count, calls + 1, kind)
+
+    async def test_unrelated_invalidation_keeps_cached_decisions(self):
+        await self._authorize()
+        decorators.invalidate_agent_user_auth(user_ids=[str(uuid.uuid4())], agent_ids=[str(uuid.uuid4())])
+        await self._authorize()
+        self.assertEqual(self.uasam.await_count, 1)
+
+    async def test_uasam_rejections_pass_through(self):
+        self.uasam.return_value = mock.Mock(status_code=404, json=lambda: {'status_description': 'agent_not_found'})
+        with self.assertLogs('decorators', 'WARNING'):
+            response = await self.view(self.factory.get('/', **self.headers))
+        self.assertEqual((response.status_code, json.loads(response.content)['status_description']), (404, 'agent_not_found'))
+
+    async def test_malformed_uasam_responses_answer_503(self):
+        def not_json():
+            raise ValueError('not json')
+
+        for status_code, body in ((200, not_json), (200, lambda: {'status': 1}), (502, not_json), (403, lambda: [])):
+            self.uasam.return_value = mock.Mock(status_code=status_code, json=body, text='<html>')
+            with self.assertLogs('decorators', 'WARNING'):
+                response = await self.view(self.factory.get('/', **self.headers))
+            self.assertEqual(
+                (response.status_code, json.loads(response.content)['status_description']),
+                (503, 'auth_service_error'),
+            )
+        self.assertEqual(len(decorators._agent_user_auth_cache), 0)
+
+    def _post_invalidate(self, body, token='secret'):
+        request = self.factory.post(
+            '/api/v1/internal/auth-cache/invalidate/',
+            data=body,
+            content_type='application/json',
+            HTTP_X_OTAS_INTERNAL_TOKEN=token,
+        )
+        return AgentUserAuthInvalidateView.as_view()(request)
+
+    def test_invalidate_view(self):
+        with mock.patch.object(decorators.cache, 'incr', wraps=decorators.cache.incr) as incr:
+            response = self._post_invalidate(json.dumps({'agent_ids': [self.agent_id]}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(incr.call_count, 1)
+        self.assertEqual(self._post_invalidate(json.dumps({'agent_ids': self.agent_id})).status_code, 400)
+        self.assertEqual(self._post_invalidate('[]').status_code, 400)
+        self.assertEqual(self._post_invalidate('{}', token='wrong').status_code, 401)
+
+
+class IngestApplicationTests(SimpleTestCase):
+    sdk_path = '/api/v1/backend/log/sdk/'
+    agent_path = '/api/v1/backend/log/agent/'
+
+    def setUp(self):
+        self.django_scopes = []
+
+        async def django_application(scope, receive, send):
+            self.django_scopes.append(scope)
+
+        self.capture_sdk = mock.AsyncMock(return_value=(201, {'status': 1}))
+        self.capture_agent = mock.AsyncMock(return_value=(202, {'status': 1}))
+        with mock.patch.object(fast_ingest, 'capture_sdk_event', self.capture_sdk), \
+                mock.patch.object(fast_ingest, 'capture_agent_event', self.capture_agent):
+            self.app = fast_ingest.IngestApplication(django_application)
+
+    def _call(self, path, headers=(), chunks=(b'{}',), method='POST', scope_type='http', complete=True):
+        scope = {'type': scope_type, 'method': method, 'path': path, 'headers': list(headers)}
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+        messages[-1]['more_body'] = not complete
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        async_to_sync(self.app)(scope, receive, send)
+        if not sent:
+            return None, None, None
+        return sent[0]['status'], dict(sent[0]['headers']), json.loads(sent[1]['body'])
+
+    def test_routes_ingest_posts_to_the_capture_coroutines(self):
+        status, headers, data = self._call(
+            self.sdk_path, [(b'x-otas-sdk-key', b'k'), (b'x-otas-agent-session-token', b't')], [b'{"a":', b' 1}'],
+        )
+        self.assertEqual((status, data), (201, {'status': 1}))
+        self.capture_sdk.assert_awaited_once_with('k', 't', b'{"a": 1}')
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(headers[b'content-length'], b'12')
+
+        status, _, _ = self._call(self.agent_path, [(b'x-otas-agent-key', b'a')])
+        self.assertEqual(status, 202)
+        self.capture_agent.assert_awaited_once_with('a', None, b'{}')
+        self.assertEqual(self.django_scopes, [])
+
+    def test_everything_else_falls_through_to_django(self):
+        self._call(self.sdk_path, [(b'x-otas-sdk-key', b'k'), (b'origin', b'https://app.example')])
+        self._call(self.sdk_path, method='OPTIONS')
+        self._call(self.sdk_path, method='GET')
+        self._call('/api/v1/backend/log/sdk/batch/')
+        self._call('', scope_type='lifespan')
+        self.assertEqual(len(self.django_scopes), 5)
+        self.capture_sdk.assert_not_awaited()
+
+    def test_bodies_over_the_upload_limit_are_rejected(self):
+        with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=8):
+            self.app = fast_ingest.IngestApplication(self.app.django_application)
+        status, _, data = self._call(self.sdk_path, chunks=[b'{"a":', b' 1234}'])
+        self.assertEqual((status, data['status_description']), (413, 'request_too_large'))
+        self.capture_sdk.assert_not_awaited()
+
+    def test_disconnect_sends_nothing(self):
+        self.assertEqual(self._call(self.sdk_path, chunks=[b'{'], complete=False), (None, None, None))
+        self.capture_sdk.assert_not_awaited()
+
+    def test_capture_errors_answer_500(self):
+        self.capture_sdk.side_effect = RuntimeError
+        with self.assertLogs('events.fast_ingest', 'ERROR'):
+            status, _, data = self._call(self.sdk_path)
+        self.assertEqual((status, data['status_description']), (500, 'event_capture_failed'))
+
+    def test_auth_failures(self):
+        self.app = fast_ingest.IngestApplication(None)
+        status, _, data = self._call(self.sdk_path)
+        self.assertEqual((status, data['status_description']), (401, 'missing_sdk_key'))
+
+        with mock.patch.object(ingest, 'averify_sdk_key', mock.AsyncMock(return_value=None)):
+            status, _, data = self._call(self.sdk_path, [(b'x-otas-sdk-key', b'bad')])
+        self.assertEqual((status, data['status_description']), (401, 'invalid_sdk_key'))
+
+        with mock.patch.object(ingest, 'avalidate_agent_key', mock.AsyncMock(return_value=None)):
+            status, _, data = self._call(self.agent_path, [(b'x-otas-agent-key', b'bad')])
+        self.assertEqual((status, data['status_description']), (401, 'invalid_or_expired_agent_key'))
+
+
+def _sse_frames(chunk):
+    """
+    Parses SSE frames into [{field: value}], data decoded from JSON.
+    """
+    frames = []
+    for block in chunk.decode().split('\n\n')[:-1]:
+        frame = {}
+        for line in block.split('\n'):
+            name, _, value = line.partition(': ')
+            frame[name] = json.loads(value) if name == 'data' else value
+        frames.append(frame)
+    return frames
+
+
+class SseFrameTests(SimpleTestCase):
+
+    def test_frames(self):
+        self.assertEqual(live_tail.sse_frame(comment='connected', retry=2000), ': connected\nretry: 2000\n\n')
+        self.assertEqual(
+            live_tail.sse_frame({'a': [1, 2]}, event='event', event_id='c1'),
+            'event: event\nid: c1\ndata: {"a":[1,2]}\n\n',
+        )
+        self.assertEqual(_sse_frames(live_tail.sse_frame({'a': 1}, event='gap').encode()), [
+            {'event': 'gap', 'data': {'a': 1}},
+        ])
+
+
+class LiveTailTestMixin:
+    """
+    Points the live tail publisher and subscribers at one fake Redis server.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.redis_server = fakeredis.FakeServer()
+        self.publisher = fakeredis.FakeRedis(server=self.redis_server)
+        mock.patch.object(live_tail, '_client', self.publisher).start()
+        mock.patch.object(live_tail, '_paused_until', 0.0).start()
+        mock.patch.object(live_tail, '_missed', {}).start()
+        mock.patch.object(
+            live_tail.redis.asyncio.Redis, 'from_url',
+            side_effect=lambda url: fakeredis.FakeAsyncRedis(server=self.redis_server),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _outage(self):
+        """
+        Makes the next publish fail as if Redis were unreachable.
+        """
+        broken = mock.Mock()
+        broken.pipeline.return_value.execute.side_effect = redis.ConnectionError('down')
+        live_tail._client = broken
+
+    def _recover(self):
+        live_tail._client = self.publisher
+        live_tail._paused_until = 0.0
+
+
+class LiveTailPublishTests(LiveTailTestMixin, SimpleTestCase):
+
+    def _events(self, agent_id, *minutes):
+        start = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+        return [
+            SimpleNamespace(agent_id=agent_id, event_time=start + timedelta(minutes=minute), minute=minute)
+            for minute in minutes
+        ]
+
+    def test_gap_marker_precedes_events_after_an_outage(self):
+        pubsub = self.publisher.pubsub()
+        pubsub.subscribe(live_tail._channel('a'))
+        pubsub.get_message()
+        serialize = lambda event: event.minute  # noqa: E731
+
+        self._outage()
+        with self.assertLogs('events.live_tail', 'WARNING'):
+            live_tail.publish_events(self._events('a', 5, 3), serialize)
+        # Paused: dropped without another attempt.
+        live_tail.publish_events(self._events('a', 1), serialize)
+        self.assertEqual(live_tail._client.pipeline.call_count, 1)
+
+        self._recover()
+        live_tail.publish_events(self._events('a', 7), serialize)
+        live_tail.publish_events(self._events('a', 8), serialize)
+
+        messages = [json.loads(message['data']) for message in iter(pubsub.get_message, None)]
+        self.assertEqual(messages, [{'gap': '2024-01-01T10:01:00+00:00'}, [7], [8]])
+
+
+# The view reads the backlog on events.blocking's pool threads, which only
+# see committed rows.
+class AgentEventTailViewTests(LiveTailTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.project_id, self.agent_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.headers = _dashboard_headers(self, self.project_id, self.agent_id)
+        self.start = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+
+    def _save(self, *minutes):
+        return bulk_save_events([
+            dict(
+                _event(project_id=self.project_id, path=f'/orders/{minute}'),
+                agent_id=self.agent_id, agent_session_id=str(uuid.uuid4()),
+                event_time=self.start + timedelta(minutes=minute),
+            )
+            for minute in minutes
+        ])
+
+    @asynccontextmanager
+    async def _tail(self, **headers):
+        request = RequestFactory().get('/api/v1/agent/events/tail/', **self.headers, **headers)
+        response = await AgentEventTailView.as_view()(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(_sse_frames(await anext(stream)), [{'': 'connected', 'retry': '2000'}])
+            yield stream
+        finally:
+            await stream.aclose()
+
+    async def _next(self, stream, publish=None):
+        """
+        The next frame; `publish` runs once the stream waits on Redis.
+        """
+        frame = asyncio.ensure_future(anext(stream))
+        if publish:
+            await asyncio.sleep(0.05)
+            await sync_to_async(publish)()
+        (parsed,) = _sse_frames(await asyncio.wait_for(frame, 5))
+        return parsed
+
+    async def test_last_event_id_replays_missed_events(self):
+        first, second, third = await sync_to_async(self._save)(1, 2, 3)
+
+        async with self._tail(HTTP_LAST_EVENT_ID=encode_event_cursor(first)) as stream:
+            for event in (second, third):
+                frame = await self._next(stream)
+                self.assertEqual((frame['event'], frame['id']), ('event', encode_event_cursor(event)))
+                self.assertEqual(frame['data']['event_id'], str(event.event_id))
+            live = await self._next(stream, lambda: self._save(4))
+        self.assertEqual(live['data']['path'], '/orders/4')
+
+    async def test_gap_frame_after_a_publish_outage(self):
+        def outage_then_recovery():
+            self._outage()
+            with self.assertLogs('events.live_tail', 'WARNING'):
+                self._save(2, 1)
+            self._recover()
+            self._save(3)
+
+        async with self._tail() as stream:
+            gap = await self._next(stream, outage_then_recovery)
+            live = await self._next(stream)
+        self.assertEqual(gap['event'], 'gap')
+        cursor_time, _ = decode_event_cursor(gap['data']['cursor'])
+        self.assertEqual(cursor_time, self.start + timedelta(minutes=1))
+        self.assertEqual(live['data']['path'], '/orders/3')
+
+    async def test_invalid_cursor_is_rejected(self):
+        request = RequestFactory().get('/', {'cursor': 'nope'}, **self.headers)
+        response = await AgentEventTailView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_closed_open_half_open_cycle(self):
+        breaker = uasam_client.CircuitBreaker(failure_threshold=2, reset_seconds=10)
+        with mock.patch.object(uasam_client.time, 'monotonic', return_value=100.0) as monotonic:
+            breaker.record_failure()
+            self.assertEqual((breaker.state, breaker.allow()), ('closed', True))
+            with self.assertLogs('uasam_client', 'WARNING'):
+                breaker.record_failure()
+            self.assertEqual((breaker.state, breaker.allow()), ('open', False))
+
+            monotonic.return_value = 110.0
+            self.assertTrue(breaker.allow())
+            self.assertEqual((breaker.state, breaker.allow()), ('half_open', False))
+            # A failed trial call reopens it at once.
+            with self.assertLogs('uasam_client', 'WARNING'):
+                breaker.record_failure()
+            self.assertEqual((breaker.state, breaker.allow()), ('open', False))
+
+            monotonic.return_value = 120.0
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+            self.assertEqual((breaker.state, breaker.failures, breaker.allow()), ('closed', 0, True))
+
+
+@mock.patch.object(uasam_client, 'RETRY_BACKOFF', 0)
+@mock.patch.object(uasam_client, 'MAX_RETRIES', 2)
+class UasamClientTests(SimpleTestCase):
+    url = 'http://uasam.test/api/agent/v1/user/authenticate/'
+
+    def setUp(self):
+        self.client = uasam_client.UasamClient()
+        self.client.breaker.failure_threshold = 100
+
+    def _mock_transport(self, *outcomes):
+        """
+        Makes the client's async calls answer with outcomes in turn: a status
+        code, or an httpx exception class to raise. Returns the list of
+        requests sent.
+        """
+        sent = []
+        outcomes = list(outcomes)
+
+        def handler(request):
+            sent.append(request)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, int):
+                return httpx.Response(outcome, json={})
+            raise outcome('failed', request=request)
+
+        real_client = httpx.AsyncClient
+        patcher = mock.patch.object(
+            uasam_client.httpx, 'AsyncClient',
+            side_effect=lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return sent
+
+    def test_sync_retries_are_bounded(self):
+        with mock.patch.object(self.client.session, 'post', side_effect=requests.exceptions.ConnectionError) as post:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.post(self.url)
+        self.assertEqual(post.call_count, 3)
+
+        responses = [mock.Mock(status_code=503), mock.Mock(status_code=503), mock.Mock(status_code=200)]
+        with mock.patch.object(self.client.session, 'post', side_effect=responses) as post:
+            self.assertEqual(self.client.post(self.url).status_code, 200)
+        with mock.patch.object(self.client.session, 'post', return_value=mock.Mock(status_code=500)) as post:
+            self.assertEqual(self.client.post(self.url).status_code, 500)
+        self.assertEqual(post.call_count, 1)
+
+        metrics = self.client.get_metrics()
+        self.assertEqual((metrics['requests'], metrics['retries'], metrics['failures']), (7, 4, 6))
+
+    def test_async_retries_are_bounded(self):
+        sent = self._mock_transport(503, 503, 503, 404)
+        self.assertEqual(async_to_sync(self.client.apost)(self.url).status_code, 503)
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(async_to_sync(self.client.apost)(self.url).status_code, 404)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    def test_httpx_errors_are_raised_as_requests_errors(self):
+        self._mock_transport(*[httpx.ConnectTimeout] * 3, *[httpx.ConnectError] * 3, httpx.PoolTimeout)
+        with self.assertRaises(requests.exceptions.Timeout):
+            async_to_sync(self.client.apost)(self.url)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            async_to_sync(self.client.apost)(self.url)
+        failures = self.client.metrics.counters['failures']
+        # Pool exhaustion is local: neither retried nor counted against UASAM.
+        with self.assertRaises(requests.exceptions.Timeout):
+            async_to_sync(self.client.apost)(self.url)
+        self.assertEqual(self.client.metrics.counters['failures'], failures)
+
+    def test_open_circuit_rejects_without_sending(self):
+        self.client.breaker.failure_threshold = 2
+        sent = self._mock_transport(503, 503)
+        # The breaker opens mid-call, so the last retry is never sent.
+        with self.assertLogs('uasam_client', 'WARNING'), self.assertRaises(uasam_client.CircuitOpenError):
+            async_to_sync(self.client.apost)(self.url)
+        with self.assertRaises(uasam_client.CircuitOpenError):
+            async_to_sync(self.client.apost)(self.url)
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(self.client.get_metrics()['circuit_rejections'], 2)
+
+    def test_async_client_is_replaced_per_event_loop(self):
+        self._mock_transport(200, 200, 200)
+
+        async def call():
+            await self.client.apost(self.url)
+            return self.client._async_session
+
+        first = async_to_sync(call)()
+        self.assertIs(async_to_sync(call)(), self.client._async_session)
+
+        async def call_and_finish_closes():
+            session = await call()
+            await asyncio.gather(*self.client._closing)
+            return session
+
+        second = async_to_sync(call_and_finish_closes)()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.is_closed)
+        self.assertFalse(second.is_closed)
+
+
+class ParseDateRangeTests(SimpleTestCase):
+
+    def test_parses_inclusive_range(self):
+        self.assertEqual(
+            parse_date_range({'start_date': '2024-01-01', 'end_date': '2024-01-01'}),
+            (date(2024, 1, 1), date(2024, 1, 1)),
+        )
+        self.assertEqual(parse_date_range({'end_date': '2024-01-02'}, required=False), (None, date(2024, 1, 2)))
+        self.assertEqual(parse_date_range({}, required=False), (None, None))
+
+    def test_rejects_bad_input(self):
+        cases = [
+            ({'start_date': '2024-01-01'}, 'start_date and end_date are required'),
+            ({'start_date': '2024-01-01', 'end_date': '01/02/2024'}, 'dates must be in YYYY-MM-DD format'),
+            ({'start_date': '2024-01-02', 'end_date': '2024-01-01'}, 'start_date must be before or equal to end_date'),
+        ]
+        for params, message in cases:
+            with self.subTest(params=params), self.assertRaisesMessage(ValueError, message):
+                parse_date_range(params)
+
+
+class IterateBlockingTests(SimpleTestCase):
+
+    async def _drain(self, iterable):
+        return [item async for item in blocking.iterate_blocking(iterable)]
+
+    def test_streams_from_successive_event_loops(self):
+        self.assertEqual(async_to_sync(self._drain)(range(3)), [0, 1, 2])
+        slots = blocking._stream_slots
+        self.assertEqual(async_to_sync(self._drain)(range(2)), [0, 1])
+        self.assertIsNot(blocking._stream_slots, slots)
+        self.assertEqual(len(blocking._stream_executors), blocking.ASYNC_STREAM_POOL_SIZE)
+
+    @mock.patch.multiple(blocking, ASYNC_STREAM_POOL_SIZE=1, _stream_loop=None, _stream_slots=None, _stream_executors=[])
+    async def test_streams_wait_for_a_free_slot(self):
+        first = blocking.iterate_blocking([1, 2])
+        second = blocking.iterate_blocking([3])
+        self.assertEqual(await anext(first), 1)
+        waiting = asyncio.ensure_future(anext(second))
+        await asyncio.sleep(0.05)
+        self.assertFalse(waiting.done())
+
+        self.assertEqual([item async for item in first], [2])
+        self.assertEqual(await waiting, 3)
+        await second.aclose()
@@ -2,21 +2,49 @@ from django.urls import path
 from .views import (
     BackendEventCaptureView,
     AgentEventCaptureView,
+    BackendEventBatchCaptureView,
+    AgentEventBatchCaptureView,
+    IngestBufferMetricsView,
+    UasamClientMetricsView,
+    AgentUserAuthInvalidateView,
     AgentPathTimeseriesView,
     AgentSessionEventsView,
+    AgentEventsView,
+    AgentSessionSummariesView,
+    EventExportView,
+    AgentEventTailView,
     AgentLatencyPercentilesView,
     AgentErrorCountView,
+    AgentOverviewView,
 )
 
 urlpatterns = [
     path('api/v1/backend/log/sdk/', BackendEventCaptureView.as_view(), name='backend-sdk-event-capture'),
     path('api/v1/backend/log/agent/', AgentEventCaptureView.as_view(), name='agent-event-capture'),
+    path('api/v1/backend/log/sdk/batch/', BackendEventBatchCaptureView.as_view(), name='backend-sdk-event-batch-capture'),
+    path('api/v1/backend/log/agent/batch/', AgentEventBatchCaptureView.as_view(), name='agent-event-batch-capture'),
+    path('api/v1/ingest/metrics/', IngestBufferMetricsView.as_view(), name='ingest-buffer-metrics'),
+    path('api/v1/uasam/metrics/', UasamClientMetricsView.as_view(), name='uasam-client-metrics'),
+    path(
+        'api/v1/internal/auth-cache/invalidate/',
+        AgentUserAuthInvalidateView.as_view(),
+        name='agent-user-auth-invalidate',
+    ),
     path("api/v1/agent/path-timeseries/", AgentPathTimeseriesView.as_view(), name="agent-path-timeseries"),
     path(
         "api/v1/agent/session/events/",
         AgentSessionEventsView.as_view(),
         name="agent-session-events",
     ),
+    path(
+        "api/v1/agent/session/summaries/",
+        AgentSessionSummariesView.as_view(),
+        name="agent-session-summaries",
+    ),
+    path("api/v1/agent/events/", AgentEventsView.as_view(), name="agent-events"),
+    path("api/v1/agent/events/export/", EventExportView.as_view(), name="agent-event-export"),
+    path("api/v1/agent/events/tail/", AgentEventTailView.as_view(), name="agent-event-tail"),
     path("api/v1/agent/latency-percentiles/", AgentLatencyPercentilesView.as_view(), name="agent-latency-percentiles"),
     path("api/v1/agent/error-count/", AgentErrorCountView.as_view(), name="agent-error-count"),
+    path("api/v1/agent/overview/", AgentOverviewView.as_view(), name="agent-overview"),
 ]
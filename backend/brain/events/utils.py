@@ -1,23 +1,166 @@
-from .models import BackendEvent
+from .models import BackendEvent, BackendEventPayload, PAYLOAD_FIELDS
+from .rollups import rollup_events
+from .response_cache import bump_ingest_watermarks
+from .payload_codec import build_payload, payload_values
+from .paths import resolve_path_ids
+from .live_tail import publish_events
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import uuid
+from datetime import datetime
 import jwt
 import requests
 from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils.dateparse import parse_datetime
 from django.db.models import Aggregate
+from django.db.models import JSONField
 from django.db.models.fields import FloatField
+from ttl_cache import TTLCache, MISSING
+from uasam_client import uasam_client
+
+logger = logging.getLogger(__name__)
 
 SDK_AUTH_URL = getattr(settings, 'SDK_AUTH_URL', 'http://uasam-backend:8000/api/project/v1/sdk/backend/key/authenticate/')
 AGENT_AUTH_URL = getattr(settings, 'AGENT_AUTH_URL', 'http://uasam-backend:8000/api/agent/v1/auth/verify/')
+LATENCY_EXACT_MAX_EVENTS = getattr(settings, 'LATENCY_EXACT_MAX_EVENTS', 50000)
+EVENT_BATCH_MAX_SIZE = getattr(settings, 'EVENT_BATCH_MAX_SIZE', 1000)
+
+# Verified SDK keys, keyed by SHA-256 digest so raw keys never sit in memory.
+# Invalid keys are cached too, for SDK_KEY_CACHE_NEGATIVE_TTL seconds.
+_sdk_key_cache = TTLCache(
+    maxsize=getattr(settings, 'SDK_KEY_CACHE_MAXSIZE', 10000),
+    ttl=getattr(settings, 'SDK_KEY_CACHE_TTL', 300),
+)
+SDK_KEY_CACHE_NEGATIVE_TTL = getattr(settings, 'SDK_KEY_CACHE_NEGATIVE_TTL', 30)
+# digest -> in-flight async UASAM lookup, see averify_sdk_key.
+_sdk_key_lookups = {}
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Postgres integer range; PositiveIntegerField adds a >= 0 check.
+_INT4_MAX = 2147483647
+
+
+def event_int(value):
+    """
+    value as an int in PositiveIntegerField's range. Raises ValueError,
+    TypeError or OverflowError otherwise.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('not an integer')
+    number = int(value)
+    if not 0 <= number <= _INT4_MAX:
+        raise ValueError('out of range')
+    return number
+
+
+def event_float(value):
+    """
+    value as a finite, non-negative float. Raises ValueError or TypeError
+    otherwise.
+    """
+    if isinstance(value, bool):
+        raise ValueError('not a number')
+    number = float(value)
+    # float() accepts "nan" and "inf", and nan < 0 is False.
+    if not math.isfinite(number) or number < 0:
+        raise ValueError('out of range')
+    return number
+
+
+def _event_text(max_length=None):
+    def check(value):
+        if not isinstance(value, str):
+            raise TypeError('not a string')
+        # Postgres text cannot hold NUL.
+        if '\x00' in value or (max_length is not None and len(value) > max_length):
+            raise ValueError('invalid text')
+        return value
+    return check
+
+
+def _optional(check):
+    return lambda value: None if value is None else check(value)
+
+
+def _has_nul(value):
+    if isinstance(value, str):
+        return '\x00' in value
+    if isinstance(value, dict):
+        return any(_has_nul(key) or _has_nul(item) for key, item in value.items())
+    if isinstance(value, list):
+        return any(_has_nul(item) for item in value)
+    return False
+
+
+def _event_json(value):
+    # jsonb rejects NaN/Infinity and \u0000.
+    json.dumps(value, allow_nan=False)
+    if _has_nul(value):
+        raise ValueError('NUL in JSON')
+    return value
+
+
+def _payload_value(value):
+    # Payload columns are text; non-string values are stored as their text.
+    if isinstance(value, str) and '\x00' in value:
+        raise ValueError('NUL in text')
+    return value
+
+
+def _max_length(field):
+    return BackendEvent._meta.get_field(field).max_length
+
+
+# Checks (and coercions) for every event column a client may send, matching
+# the BackendEvent/BackendEventPayload columns, so a single malformed item is
+# rejected instead of failing the whole insert. Each raises TypeError,
+# ValueError or OverflowError on a bad value.
+_FIELD_CHECKS = {
+    'path': _event_text(),
+    'method': _event_text(_max_length('method')),
+    'status_code': event_int,
+    'latency_ms': event_float,
+    'request_size_bytes': event_int,
+    'response_size_bytes': event_int,
+    'request_content_type': _optional(_event_text(_max_length('request_content_type'))),
+    'response_content_type': _optional(_event_text(_max_length('response_content_type'))),
+    'error': _optional(_event_text()),
+    'custom_properties': _optional(_event_json),
+    'metadata': _optional(_event_json),
+    **{field: _optional(_payload_value) for field in PAYLOAD_FIELDS},
+}
+
+_UNPARSEABLE = object()
+
+def canonical_uuid(value):
+    """
+    The canonical (lowercase, hyphenated) string form of a UUID, or None if
+    value is not one. Project, agent and session ids are stored as uuid, so
+    ingest checks them with this before anything is written.
+    """
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
 
 def validate_agent_session_token(token):
     """
     Gets and validates an agent session JWT token.
     Returns with agent_session_id and agent_id on success, None on failure.
+    Tokens whose ids are not UUIDs are rejected.
     """
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=['HS256'])
 
-        agent_session_id = payload.get('agent_session_id')
-        agent_id = payload.get('agent_id')
+        agent_session_id = canonical_uuid(payload.get('agent_session_id'))
+        agent_id = canonical_uuid(payload.get('agent_id'))
 
         if not agent_session_id or not agent_id:
             return None
@@ -31,33 +174,85 @@ def validate_agent_session_token(token):
         return None
 
 
+def _sdk_key_digest(sdk_key):
+    return hashlib.sha256(sdk_key.encode()).hexdigest()
+
+
+def _sdk_key_result(digest, resp):
+    """
+    Project info from a UASAM SDK key response, caching the verdict.
+    """
+    logger.debug("UASAM SDK key response: %s", resp.status_code)
+    if resp.status_code == 200:
+        data = resp.json()
+        if data.get("status") == 1:
+            project = data["response"]["project"]
+            logger.debug("SDK key resolved to project %s", project.get("id"))
+            # Projects whose id is not a UUID cannot store events.
+            project_id = canonical_uuid(project.get("id"))
+            if project_id:
+                project = dict(project, id=project_id)
+                _sdk_key_cache.set(digest, project)
+                return project
+    if resp.status_code < 500:
+        # UASAM gave a definitive answer; outages are never cached.
+        _sdk_key_cache.set(digest, None, ttl=SDK_KEY_CACHE_NEGATIVE_TTL)
+    return None
+
+
 def verify_sdk_key(sdk_key):
     """
-    Calls the UASAM service to verify the SDK key.
+    Verifies the SDK key, calling the UASAM service only on a cache miss.
     Returns project info dict if valid, None if invalid.
     """
+    digest = _sdk_key_digest(sdk_key)
+    cached = _sdk_key_cache.get(digest)
+    if cached is not MISSING:
+        return cached
+
     try:
         headers = {"X-OTAS-SDK-KEY": sdk_key}
-        resp = requests.post(SDK_AUTH_URL, headers=headers)
-        print(f"response: {resp}")
-        if resp.status_code == 200:
-            data = resp.json()
-            print(f"response data: {data}")
-            if data.get("status") == 1:
-                print(f'project: {data["response"]["project"]}')
-                return data["response"]["project"]
+        resp = uasam_client.post(SDK_AUTH_URL, headers=headers)
+        return _sdk_key_result(digest, resp)
+    except Exception:
         return None
+
+
+async def _afetch_sdk_key(sdk_key, digest):
+    try:
+        headers = {"X-OTAS-SDK-KEY": sdk_key}
+        resp = await uasam_client.apost(SDK_AUTH_URL, headers=headers)
+        return _sdk_key_result(digest, resp)
     except Exception:
         return None
 
-def build_event_and_save(token_data, project_info, body, OPTIONAL_FIELDS):
+
+async def averify_sdk_key(sdk_key):
     """
-    Builds event_kwargs and saves to DB. Returns the event object.
+    Async variant of verify_sdk_key. Concurrent requests with the same
+    uncached key share one UASAM call.
+    """
+    digest = _sdk_key_digest(sdk_key)
+    cached = _sdk_key_cache.get(digest)
+    if cached is not MISSING:
+        return cached
+
+    lookup = _sdk_key_lookups.get(digest)
+    if lookup is None:
+        lookup = asyncio.ensure_future(_afetch_sdk_key(sdk_key, digest))
+        _sdk_key_lookups[digest] = lookup
+        lookup.add_done_callback(lambda _: _sdk_key_lookups.pop(digest, None))
+    # Shielded: one client disconnecting must not cancel the shared lookup.
+    return await asyncio.shield(lookup)
+
+def build_event_kwargs(body, OPTIONAL_FIELDS, *, project_id, agent_id, agent_session_id):
+    """
+    Maps a validated event body onto BackendEvent field kwargs.
     """
     event_kwargs = {
-        'agent_session_id': token_data['agent_session_id'],
-        'agent_id': token_data['agent_id'],
-        'project_id': project_info['id'],
+        'agent_session_id': agent_session_id,
+        'agent_id': agent_id,
+        'project_id': project_id,
         'path': body['path'],
         'method': body['method'],
         'status_code': body['status_code'],
@@ -66,7 +261,37 @@ def build_event_and_save(token_data, project_info, body, OPTIONAL_FIELDS):
     for field in OPTIONAL_FIELDS:
         if field in body:
             event_kwargs[field] = body[field]
-    return BackendEvent.objects.create(**event_kwargs)
+    return event_kwargs
+
+def build_event_and_save(token_data, project_info, body, OPTIONAL_FIELDS):
+    """
+    Builds event_kwargs and saves to DB. Returns the event object.
+    """
+    event_kwargs = build_event_kwargs(
+        body,
+        OPTIONAL_FIELDS,
+        project_id=project_info['id'],
+        agent_id=token_data['agent_id'],
+        agent_session_id=token_data['agent_session_id'],
+    )
+    return bulk_save_events([event_kwargs])[0]
+
+def _agent_key_result(response):
+    if response.status_code == 200:
+        data = response.json()
+        if data.get('status') == 1:
+            agent_data = data.get('response', {})
+            agent_id = canonical_uuid(agent_data.get('agent', {}).get('id'))
+            project_id = canonical_uuid(agent_data.get('project_id'))
+            if not agent_id or not project_id:
+                return None
+            return {
+                'agent_id': agent_id,
+                'project_id': project_id,
+                'agent_name': agent_data.get('agent', {}).get('name'),
+                'provider': agent_data.get('agent', {}).get('provider'),
+            }
+    return None
 
 def validate_agent_key(agent_key):
     """
@@ -78,41 +303,283 @@ def validate_agent_key(agent_key):
         headers = {
             'X-OTAS-AGENT-KEY': agent_key,
         }
-        response = requests.post(endpoint, headers=headers, json={}, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('status') == 1:
-                agent_data = data.get('response', {})
-                return {
-                    'agent_id': agent_data.get('agent', {}).get('id'),
-                    'project_id': agent_data.get('project_id'),
-                    'agent_name': agent_data.get('agent', {}).get('name'),
-                    'provider': agent_data.get('agent', {}).get('provider'),
-                }
-        return None
+        response = uasam_client.post(endpoint, headers=headers, json={})
+        return _agent_key_result(response)
     except (requests.RequestException, Exception):
         return None
 
+async def avalidate_agent_key(agent_key):
+    """
+    Async variant of validate_agent_key.
+    """
+    try:
+        headers = {
+            'X-OTAS-AGENT-KEY': agent_key,
+        }
+        response = await uasam_client.apost(AGENT_AUTH_URL, headers=headers, json={})
+        return _agent_key_result(response)
+    except Exception:
+        return None
+
 def build_agent_event_and_save(agent_info, body, OPTIONAL_FIELDS, *, agent_session_id):
     """
     Builds event_kwargs for agent event and saves to DB. Returns the event object.
     agent_session_id comes from the validated session JWT (same as SDK log path).
     """
-    event_kwargs = {
-        'agent_session_id': agent_session_id,
-        'agent_id': agent_info['agent_id'],
-        'project_id': agent_info['project_id'],
-        'path': body['path'],
-        'method': body['method'],
-        'status_code': body['status_code'],
-        'latency_ms': body['latency_ms'],
-    }
-    for field in OPTIONAL_FIELDS:
-        if field in body:
-            event_kwargs[field] = body[field]
-    return BackendEvent.objects.create(**event_kwargs)
+    event_kwargs = build_event_kwargs(
+        body,
+        OPTIONAL_FIELDS,
+        project_id=agent_info['project_id'],
+        agent_id=agent_info['agent_id'],
+        agent_session_id=agent_session_id,
+    )
+    return bulk_save_events([event_kwargs])[0]
+
+def parse_event_batch(raw_body, content_type):
+    """
+    Decodes a batch ingest body into a list of items.
+    Accepts a JSON array, a JSON object with an "events" array, or NDJSON
+    (one JSON object per line) when content_type is an NDJSON type.
+    Undecodable NDJSON lines are kept in place so they can be rejected per item.
+    Raises ValueError if the body as a whole cannot be decoded.
+    """
+    content_type = (content_type or '').split(';', 1)[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        text = raw_body.decode('utf-8') if isinstance(raw_body, bytes) else raw_body
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(_UNPARSEABLE)
+        return items
+
+    try:
+        body = json.loads(raw_body or '[]')
+    except json.JSONDecodeError as exc:
+        raise ValueError('invalid_json') from exc
+
+    if isinstance(body, dict):
+        body = body.get('events')
+    if not isinstance(body, list):
+        raise ValueError('invalid_batch')
+    return body
+
+def validate_event_item(item, REQUIRED_FIELDS):
+    """
+    Validates one batch item against REQUIRED_FIELDS and checks the type,
+    length and range of every event field it carries against the model,
+    coercing numeric fields. Returns (item, None) when valid,
+    (None, rejection) otherwise.
+    """
+    if item is _UNPARSEABLE:
+        return None, {'status_description': 'invalid_json'}
+    if not isinstance(item, dict):
+        return None, {'status_description': 'invalid_event'}
+
+    missing = [f for f in REQUIRED_FIELDS if f not in item]
+    if missing:
+        return None, {
+            'status_description': 'missing_required_fields',
+            'missing_fields': missing,
+        }
+
+    invalid = []
+    for field, check in _FIELD_CHECKS.items():
+        if field not in item:
+            continue
+        try:
+            item[field] = check(item[field])
+        except (TypeError, ValueError, OverflowError):
+            invalid.append(field)
+    if invalid:
+        return None, {
+            'status_description': 'invalid_field_values',
+            'invalid_fields': invalid,
+        }
+
+    return item, None
+
+def bulk_save_events(event_kwargs_list):
+    """
+    Writes a list of event kwargs with a single multi-row INSERT and stages
+    them for the agent/path rollups in the same transaction.
+    bulk_create skips BackendEvent.save(), so event_date and the path
+    template (events/paths.py) are filled in here.
+    Returns the created event objects in input order.
+    Payload columns go to BackendEventPayload, for events that have any,
+    packed per EVENT_PAYLOAD_CODEC. Once committed, the events are published
+    to live tails (events/live_tail.py).
+    """
+    events = []
+    payloads = []
+    path_ids = resolve_path_ids((kwargs['project_id'], kwargs['path']) for kwargs in event_kwargs_list)
+    for event_kwargs in event_kwargs_list:
+        event_kwargs = dict(event_kwargs)
+        payload = {field: event_kwargs.pop(field, None) for field in PAYLOAD_FIELDS}
+        event = BackendEvent(**event_kwargs)
+        event.event_date = event.event_time.date()
+        event.path_template_id = path_ids[(event.project_id, event.path)]
+        events.append(event)
+        if any(value is not None for value in payload.values()):
+            payloads.append(build_payload(event, payload))
+    with transaction.atomic():
+        created = BackendEvent.objects.bulk_create(events)
+        BackendEventPayload.objects.bulk_create(payloads)
+        rollup_events(created)
+        written = {(event.agent_id, event.event_date) for event in created}
+        transaction.on_commit(lambda: bump_ingest_watermarks(written))
+        transaction.on_commit(lambda: publish_events(created, _live_tail_event))
+    return created
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
 
 
+def _str_or_none(value):
+    return str(value) if value else None
+
+
+def _payload_field(name):
+    def read(ev):
+        payload = getattr(ev, 'payload', None)
+        return payload_values(payload)[name] if payload else None
+    return read
+
+
+# Serialized field -> how to read it off a BackendEvent. The keys double as
+# the vocabulary of `fields=` projections and the column order of exports.
+EVENT_FIELDS = {
+    "event_id": lambda ev: str(ev.event_id),
+    "event_time": lambda ev: ev.event_time.isoformat(),
+    "event_date": lambda ev: _isoformat(ev.event_date),
+    "project_id": lambda ev: str(ev.project_id),
+    "agent_id": lambda ev: _str_or_none(ev.agent_id),
+    "agent_session_id": lambda ev: _str_or_none(ev.agent_session_id),
+    "path": lambda ev: ev.path,
+    "method": lambda ev: ev.method,
+    "status_code": lambda ev: ev.status_code,
+    "latency_ms": lambda ev: ev.latency_ms,
+    "request_size_bytes": lambda ev: ev.request_size_bytes,
+    "response_size_bytes": lambda ev: ev.response_size_bytes,
+    "request_headers": _payload_field("request_headers"),
+    "request_body": _payload_field("request_body"),
+    "query_params": _payload_field("query_params"),
+    "post_data": _payload_field("post_data"),
+    "response_headers": _payload_field("response_headers"),
+    "response_body": _payload_field("response_body"),
+    "request_content_type": lambda ev: ev.request_content_type,
+    "response_content_type": lambda ev: ev.response_content_type,
+    "custom_properties": lambda ev: ev.custom_properties,
+    "error": lambda ev: ev.error,
+    "metadata": lambda ev: ev.metadata,
+    "created_at": lambda ev: ev.created_at.isoformat(),
+}
+
+
+def payload_prefetch(start=None, end=None):
+    """
+    Prefetch of event.payload, limited to the payload partitions of the
+    inclusive event_date range [start, end] when given.
+    """
+    payloads = BackendEventPayload.objects.all()
+    if start:
+        payloads = payloads.filter(event_date__gte=start)
+    if end:
+        payloads = payloads.filter(event_date__lte=end)
+    return Prefetch('payload', queryset=payloads)
+
+
+def load_payloads(events):
+    """
+    Loads the payload of every event in one query. The events need
+    event_date loaded.
+    """
+    if events:
+        dates = [ev.event_date for ev in events]
+        prefetch_related_objects(events, payload_prefetch(min(dates), max(dates)))
+    return events
+
+
+# Fields sent to live tails (events/live_tail.py); payloads are left out.
+LIVE_TAIL_FIELDS = [field for field in EVENT_FIELDS if field not in PAYLOAD_FIELDS]
+
+
+def _live_tail_event(ev):
+    return serialize_backend_event(ev, LIVE_TAIL_FIELDS)
+
+
+def serialize_backend_event(ev: BackendEvent, fields=None) -> dict:
+    """
+    Serializes ev, limited to `fields` when given. Only pass fields that
+    were loaded, otherwise each deferred one costs an extra query; payload
+    fields need event.payload prefetched (load_payloads, payload_prefetch).
+    """
+    return {field: EVENT_FIELDS[field](ev) for field in (fields or EVENT_FIELDS)}
+
+
+_EVENT_CURSOR_SALT = 'events.cursor'
+
+
+def encode_event_cursor(event):
+    """
+    Opaque continuation token for the (event_time, event_id) position of event.
+    """
+    return signing.dumps(
+        {'t': event.event_time.isoformat(), 'id': str(event.event_id)},
+        salt=_EVENT_CURSOR_SALT,
+    )
+
+
+def parse_date_range(params, required=True):
+    """
+    Returns (start, end) dates from the start_date/end_date query params
+    (YYYY-MM-DD, inclusive). With required=False a missing bound is None.
+    Raises ValueError carrying the 400 status_description on bad input.
+    """
+    start_date = params.get("start_date")
+    end_date = params.get("end_date")
+    if required and (not start_date or not end_date):
+        raise ValueError("start_date and end_date are required")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise ValueError("dates must be in YYYY-MM-DD format")
+    if start and end and start > end:
+        raise ValueError("start_date must be before or equal to end_date")
+    return start, end
+
+
+def decode_event_cursor(token):
+    """
+    Returns (event_time, event_id) from a token made by encode_event_cursor.
+    Raises ValueError for tokens that were tampered with or are malformed.
+    """
+    try:
+        position = signing.loads(token, salt=_EVENT_CURSOR_SALT)
+        event_time = parse_datetime(position['t'])
+        event_id = uuid.UUID(position['id'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError('invalid_cursor')
+    if event_time is None:
+        raise ValueError('invalid_cursor')
+    return event_time, event_id
+
+
+def after_event_cursor(qs, event_time, event_id):
+    """
+    Keyset filter for rows strictly after (event_time, event_id) in
+    (event_time, event_id) order. The plain event_time >= bound lets Postgres
+    start the index range scan at the cursor instead of filtering from the top.
+    """
+    return qs.filter(event_time__gte=event_time).filter(
+        Q(event_time__gt=event_time) | Q(event_id__gt=event_id)
+    )
 
 class Percentile(Aggregate):
     function = "PERCENTILE_CONT"
@@ -121,4 +588,14 @@ class Percentile(Aggregate):
     template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
 
     def __init__(self, expression, percentile, **extra):
-        super().__init__(expression, percentile=percentile, **extra)
\ No newline at end of file
+        super().__init__(expression, percentile=percentile, **extra)
+
+
+class SketchMerge(Aggregate):
+    """
+    Merges rollup latency_sketch columns with the ddsketch_merge_agg()
+    aggregate from migration 0004. Returns the merged DDSketch bins.
+    """
+    function = "ddsketch_merge_agg"
+    name = "SketchMerge"
+    output_field = JSONField() # type: ignore
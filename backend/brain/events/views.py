@@ -1,35 +1,172 @@
 import json
 import logging
 import uuid
-from django.http import JsonResponse
+from types import SimpleNamespace
+from redis import RedisError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from datetime import datetime
-from django.db.models import Count
-
-from decorators import agent_user_auth_required
-from .models import BackendEvent
-from .utils import validate_agent_session_token, verify_sdk_key, build_event_and_save, validate_agent_key, build_agent_event_and_save, Percentile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db.models import Max, Min, Sum
+
+from decorators import agent_user_auth_required, internal_token_required
+from decorators import AUTH_GENERATION_KINDS, invalidate_agent_user_auth
+from uasam_client import uasam_client
+from .models import BackendEvent, AgentPathDailyRollup, SessionSummary, PAYLOAD_FIELDS
+from .utils import validate_agent_session_token, averify_sdk_key, avalidate_agent_key, Percentile
+from .utils import EVENT_BATCH_MAX_SIZE, parse_event_batch, validate_event_item, build_event_kwargs
+from .utils import LATENCY_EXACT_MAX_EVENTS, SketchMerge
+from .utils import encode_event_cursor, decode_event_cursor, after_event_cursor, parse_date_range
+from .utils import EVENT_FIELDS, LIVE_TAIL_FIELDS, serialize_backend_event, load_payloads, canonical_uuid
+from .sketch import DDSketch
+from .buffer import save_or_enqueue_events, get_buffer_metrics
+from .ingest import REQUIRED_FIELDS, OPTIONAL_FIELDS, capture_sdk_event, capture_agent_event
+from .export import EXPORT_FORMATS, export_queryset, resolve_fields, stream_events
+from .paths import path_labels
+from .buckets import BucketError, bucket_range, bucket_counts, bucket_percentiles
+from .response_cache import cached_analytics_response
+from .blocking import run_blocking, iterate_blocking
+from . import live_tail
 
 logger = logging.getLogger(__name__)
 
-REQUIRED_FIELDS = ['project_id', 'path', 'method', 'status_code', 'latency_ms']
 
-OPTIONAL_FIELDS = [
-    'request_size_bytes', 'response_size_bytes',
-    'request_headers', 'request_body', 'query_params', 'post_data',
-    'response_headers', 'response_body',
-    'request_content_type', 'response_content_type',
-    'custom_properties', 'error', 'metadata',
-]
+@method_decorator(csrf_exempt, name='dispatch')
+class BackendEventCaptureView(View):
+    """
+    POST /api/v1/backend/log/sdk/
+    Headers: X-OTAS-SDK-KEY, X-OTAS-AGENT-SESSION-TOKEN
+
+    Normally served by the bare ASGI ingest app (events/fast_ingest.py),
+    which runs the same capture_sdk_event without the middleware stack.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        status, data = await capture_sdk_event(
+            request.headers.get('X-OTAS-SDK-KEY'),
+            request.headers.get('X-OTAS-AGENT-SESSION-TOKEN'),
+            request.body,
+        )
+        return JsonResponse(data, status=status)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class BackendEventCaptureView(View):
+class AgentEventCaptureView(View):
+    """
+    OTAS-37: Agent Log API endpoint.
+    Agents use this endpoint to send logs/events directly with agent key authentication.
+    
+    POST /api/v1/backend/log/agent/
+    Headers: X-OTAS-AGENT-KEY, X-OTAS-AGENT-SESSION-TOKEN
+
+    Normally served by the bare ASGI ingest app (events/fast_ingest.py),
+    which runs the same capture_agent_event without the middleware stack.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        status, data = await capture_agent_event(
+            request.headers.get('X-OTAS-AGENT-KEY'),
+            request.headers.get('X-OTAS-AGENT-SESSION-TOKEN'),
+            request.body,
+        )
+        return JsonResponse(data, status=status)
+
 
-    def post(self, request, *args, **kwargs):
+async def _capture_event_batch(request, *, project_id, agent_id, agent_session_id):
+    """
+    Shared body of the batch capture views, run after authentication.
+    Validates every item, writes the valid ones with one multi-row INSERT (or
+    queues them in buffered ingest mode) and reports a per-item accept/reject
+    result in input order.
+    """
+    try:
+        items = parse_event_batch(request.body, request.content_type)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 0,
+            'status_description': str(e),
+        }, status=400)
+
+    if not items:
+        return JsonResponse({
+            'status': 0,
+            'status_description': 'empty_batch',
+        }, status=400)
+
+    if len(items) > EVENT_BATCH_MAX_SIZE:
+        return JsonResponse({
+            'status': 0,
+            'status_description': 'batch_too_large',
+            'max_batch_size': EVENT_BATCH_MAX_SIZE,
+        }, status=413)
+
+    results = []
+    accepted_kwargs = []
+    accepted_results = []
+    for index, item in enumerate(items):
+        body, rejection = validate_event_item(item, REQUIRED_FIELDS)
+        if rejection:
+            results.append({'index': index, 'status': 'rejected', **rejection})
+            continue
+        accepted_kwargs.append(build_event_kwargs(
+            body,
+            OPTIONAL_FIELDS,
+            project_id=project_id,
+            agent_id=agent_id,
+            agent_session_id=agent_session_id,
+        ))
+        result = {'index': index, 'status': 'accepted'}
+        accepted_results.append(result)
+        results.append(result)
+
+    if not accepted_kwargs:
+        return JsonResponse({
+            'status': 0,
+            'status_description': 'no_valid_events',
+            'response': {
+                'accepted': 0,
+                'rejected': len(items),
+                'results': results,
+            },
+        }, status=400)
+
+    try:
+        event_ids, queued = await run_blocking(save_or_enqueue_events, accepted_kwargs)
+    except Exception:
+        logger.exception('Batch event capture failed')
+        return JsonResponse({
+            'status': 0,
+            'status_description': 'event_capture_failed',
+        }, status=500)
+    for result, event_id in zip(accepted_results, event_ids):
+        result['event_id'] = str(event_id)
+
+    return JsonResponse({
+        'status': 1,
+        'status_description': 'events_queued' if queued else 'events_captured',
+        'response': {
+            'accepted': len(accepted_kwargs),
+            'rejected': len(items) - len(accepted_kwargs),
+            'results': results,
+        },
+    }, status=202 if queued else 201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BackendEventBatchCaptureView(View):
+    """
+    Batch variant of BackendEventCaptureView.
+    Authenticates once per request and captures many events in one INSERT.
 
+    POST /api/v1/backend/log/sdk/batch/
+    Headers: X-OTAS-SDK-KEY, X-OTAS-AGENT-SESSION-TOKEN
+    Body: JSON array of events, {"events": [...]}, or NDJSON
+          (Content-Type: application/x-ndjson), at most EVENT_BATCH_MAX_SIZE items.
+    """
+
+    async def post(self, request, *args, **kwargs):
         sdk_key = request.headers.get('X-OTAS-SDK-KEY')
         if not sdk_key:
             return JsonResponse({
@@ -37,7 +174,7 @@ class BackendEventCaptureView(View):
                 'status_description': 'missing_sdk_key',
             }, status=401)
 
-        project_info = verify_sdk_key(sdk_key)
+        project_info = await averify_sdk_key(sdk_key)
         if not project_info:
             return JsonResponse({
                 'status': 0,
@@ -58,49 +195,27 @@ class BackendEventCaptureView(View):
                 'status_description': 'invalid_or_expired_token',
             }, status=401)
 
-        try:
-            body = json.loads(request.body or '{}')
-        except json.JSONDecodeError:
-            return JsonResponse({
-                'status': 0,
-                'status_description': 'invalid_json',
-            }, status=400)
-
-        missing = [f for f in REQUIRED_FIELDS if f not in body]
-        if missing:
-            return JsonResponse({
-                'status': 0,
-                'status_description': 'missing_required_fields',
-                'missing_fields': missing,
-            }, status=400)
-
-        try:
-            build_event_and_save(token_data, project_info, body, OPTIONAL_FIELDS)
-            return JsonResponse({
-                'status': 1,
-                'status_description': 'event_captured',
-                'response': {
-                },
-            }, status=201)
-        except Exception as e:
-            logger.exception('Event capture failed')
-            return JsonResponse({
-                'status': 0,
-                'status_description': 'event_capture_failed',
-            }, status=500)
+        return await _capture_event_batch(
+            request,
+            project_id=project_info['id'],
+            agent_id=token_data['agent_id'],
+            agent_session_id=token_data['agent_session_id'],
+        )
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class AgentEventCaptureView(View):
+class AgentEventBatchCaptureView(View):
     """
-    OTAS-37: Agent Log API endpoint.
-    Agents use this endpoint to send logs/events directly with agent key authentication.
-    
-    POST /api/v1/backend/log/agent/
+    Batch variant of AgentEventCaptureView.
+    Authenticates once per request and captures many events in one INSERT.
+
+    POST /api/v1/backend/log/agent/batch/
     Headers: X-OTAS-AGENT-KEY, X-OTAS-AGENT-SESSION-TOKEN
+    Body: JSON array of events, {"events": [...]}, or NDJSON
+          (Content-Type: application/x-ndjson), at most EVENT_BATCH_MAX_SIZE items.
     """
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         agent_key = request.headers.get('X-OTAS-AGENT-KEY')
         if not agent_key:
             return JsonResponse({
@@ -108,7 +223,7 @@ class AgentEventCaptureView(View):
                 'status_description': 'missing_agent_key',
             }, status=401)
 
-        auth_data = validate_agent_key(agent_key)
+        auth_data = await avalidate_agent_key(agent_key)
         if not auth_data:
             return JsonResponse({
                 'status': 0,
@@ -135,42 +250,146 @@ class AgentEventCaptureView(View):
                 'status_description': 'session_agent_mismatch',
             }, status=403)
 
+        return await _capture_event_batch(
+            request,
+            project_id=auth_data['project_id'],
+            agent_id=auth_data['agent_id'],
+            agent_session_id=token_data['agent_session_id'],
+        )
+
+
+@method_decorator(internal_token_required, name='dispatch')
+class IngestBufferMetricsView(View):
+    """
+    GET /api/v1/ingest/metrics/
+
+    Reports the state of the buffered ingest pipeline: queue depth, events
+    claimed by running flushes, age of the oldest queued event, dead-letter
+    depth and stats from the last flush. Needs X-OTAS-INTERNAL-TOKEN.
+    """
+
+    def get(self, request):
         try:
-            body = json.loads(request.body or '{}')
-        except json.JSONDecodeError:
             return JsonResponse({
-                'status': 0,
-                'status_description': 'invalid_json',
-            }, status=400)
-
-        missing = [f for f in REQUIRED_FIELDS if f not in body]
-        if missing:
+                'status': 1,
+                'status_description': 'ingest_metrics',
+                'response': get_buffer_metrics(),
+            }, status=200)
+        except Exception:
+            logger.exception('IngestBufferMetricsView failed')
             return JsonResponse({
                 'status': 0,
-                'status_description': 'missing_required_fields',
-                'missing_fields': missing,
-            }, status=400)
+                'status_description': 'ingest_buffer_unavailable',
+            }, status=503)
+
+
+@method_decorator(internal_token_required, name='dispatch')
+class UasamClientMetricsView(View):
+    """
+    GET /api/v1/uasam/metrics/
+
+    Reports request/failure/retry counters, call latency percentiles,
+    circuit breaker state and connection pool usage of the UASAM client.
+    Needs X-OTAS-INTERNAL-TOKEN.
+    """
+
+    def get(self, request):
+        return JsonResponse({
+            'status': 1,
+            'status_description': 'uasam_client_metrics',
+            'response': uasam_client.get_metrics(),
+        }, status=200)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(internal_token_required, name='dispatch')
+class AgentUserAuthInvalidateView(View):
+    """
+    POST /api/v1/internal/auth-cache/invalidate/
+
+    Called by UASAM when a project membership, project or agent changes.
+    Drops the cached dashboard authorization (decorators.py) of every listed
+    user, project and agent in all brain processes. Needs
+    X-OTAS-INTERNAL-TOKEN.
+
+    Body: {"user_ids": [...], "project_ids": [...], "agent_ids": [...]},
+    every list optional.
+
+    Error Responses:
+        400 - invalid_json              : body is not a JSON object of string lists.
+        503 - auth_cache_unavailable    : the shared cache could not be updated.
+    """
 
+    def post(self, request):
         try:
-            event = build_agent_event_and_save(
-                auth_data,
-                body,
-                OPTIONAL_FIELDS,
-                agent_session_id=token_data['agent_session_id'],
-            )
-            return JsonResponse({
-                'status': 1,
-                'status_description': 'event_captured',
-                'response': {
-                    'event_id': str(event.event_id),
-                },
-            }, status=201)
-        except Exception as e:
-            logger.exception('Agent log capture failed')
+            body = json.loads(request.body or '{}')
+            ids = {f'{kind}_ids': body.get(f'{kind}_ids', []) for kind in AUTH_GENERATION_KINDS}
+        except (json.JSONDecodeError, AttributeError):
+            ids = None
+        if ids is None or not all(
+            isinstance(values, list) and all(isinstance(value, str) for value in values)
+            for values in ids.values()
+        ):
+            return JsonResponse({'status': 0, 'status_description': 'invalid_json'}, status=400)
+        try:
+            invalidate_agent_user_auth(**ids)
+        except Exception:
+            logger.exception('AgentUserAuthInvalidateView failed')
             return JsonResponse({
                 'status': 0,
-                'status_description': 'event_capture_failed',
-            }, status=500)
+                'status_description': 'auth_cache_unavailable',
+            }, status=503)
+        return JsonResponse({'status': 1, 'status_description': 'auth_cache_invalidated'}, status=200)
+
+
+def _bucket_window(request, start, end):
+    """
+    Resolves `bucket=` plus the optional start_time/end_time narrowing of
+    start_date..end_date into (bucket, aligned start, aligned end).
+    Raises BucketError with a client-facing message.
+    """
+    bucket = request.GET.get("bucket")
+    window_start = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+    window_end = datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    for name in ("start_time", "end_time"):
+        raw = request.GET.get(name)
+        if not raw:
+            continue
+        try:
+            value = parse_datetime(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise BucketError(f"{name} must be an ISO 8601 datetime")
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=dt_timezone.utc)
+        if name == "start_time":
+            window_start = max(window_start, value)
+        else:
+            window_end = min(window_end, value)
+    if window_start >= window_end:
+        raise BucketError("start_time must be before end_time")
+    aligned_start, aligned_end, _ = bucket_range(bucket, window_start, window_end)
+    return bucket, aligned_start, aligned_end
+
+
+def _sum_by_path_label(rows, id_key, key, count_key):
+    """
+    Sums rows[count_key] per reported path template and rows[key], for rows
+    grouped by path_id (rows[id_key]); automatic templates that were merged
+    into another one count towards it. Returns [(path_id, template,
+    {key: count})] ordered by template, keys in row order.
+    """
+    rows = list(rows)
+    labels = path_labels(row[id_key] for row in rows)
+    series = {}
+    for row in rows:
+        counts = series.setdefault(labels[row[id_key]], {})
+        counts[row[key]] = counts.get(row[key], 0) + row[count_key]
+    return [
+        (path_id, template, counts)
+        for (path_id, template), counts in sorted(series.items(), key=lambda item: item[0][1])
+    ]
 
 
 @method_decorator(agent_user_auth_required, name="dispatch")
@@ -178,7 +397,7 @@ class AgentPathTimeseriesView(View):
     """
     GET /api/v1/agent/path-timeseries/
 
-    Returns a time-series breakdown of event counts grouped by path for a
+    Returns a time-series breakdown of event counts grouped by path template for a
     specific agent over a given date range. Intended for rendering line graphs
     showing traffic per endpoint over time.
 
@@ -191,6 +410,14 @@ class AgentPathTimeseriesView(View):
     Query Parameters:
         start_date (str): Start of the date range in YYYY-MM-DD format (inclusive).
         end_date   (str): End of the date range in YYYY-MM-DD format (inclusive).
+        bucket     (str): Optional. One of minute, 5m, hour, day, week. Returns a
+                          dense series with one entry per bucket (empty buckets
+                          as zeros), keyed "bucket" (ISO 8601 start, UTC).
+                          Buckets are aligned, so edge buckets are whole; week
+                          buckets start on Monday. At most ANALYTICS_MAX_BUCKETS,
+                          and at most ANALYTICS_MAX_PATH_BUCKETS over all paths.
+        start_time (str): Optional with bucket, ISO 8601 datetime narrowing the range.
+        end_time   (str): Optional with bucket, ISO 8601 datetime narrowing the range.
 
     Success Response (200):
         {
@@ -199,7 +426,8 @@ class AgentPathTimeseriesView(View):
             "project_id": "<project_uuid>",
             "paths": [
                 {
-                    "path": "/example/api/",
+                    "path": "/example/api/{id}",
+                    "path_id": 42,
                     "data": [
                         { "date": "2026-03-01", "count": 10 },
                         { "date": "2026-03-02", "count": 7 }
@@ -209,14 +437,18 @@ class AgentPathTimeseriesView(View):
         }
 
         Notes:
-            - Only dates that have at least one event are included (no zero-fill).
-            - Paths are ordered alphabetically.
+            - Without bucket, only dates that have at least one event are
+              included (no zero-fill).
+            - Paths are path templates (events/paths.py), e.g. /users/{id},
+              ordered alphabetically; path_id identifies the template.
             - Dates within each path are ordered ascending.
+            - Counts come from agent_path_daily_rollup, not raw events.
 
     Error Responses:
         400 - missing_dates        : start_date or end_date not provided.
         400 - invalid_date_format  : Dates are not in YYYY-MM-DD format.
         400 - invalid_date_range   : start_date is after end_date.
+        400 - invalid_bucket       : Unknown bucket, bad start/end_time or too many buckets.
         401 - missing_user_token   : X-OTAS-USER-TOKEN header is absent.
         400 - missing_agent_id     : X-OTAS-AGENT-ID header is absent.
         400 - missing_project_id   : X-OTAS-PROJECT-ID header is absent.
@@ -227,57 +459,68 @@ class AgentPathTimeseriesView(View):
         500 - server_error         : Unexpected internal error.
     """
 
-    def get(self, request):
+    @cached_analytics_response
+    async def get(self, request):
+        return await run_blocking(self._get, request)
+
+    def _get(self, request):
         try:
             agent_id = request.auth_agent_id
-            start_date = request.GET.get("start_date")
-            end_date = request.GET.get("end_date")
-
-            if not start_date or not end_date:
-                return JsonResponse(
-                    {"status": 0, "status_description": "start_date and end_date are required"},
-                    status=400,
-                )
-
             try:
-                start = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end = datetime.strptime(end_date, "%Y-%m-%d").date()
-            except ValueError:
+                start, end = parse_date_range(request.GET)
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+            if request.GET.get("bucket"):
+                try:
+                    bucket, window_start, window_end = _bucket_window(request, start, end)
+                    rows = bucket_counts(agent_id, bucket, window_start, window_end, group_by_path=True)
+                except BucketError as exc:
+                    return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+                series = _sum_by_path_label(rows, "path_id", "bucket", "request_count")
                 return JsonResponse(
-                    {"status": 0, "status_description": "dates must be in YYYY-MM-DD format"},
-                    status=400,
-                )
-
-            if start > end:
-                return JsonResponse(
-                    {"status": 0, "status_description": "start_date must be before or equal to end_date"},
-                    status=400,
+                    {
+                        "status": 1,
+                        "agent_id": agent_id,
+                        "project_id": request.auth_project_id,
+                        "bucket": bucket,
+                        "paths": [
+                            {
+                                "path": template,
+                                "path_id": path_id,
+                                "data": [
+                                    {"bucket": bucket_start.isoformat(), "count": count}
+                                    for bucket_start, count in counts.items()
+                                ],
+                            }
+                            for path_id, template, counts in series
+                        ],
+                    },
+                    status=200,
                 )
 
             qs = (
-                BackendEvent.objects.filter(
+                AgentPathDailyRollup.objects.filter(
                     agent_id=agent_id,
                     event_date__gte=start,
                     event_date__lte=end,
                 )
-                .values("path", "event_date")
-                .annotate(count=Count("event_id"))
-                .order_by("path", "event_date")
+                .values("path_template", "event_date")
+                .annotate(count=Sum("request_count"))
+                .order_by("path_template", "event_date")
             )
 
-            path_map = {}
-            for row in qs:
-                path = row["path"]
-                if path not in path_map:
-                    path_map[path] = []
-                path_map[path].append({
-                    "date": row["event_date"].isoformat(),
-                    "count": row["count"],
-                })
-
             result = [
-                {"path": path, "data": data}
-                for path, data in path_map.items()
+                {
+                    "path": template,
+                    "path_id": path_id,
+                    "data": [
+                        {"date": event_date.isoformat(), "count": count}
+                        for event_date, count in counts.items()
+                    ],
+                }
+                for path_id, template, counts in _sum_by_path_label(qs, "path_template", "event_date", "count")
             ]
 
             return JsonResponse(
@@ -295,68 +538,71 @@ class AgentPathTimeseriesView(View):
             return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
 
 
-def _serialize_backend_event(ev: BackendEvent) -> dict:
-    return {
-        "event_id": str(ev.event_id),
-        "event_time": ev.event_time.isoformat(),
-        "event_date": ev.event_date.isoformat() if ev.event_date else None,
-        "project_id": ev.project_id,
-        "agent_id": ev.agent_id,
-        "agent_session_id": ev.agent_session_id,
-        "path": ev.path,
-        "method": ev.method,
-        "status_code": ev.status_code,
-        "latency_ms": ev.latency_ms,
-        "request_size_bytes": ev.request_size_bytes,
-        "response_size_bytes": ev.response_size_bytes,
-        "request_headers": ev.request_headers,
-        "request_body": ev.request_body,
-        "query_params": ev.query_params,
-        "post_data": ev.post_data,
-        "response_headers": ev.response_headers,
-        "response_body": ev.response_body,
-        "request_content_type": ev.request_content_type,
-        "response_content_type": ev.response_content_type,
-        "custom_properties": ev.custom_properties,
-        "error": ev.error,
-        "metadata": ev.metadata,
-        "created_at": ev.created_at.isoformat(),
-    }
-
-
 @method_decorator(agent_user_auth_required, name="dispatch")
 class AgentSessionEventsView(View):
     """
     GET /api/v1/agent/session/events/
 
-    Lists BackendEvent rows for one agent session, ordered by event_time.
+    Lists BackendEvent rows for one agent session, ordered by
+    (event_time, event_id), one keyset page at a time.
 
     Headers (via agent_user_auth_required):
         X-OTAS-USER-TOKEN, X-OTAS-AGENT-ID, X-OTAS-PROJECT-ID
 
     Query:
         session_id (UUID, required) — UASAM AgentSession.id / JWT agent_session_id
-        limit (optional, default 200, max 500) — max rows returned
+        path (optional) — only events whose raw path starts with this
+        min_status (optional, int) — only events with status_code >= min_status
+        limit (optional, default 200, max 500) — max rows per page
+        cursor (optional) — next_cursor from the previous page
+        fields (optional) — comma-separated event fields to return, e.g.
+            "path,method,status_code,latency_ms". Only those columns are read
+            from the database; event_id and event_time are always included.
+            Default: every field except the payload ones (request_headers,
+            request_body, query_params, post_data, response_headers,
+            response_body).
+        include_payload (optional, "true") — with the default fields, also
+            return the payload fields. Payloads live in backend_event_payload
+            and are only read when asked for, with one query per page.
+
+    Response adds:
+        next_cursor — pass as cursor= to fetch the next page; null on the last page
     """
 
     _DEFAULT_LIMIT = 200
     _MAX_LIMIT = 500
+    _session_required = True
+    _listed = "session_events_listed"
 
-    def get(self, request):
+    async def get(self, request):
+        return await run_blocking(self._get, request)
+
+    def _get(self, request):
         try:
             session_id = request.GET.get("session_id")
-            if not session_id:
+            if not session_id and self._session_required:
                 return JsonResponse(
                     {"status": 0, "status_description": "session_id is required"},
                     status=400,
                 )
-            try:
-                uuid.UUID(session_id)
-            except ValueError:
-                return JsonResponse(
-                    {"status": 0, "status_description": "session_id must be a valid UUID"},
-                    status=400,
-                )
+            if session_id:
+                try:
+                    uuid.UUID(session_id)
+                except ValueError:
+                    return JsonResponse(
+                        {"status": 0, "status_description": "session_id must be a valid UUID"},
+                        status=400,
+                    )
+
+            min_status = request.GET.get("min_status")
+            if min_status:
+                try:
+                    min_status = int(min_status)
+                except ValueError:
+                    return JsonResponse(
+                        {"status": 0, "status_description": "min_status must be an integer"},
+                        status=400,
+                    )
 
             raw_limit = request.GET.get("limit", str(self._DEFAULT_LIMIT))
             try:
@@ -368,49 +614,549 @@ class AgentSessionEventsView(View):
                 )
             limit = max(1, min(limit, self._MAX_LIMIT))
 
+            fields = None
+            raw_fields = request.GET.get("fields")
+            include_payload = request.GET.get("include_payload", "").lower() in ("1", "true")
+            if raw_fields:
+                requested = [field.strip() for field in raw_fields.split(",") if field.strip()]
+                unknown = sorted(set(requested) - set(EVENT_FIELDS))
+                if unknown:
+                    return JsonResponse(
+                        {"status": 0, "status_description": "unknown fields: " + ", ".join(unknown)},
+                        status=400,
+                    )
+                fields = ["event_id", "event_time"] + [
+                    field for field in dict.fromkeys(requested) if field not in ("event_id", "event_time")
+                ]
+            else:
+                fields = [field for field in EVENT_FIELDS if include_payload or field not in PAYLOAD_FIELDS]
+            payload_fields = [field for field in fields if field in PAYLOAD_FIELDS]
+            columns = [field for field in fields if field not in PAYLOAD_FIELDS]
+            if payload_fields and "event_date" not in columns:
+                columns.append("event_date")  # load_payloads prunes on it
+
+            cursor = request.GET.get("cursor")
+            if cursor:
+                try:
+                    cursor_time, cursor_id = decode_event_cursor(cursor)
+                except ValueError:
+                    return JsonResponse(
+                        {"status": 0, "status_description": "invalid_cursor"},
+                        status=400,
+                    )
+
             agent_id = str(request.auth_agent_id)
             project_id = str(request.auth_project_id)
 
-            qs = (
-                BackendEvent.objects.filter(
-                    agent_id=agent_id,
-                    project_id=project_id,
-                    agent_session_id=session_id,
-                )
-                .order_by("event_time", "event_id")
-                [:limit]
+            qs = BackendEvent.objects.filter(
+                agent_id=agent_id,
+                project_id=project_id,
             )
+            if session_id:
+                qs = qs.filter(agent_session_id=session_id)
+            if request.GET.get("path"):
+                qs = qs.filter(path__startswith=request.GET["path"])
+            if min_status:
+                qs = qs.filter(status_code__gte=min_status)
+            if cursor:
+                # The date bound prunes partitions before the cursor.
+                qs = after_event_cursor(
+                    qs.filter(event_date__gte=cursor_time.astimezone(dt_timezone.utc).date()),
+                    cursor_time,
+                    cursor_id,
+                )
+            qs = qs.only(*columns)
 
-            events = [_serialize_backend_event(ev) for ev in qs]
+            # One extra row tells whether another page exists.
+            page = list(qs.order_by("event_time", "event_id")[:limit + 1])
+            next_cursor = encode_event_cursor(page[limit - 1]) if len(page) > limit else None
+            if payload_fields:
+                load_payloads(page[:limit])
+            events = [serialize_backend_event(ev, fields) for ev in page[:limit]]
 
             return JsonResponse(
                 {
                     "status": 1,
-                    "status_description": "session_events_listed",
+                    "status_description": self._listed,
                     "agent_id": agent_id,
                     "project_id": project_id,
                     "session_id": session_id,
                     "count": len(events),
                     "events": events,
+                    "next_cursor": next_cursor,
                 },
                 status=200,
             )
         except Exception:
-            logger.exception("AgentSessionEventsView failed")
+            logger.exception("%s failed", type(self).__name__)
             return JsonResponse(
                 {"status": 0, "status_description": "server_error"},
                 status=500,
             )
-            
+
+
+# dispatch, and with it agent_user_auth_required, comes from AgentSessionEventsView.
+class AgentEventsView(AgentSessionEventsView):
+    """
+    GET /api/v1/agent/events/
+
+    Lists the agent's BackendEvent rows across all of its sessions, ordered
+    by (event_time, event_id), one keyset page at a time: the backfill for a
+    live tail "gap" frame, whose cursor it accepts.
+
+    Headers (via agent_user_auth_required):
+        X-OTAS-USER-TOKEN, X-OTAS-AGENT-ID, X-OTAS-PROJECT-ID
+
+    Query:
+        As for /api/v1/agent/session/events/, except that session_id is
+        optional. Pass the tail's session_id, path and min_status to
+        backfill a filtered tail.
+
+    Response:
+        As for /api/v1/agent/session/events/, with status_description
+        "agent_events_listed".
+    """
+
+    _session_required = False
+    _listed = "agent_events_listed"
+
+
+def _serialize_session_summary(summary):
+    duration = summary.last_event_time - summary.first_event_time
+    return {
+        "session_id": str(summary.agent_session_id),
+        "first_event_time": summary.first_event_time.isoformat(),
+        "last_event_time": summary.last_event_time.isoformat(),
+        "duration_ms": round(duration.total_seconds() * 1000, 1),
+        "request_count": summary.request_count,
+        "error_count": summary.error_count,
+        "latency_sum": round(summary.latency_sum, 1),
+        "latency_avg": round(summary.latency_sum / summary.request_count, 1) if summary.request_count else None,
+        "latency_max": round(summary.latency_max, 1),
+        "request_bytes": summary.request_bytes,
+        "response_bytes": summary.response_bytes,
+    }
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(agent_user_auth_required, name="dispatch")
+class AgentSessionSummariesView(View):
+    """
+    GET or POST /api/v1/agent/session/summaries/
+
+    Returns the session_summary rows of many sessions of the agent in one
+    indexed lookup, e.g. for the stats columns of a session list.
+
+    Headers (via agent_user_auth_required):
+        X-OTAS-USER-TOKEN, X-OTAS-AGENT-ID, X-OTAS-PROJECT-ID
+
+    Request:
+        GET  — session_ids: comma-separated session UUIDs
+        POST — JSON body {"session_ids": ["<uuid>", ...]}, for long lists
+        At most 500 ids per call.
+
+    Success Response (200):
+        {
+            "status": 1,
+            "status_description": "session_summaries_listed",
+            "agent_id": "<agent_uuid>",
+            "project_id": "<project_uuid>",
+            "summaries": {
+                "<session_uuid>": {
+                    "session_id": "<session_uuid>",
+                    "first_event_time": "2026-03-26T10:00:00+00:00",
+                    "last_event_time": "2026-03-26T10:04:12.500000+00:00",
+                    "duration_ms": 252500.0,
+                    "request_count": 41, "error_count": 2,
+                    "latency_sum": 8112.4, "latency_avg": 197.9, "latency_max": 1204.0,
+                    "request_bytes": 20480, "response_bytes": 310211
+                },
+                ...
+            },
+            "missing": ["<session_uuid>", ...]
+        }
+        Sessions without events of this agent are listed in "missing".
+
+    Error Responses:
+        400 - session_ids is required
+        400 - session_ids must be valid UUIDs
+        400 - too_many_session_ids : more than 500 ids.
+        400 - invalid_json         : POST body is not a JSON object with a list.
+        500 - server_error         : Unexpected internal error.
+    """
+
+    _MAX_IDS = 500
+
+    async def get(self, request):
+        return await run_blocking(self._lookup, request, request.GET.get("session_ids", "").split(","))
+
+    async def post(self, request):
+        try:
+            body = json.loads(request.body or "{}")
+            session_ids = body.get("session_ids", [])
+        except (json.JSONDecodeError, AttributeError):
+            session_ids = None
+        if not isinstance(session_ids, list):
+            return JsonResponse({"status": 0, "status_description": "invalid_json"}, status=400)
+        return await run_blocking(self._lookup, request, session_ids)
+
+    def _lookup(self, request, raw_ids):
+        try:
+            if not all(isinstance(raw, str) for raw in raw_ids):
+                return JsonResponse(
+                    {"status": 0, "status_description": "session_ids must be valid UUIDs"},
+                    status=400,
+                )
+            requested = [raw.strip() for raw in raw_ids if raw.strip()]
+            if not requested:
+                return JsonResponse(
+                    {"status": 0, "status_description": "session_ids is required"},
+                    status=400,
+                )
+            if len(requested) > self._MAX_IDS:
+                return JsonResponse(
+                    {"status": 0, "status_description": "too_many_session_ids"},
+                    status=400,
+                )
+            session_ids = [canonical_uuid(raw) for raw in requested]
+            if None in session_ids:
+                return JsonResponse(
+                    {"status": 0, "status_description": "session_ids must be valid UUIDs"},
+                    status=400,
+                )
+            session_ids = list(dict.fromkeys(session_ids))
+
+            agent_id = str(request.auth_agent_id)
+            project_id = str(request.auth_project_id)
+
+            summaries = {
+                str(summary.agent_session_id): _serialize_session_summary(summary)
+                for summary in SessionSummary.objects.filter(
+                    agent_session_id__in=session_ids,
+                    agent_id=agent_id,
+                    project_id=project_id,
+                )
+            }
+
+            return JsonResponse(
+                {
+                    "status": 1,
+                    "status_description": "session_summaries_listed",
+                    "agent_id": agent_id,
+                    "project_id": project_id,
+                    "summaries": summaries,
+                    "missing": [session_id for session_id in session_ids if session_id not in summaries],
+                },
+                status=200,
+            )
+        except Exception:
+            logger.exception("AgentSessionSummariesView failed")
+            return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
+
+
+def _tail_cursor(item):
+    """
+    encode_event_cursor for a serialized event.
+    """
+    return encode_event_cursor(SimpleNamespace(
+        event_time=datetime.fromisoformat(item["event_time"]), event_id=item["event_id"],
+    ))
+
+
+def _gap_cursor(event_time):
+    """
+    Cursor just before every event at event_time (ISO 8601), from a live
+    tail gap marker.
+    """
+    return encode_event_cursor(SimpleNamespace(
+        event_time=datetime.fromisoformat(event_time), event_id=uuid.UUID(int=0),
+    ))
+
+
+@method_decorator(agent_user_auth_required, name="dispatch")
+class AgentEventTailView(View):
+    """
+    GET /api/v1/agent/events/tail/
+
+    Streams the agent's events as they are ingested, as Server-Sent Events
+    (text/event-stream), instead of polling the session events view. Fed by
+    Redis pub/sub, see events/live_tail.py. Read it with a streaming fetch()
+    or an SSE client that can send the auth headers.
+
+    Headers (via agent_user_auth_required):
+        X-OTAS-USER-TOKEN, X-OTAS-AGENT-ID, X-OTAS-PROJECT-ID
+        Last-Event-ID (optional) — resume after this event; SSE clients send
+            the id of the last frame they got when they reconnect.
+
+    Query:
+        session_id (optional, UUID) — only events of this agent session
+        path (optional) — only events whose raw path starts with this
+        min_status (optional, int) — only events with status_code >= min_status
+        fields (optional) — comma-separated event fields, as for session
+            events; payload fields are not streamed. event_id and event_time
+            are always included. Default: every non-payload field.
+        cursor (optional) — same as Last-Event-ID, for clients that cannot set
+            headers; a next_cursor from the session events view works too.
+
+    Stream:
+        "event" frames carry one event as JSON; their id is the resume
+        position. Without a resume position the stream starts with the next
+        ingested event. On resume, missed events are replayed from Postgres
+        first, at most the newest 500; if more were missed, a "gap" frame
+        ({"cursor": <resume position>}) comes first, and the skipped events
+        can be paged from /api/v1/agent/events/ with that cursor.
+        A "gap" frame also arrives mid-stream when events were not published
+        while Redis was unreachable; its cursor points just before the first
+        of them. Events paged from there may repeat ones already streamed;
+        skip them by event_id.
+        A ": keepalive" comment is sent every LIVE_TAIL_HEARTBEAT_SECONDS
+        without events. The stream ends after LIVE_TAIL_MAX_SECONDS; the
+        client reconnects and resumes. If Redis is unreachable the
+        stream sends one "error" frame and ends.
+
+    Error Responses:
+        400 - session_id must be a valid UUID
+        400 - min_status must be an integer
+        400 - unknown fields: ...
+        400 - invalid_cursor       : Last-Event-ID or cursor was not issued here.
+    """
+
+    _BACKLOG_LIMIT = 500
+    _RETRY_MS = 2000
+
+    async def get(self, request):
+        filters = {}
+        session_id = request.GET.get("session_id")
+        if session_id:
+            filters["agent_session_id"] = canonical_uuid(session_id)
+            if filters["agent_session_id"] is None:
+                return JsonResponse(
+                    {"status": 0, "status_description": "session_id must be a valid UUID"},
+                    status=400,
+                )
+        if request.GET.get("path"):
+            filters["path"] = request.GET["path"]
+        if request.GET.get("min_status"):
+            try:
+                filters["min_status"] = int(request.GET["min_status"])
+            except ValueError:
+                return JsonResponse(
+                    {"status": 0, "status_description": "min_status must be an integer"},
+                    status=400,
+                )
+
+        fields = LIVE_TAIL_FIELDS
+        raw_fields = request.GET.get("fields")
+        if raw_fields:
+            requested = [field.strip() for field in raw_fields.split(",") if field.strip()]
+            unknown = sorted(set(requested) - set(LIVE_TAIL_FIELDS))
+            if unknown:
+                return JsonResponse(
+                    {"status": 0, "status_description": "unknown fields: " + ", ".join(unknown)},
+                    status=400,
+                )
+            fields = ["event_id", "event_time"] + [
+                field for field in dict.fromkeys(requested) if field not in ("event_id", "event_time")
+            ]
+
+        resume = None
+        cursor = request.headers.get("Last-Event-ID") or request.GET.get("cursor")
+        if cursor:
+            try:
+                resume = decode_event_cursor(cursor)
+            except ValueError:
+                return JsonResponse({"status": 0, "status_description": "invalid_cursor"}, status=400)
+
+        response = StreamingHttpResponse(
+            self._stream(str(request.auth_agent_id), str(request.auth_project_id), filters, fields, cursor, resume),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @staticmethod
+    def _matches(item, project_id, filters):
+        return (
+            item["project_id"] == project_id
+            and item["agent_session_id"] == filters.get("agent_session_id", item["agent_session_id"])
+            and item["path"].startswith(filters.get("path", ""))
+            and item["status_code"] >= filters.get("min_status", 0)
+        )
+
+    def _backlog(self, agent_id, project_id, filters, fields, resume):
+        """
+        The newest _BACKLOG_LIMIT matching events after resume, oldest first,
+        and whether older ones were left out.
+        """
+        cursor_time, cursor_id = resume
+        qs = BackendEvent.objects.filter(
+            agent_id=agent_id,
+            project_id=project_id,
+            event_date__gte=cursor_time.astimezone(dt_timezone.utc).date(),
+        )
+        if "agent_session_id" in filters:
+            qs = qs.filter(agent_session_id=filters["agent_session_id"])
+        if "path" in filters:
+            qs = qs.filter(path__startswith=filters["path"])
+        if "min_status" in filters:
+            qs = qs.filter(status_code__gte=filters["min_status"])
+        qs = after_event_cursor(qs, cursor_time, cursor_id).only(*fields)
+        page = list(qs.order_by("-event_time", "-event_id")[:self._BACKLOG_LIMIT + 1])
+        gap = len(page) > self._BACKLOG_LIMIT
+        return [serialize_backend_event(ev, fields) for ev in reversed(page[:self._BACKLOG_LIMIT])], gap
+
+    async def _stream(self, agent_id, project_id, filters, fields, cursor, resume):
+        yield live_tail.sse_frame(comment="connected", retry=self._RETRY_MS)
+        try:
+            async with live_tail.subscribe(agent_id) as subscription:
+                # Subscribed before reading the backlog, so nothing committed in
+                # between is lost; events seen in both are sent once.
+                replayed = set()
+                if resume:
+                    backlog, gap = await run_blocking(self._backlog, agent_id, project_id, filters, fields, resume)
+                    if gap:
+                        yield live_tail.sse_frame({"cursor": cursor}, event="gap")
+                    for item in backlog:
+                        replayed.add(item["event_id"])
+                        yield live_tail.sse_frame(item, event="event", event_id=_tail_cursor(item))
+
+                async for batch in subscription.batches():
+                    if batch is None:
+                        yield live_tail.sse_frame(comment="keepalive")
+                        continue
+                    if isinstance(batch, dict):
+                        yield live_tail.sse_frame({"cursor": _gap_cursor(batch["gap"])}, event="gap")
+                        continue
+                    for item in batch:
+                        if item["event_id"] in replayed or not self._matches(item, project_id, filters):
+                            continue
+                        yield live_tail.sse_frame(
+                            {field: item[field] for field in fields}, event="event", event_id=_tail_cursor(item),
+                        )
+        except RedisError:
+            logger.exception("AgentEventTailView lost Redis")
+            yield live_tail.sse_frame({"status_description": "live_tail_unavailable"}, event="error")
+
+
+@method_decorator(agent_user_auth_required, name="dispatch")
+class EventExportView(View):
+    """
+    GET /api/v1/agent/events/export/
+
+    Streams BackendEvent rows for the authenticated agent (or its whole
+    project) as NDJSON or CSV, ordered by event_time. Rows are read with a
+    server-side cursor and written as they arrive, so exports of any size run
+    in constant memory.
+
+    Headers (via agent_user_auth_required):
+        X-OTAS-USER-TOKEN, X-OTAS-AGENT-ID, X-OTAS-PROJECT-ID
+
+    Query:
+        format (optional) — "ndjson" (default) or "csv"
+        scope (optional) — "agent" (default) or "project" for every agent in the project
+        session_id (optional) — only this agent session
+        start_date, end_date (optional, YYYY-MM-DD, inclusive) — event_date range
+        fields (optional) — comma-separated event fields; default every field
+
+    The body is gzip-compressed on the fly when the request sends
+    Accept-Encoding: gzip.
+    """
+
+    async def get(self, request):
+        try:
+            fmt = request.GET.get("format", "ndjson")
+            if fmt not in EXPORT_FORMATS:
+                return JsonResponse(
+                    {"status": 0, "status_description": "format must be ndjson or csv"},
+                    status=400,
+                )
+
+            scope = request.GET.get("scope", "agent")
+            if scope not in ("agent", "project"):
+                return JsonResponse(
+                    {"status": 0, "status_description": "scope must be agent or project"},
+                    status=400,
+                )
+
+            try:
+                fields = resolve_fields(request.GET.get("fields"))
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+            session_id = request.GET.get("session_id")
+            if session_id:
+                try:
+                    uuid.UUID(session_id)
+                except ValueError:
+                    return JsonResponse(
+                        {"status": 0, "status_description": "session_id must be a valid UUID"},
+                        status=400,
+                    )
+
+            try:
+                start, end = parse_date_range(request.GET, required=False)
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+            qs = export_queryset(
+                project_id=str(request.auth_project_id),
+                agent_id=str(request.auth_agent_id) if scope == "agent" else None,
+                session_id=session_id,
+                start=start,
+                end=end,
+                fields=fields,
+            )
+            compress = "gzip" in request.headers.get("Accept-Encoding", "")
+
+            response = StreamingHttpResponse(
+                iterate_blocking(stream_events(qs, fmt, fields=fields, compress=compress)),
+                content_type=EXPORT_FORMATS[fmt],
+            )
+            response["Content-Disposition"] = f'attachment; filename="events.{fmt}"'
+            response["Vary"] = "Accept-Encoding"
+            if compress:
+                response["Content-Encoding"] = "gzip"
+            return response
+
+        except Exception:
+            logger.exception("EventExportView failed")
+            return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
+
+
+_DEFAULT_QUANTILES = (0.50, 0.95, 0.99)
+_MAX_QUANTILES = 10
+
+
+def _quantile_label(quantile):
+    return f"p{quantile * 100:.10g}"
+
+
+def _parse_quantiles(raw):
+    """
+    Parses the `quantiles=` query parameter. Returns None when it is invalid.
+    """
+    if not raw:
+        return _DEFAULT_QUANTILES
+    try:
+        quantiles = [float(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        return None
+    if not quantiles or len(quantiles) > _MAX_QUANTILES:
+        return None
+    if any(not 0 < quantile < 1 for quantile in quantiles):
+        return None
+    return quantiles
+
 
 @method_decorator(agent_user_auth_required, name="dispatch")
 class AgentLatencyPercentilesView(View):
     """
     GET /api/v1/agent/latency-percentiles/
 
-    Returns daily latency percentiles (p50, p95, p99) for a specific agent
-    over a given date range. Intended for rendering bar/line graphs showing
-    latency distribution over time.
+    Returns daily latency percentiles (p50, p95, p99 by default) for a
+    specific agent over a given date range. Intended for rendering bar/line
+    graphs showing latency distribution over time.
 
     Authentication:
         Requires the following headers, validated via agent_user_auth_required:
@@ -421,12 +1167,31 @@ class AgentLatencyPercentilesView(View):
     Query Parameters:
         start_date (str): Start of the date range in YYYY-MM-DD format (inclusive).
         end_date   (str): End of the date range in YYYY-MM-DD format (inclusive).
+        quantiles  (str): Optional comma-separated quantiles in (0, 1), e.g.
+                          "0.5,0.9,0.999". Default "0.5,0.95,0.99". Each one is
+                          returned as p<100*q>, e.g. p50, p90, p99.9.
+        mode       (str): Optional. "sketch" merges the DDSketches stored on
+                          agent_path_daily_rollup; values are within 1% of the
+                          nearest-rank percentile.
+                          "exact" runs PERCENTILE_CONT over raw events. "auto"
+                          (default) is exact when the range holds at most
+                          LATENCY_EXACT_MAX_EVENTS events, sketch otherwise.
+        bucket     (str): Optional. One of minute, 5m, hour, day, week. Returns a
+                          dense series with one entry per bucket (empty buckets
+                          as nulls), keyed "bucket" (ISO 8601 start, UTC).
+                          Buckets are aligned, so edge buckets are whole; week
+                          buckets start on Monday. At most ANALYTICS_MAX_BUCKETS.
+        start_time (str): Optional with bucket, ISO 8601 datetime narrowing the range.
+        end_time   (str): Optional with bucket, ISO 8601 datetime narrowing the range.
+                          minute/5m buckets are always exact; coarser ones use
+                          sketches unless mode=exact.
 
     Success Response (200):
         {
             "status": 1,
             "agent_id": "<agent_uuid>",
             "project_id": "<project_uuid>",
+            "mode": "sketch",
             "data": [
                 {
                     "date": "2026-03-26",
@@ -439,15 +1204,19 @@ class AgentLatencyPercentilesView(View):
         }
 
         Notes:
-            - Only dates with at least one event are included (no zero-fill).
+            - Without bucket, only dates with at least one event are included
+              (no zero-fill).
             - Dates are ordered ascending.
             - All latency values are in milliseconds, rounded to 1 decimal place.
-            - Percentiles are computed using Postgres PERCENTILE_CONT (exact interpolation).
+            - "mode" reports which method answered the request.
 
     Error Responses:
         400 - missing_dates        : start_date or end_date not provided.
         400 - invalid_date_format  : Dates are not in YYYY-MM-DD format.
         400 - invalid_date_range   : start_date is after end_date.
+        400 - invalid_quantiles    : quantiles are not numbers in (0, 1).
+        400 - invalid_mode         : mode is not auto, exact or sketch.
+        400 - invalid_bucket       : Unknown bucket, bad start/end_time or too many buckets.
         401 - missing_user_token   : X-OTAS-USER-TOKEN header is absent.
         400 - missing_agent_id     : X-OTAS-AGENT-ID header is absent.
         400 - missing_project_id   : X-OTAS-PROJECT-ID header is absent.
@@ -458,63 +1227,120 @@ class AgentLatencyPercentilesView(View):
         500 - server_error         : Unexpected internal error.
     """
 
-    def get(self, request):
+    _MODES = ("auto", "exact", "sketch")
+
+    def _exact(self, agent_id, start, end, quantiles):
+        rows = (
+            BackendEvent.objects.filter(
+                agent_id=agent_id,
+                event_date__gte=start,
+                event_date__lte=end,
+            )
+            .values("event_date")
+            .annotate(**{
+                _quantile_label(quantile): Percentile("latency_ms", quantile)
+                for quantile in quantiles
+            })
+            .order_by("event_date")
+        )
+        return [
+            (row["event_date"], [row[_quantile_label(quantile)] for quantile in quantiles])
+            for row in rows
+        ]
+
+    def _sketch(self, rollups, quantiles):
+        rows = (
+            rollups.values("event_date")
+            .annotate(sketch=SketchMerge("latency_sketch"))
+            .order_by("event_date")
+        )
+        data = []
+        for row in rows:
+            sketch = DDSketch(row["sketch"])
+            if sketch.count:
+                data.append((row["event_date"], [sketch.quantile(quantile) for quantile in quantiles]))
+        return data
+
+    @cached_analytics_response
+    async def get(self, request):
+        return await run_blocking(self._get, request)
+
+    def _get(self, request):
         try:
             agent_id = request.auth_agent_id
-            start_date = request.GET.get("start_date")
-            end_date = request.GET.get("end_date")
+            try:
+                start, end = parse_date_range(request.GET)
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
 
-            if not start_date or not end_date:
+            quantiles = _parse_quantiles(request.GET.get("quantiles"))
+            if quantiles is None:
                 return JsonResponse(
-                    {"status": 0, "status_description": "start_date and end_date are required"},
+                    {"status": 0, "status_description": "quantiles must be comma-separated numbers between 0 and 1"},
                     status=400,
                 )
 
-            try:
-                start = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end = datetime.strptime(end_date, "%Y-%m-%d").date()
-            except ValueError:
+            mode = request.GET.get("mode", "auto")
+            if mode not in self._MODES:
                 return JsonResponse(
-                    {"status": 0, "status_description": "dates must be in YYYY-MM-DD format"},
+                    {"status": 0, "status_description": "mode must be one of auto, exact, sketch"},
                     status=400,
                 )
 
-            if start > end:
-                return JsonResponse(
-                    {"status": 0, "status_description": "start_date must be before or equal to end_date"},
-                    status=400,
-                )
+            if request.GET.get("bucket"):
+                try:
+                    bucket, window_start, window_end = _bucket_window(request, start, end)
+                except BucketError as exc:
+                    return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
 
-            rows = (
-                BackendEvent.objects.filter(
-                    agent_id=agent_id,
-                    event_date__gte=start,
-                    event_date__lte=end,
+                mode, series = bucket_percentiles(
+                    agent_id, bucket, window_start, window_end, quantiles, exact=(mode == "exact"),
                 )
-                .values("event_date")
-                .annotate(
-                    p50=Percentile("latency_ms", 0.50),
-                    p95=Percentile("latency_ms", 0.95),
-                    p99=Percentile("latency_ms", 0.99),
+                data = []
+                for bucket_start, values in series:
+                    item = {"bucket": bucket_start.isoformat()}
+                    for quantile, value in zip(quantiles, values):
+                        item[_quantile_label(quantile)] = round(value, 1) if value is not None else None
+                    data.append(item)
+                return JsonResponse(
+                    {
+                        "status": 1,
+                        "agent_id": agent_id,
+                        "project_id": request.auth_project_id,
+                        "bucket": bucket,
+                        "mode": mode,
+                        "data": data,
+                    },
+                    status=200,
                 )
-                .order_by("event_date")
-            )
 
-            data = [
-                {
-                    "date": row["event_date"].isoformat(),
-                    "p50": round(row["p50"], 1) if row["p50"] is not None else None,
-                    "p95": round(row["p95"], 1) if row["p95"] is not None else None,
-                    "p99": round(row["p99"], 1) if row["p99"] is not None else None,
-                }
-                for row in rows
-            ]
+            rollups = AgentPathDailyRollup.objects.filter(
+                agent_id=agent_id,
+                event_date__gte=start,
+                event_date__lte=end,
+            )
+            if mode == "auto":
+                total = rollups.aggregate(total=Sum("request_count"))["total"] or 0
+                mode = "exact" if total <= LATENCY_EXACT_MAX_EVENTS else "sketch"
+
+            if mode == "exact":
+                rows = self._exact(agent_id, start, end, quantiles)
+            else:
+                rows = self._sketch(rollups, quantiles)
+
+            data = []
+            for event_date, values in rows:
+                item = {"date": event_date.isoformat()}
+                for quantile, value in zip(quantiles, values):
+                    item[_quantile_label(quantile)] = round(value, 1) if value is not None else None
+                data.append(item)
 
             return JsonResponse(
                 {
                     "status": 1,
                     "agent_id": agent_id,
                     "project_id": request.auth_project_id,
+                    "mode": mode,
                     "data": data,
                 },
                 status=200,
@@ -543,6 +1369,13 @@ class AgentErrorCountView(View):
     Query Parameters:
         start_date (str): Start of the date range in YYYY-MM-DD format (inclusive).
         end_date   (str): End of the date range in YYYY-MM-DD format (inclusive).
+        bucket     (str): Optional. One of minute, 5m, hour, day, week. Returns a
+                          dense series with one entry per bucket (empty buckets
+                          as zeros), keyed "bucket" (ISO 8601 start, UTC).
+                          Buckets are aligned, so edge buckets are whole; week
+                          buckets start on Monday. At most ANALYTICS_MAX_BUCKETS.
+        start_time (str): Optional with bucket, ISO 8601 datetime narrowing the range.
+        end_time   (str): Optional with bucket, ISO 8601 datetime narrowing the range.
 
     Success Response (200):
         {
@@ -559,14 +1392,17 @@ class AgentErrorCountView(View):
         }
 
         Notes:
-            - Only dates with at least one error are included (no zero-fill).
+            - Without bucket, only dates with at least one error are included
+              (no zero-fill).
             - Dates are ordered ascending.
             - An error is counted when the error field is not null and not empty string.
+            - Counts come from agent_path_daily_rollup, not raw events.
 
     Error Responses:
         400 - missing_dates        : start_date or end_date not provided.
         400 - invalid_date_format  : Dates are not in YYYY-MM-DD format.
         400 - invalid_date_range   : start_date is after end_date.
+        400 - invalid_bucket       : Unknown bucket, bad start/end_time or too many buckets.
         401 - missing_user_token   : X-OTAS-USER-TOKEN header is absent.
         400 - missing_agent_id     : X-OTAS-AGENT-ID header is absent.
         400 - missing_project_id   : X-OTAS-PROJECT-ID header is absent.
@@ -577,43 +1413,47 @@ class AgentErrorCountView(View):
         500 - server_error         : Unexpected internal error.
     """
 
-    def get(self, request):
+    @cached_analytics_response
+    async def get(self, request):
+        return await run_blocking(self._get, request)
+
+    def _get(self, request):
         try:
             agent_id = request.auth_agent_id
-            start_date = request.GET.get("start_date")
-            end_date = request.GET.get("end_date")
-
-            if not start_date or not end_date:
-                return JsonResponse(
-                    {"status": 0, "status_description": "start_date and end_date are required"},
-                    status=400,
-                )
-
             try:
-                start = datetime.strptime(start_date, "%Y-%m-%d").date()
-                end = datetime.strptime(end_date, "%Y-%m-%d").date()
-            except ValueError:
-                return JsonResponse(
-                    {"status": 0, "status_description": "dates must be in YYYY-MM-DD format"},
-                    status=400,
-                )
+                start, end = parse_date_range(request.GET)
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+            if request.GET.get("bucket"):
+                try:
+                    bucket, window_start, window_end = _bucket_window(request, start, end)
+                except BucketError as exc:
+                    return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
 
-            if start > end:
                 return JsonResponse(
-                    {"status": 0, "status_description": "start_date must be before or equal to end_date"},
-                    status=400,
+                    {
+                        "status": 1,
+                        "agent_id": agent_id,
+                        "project_id": request.auth_project_id,
+                        "bucket": bucket,
+                        "data": [
+                            {"bucket": row["bucket"].isoformat(), "error_count": row["error_count"]}
+                            for row in bucket_counts(agent_id, bucket, window_start, window_end)
+                        ],
+                    },
+                    status=200,
                 )
 
             rows = (
-                BackendEvent.objects.filter(
+                AgentPathDailyRollup.objects.filter(
                     agent_id=agent_id,
                     event_date__gte=start,
                     event_date__lte=end,
+                    error_count__gt=0,
                 )
-                .exclude(error__isnull=True)
-                .exclude(error="")
                 .values("event_date")
-                .annotate(error_count=Count("event_id"))
+                .annotate(error_count=Sum("error_count"))
                 .order_by("event_date")
             )
 
@@ -637,4 +1477,178 @@ class AgentErrorCountView(View):
 
         except Exception:
             logger.exception("AgentErrorCountView failed")
-            return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
\ No newline at end of file
+            return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
+
+
+@method_decorator(agent_user_auth_required, name="dispatch")
+class AgentOverviewView(View):
+    """
+    GET /api/v1/agent/overview/
+
+    Everything the agent dashboard draws, in one request: daily request,
+    error and status-class counts, daily latency percentiles, and per-path
+    totals with their daily series. Computed from a single grouped read of
+    agent_path_daily_rollup, so the UASAM authorization and the range scan
+    happen once instead of once per chart.
+
+    Authentication:
+        Requires the following headers, validated via agent_user_auth_required:
+            X-OTAS-USER-TOKEN  : JWT token identifying the user
+            X-OTAS-AGENT-ID    : UUID of the agent
+            X-OTAS-PROJECT-ID  : UUID of the project the agent belongs to
+
+    Query Parameters:
+        start_date (str): Start of the date range in YYYY-MM-DD format (inclusive).
+        end_date   (str): End of the date range in YYYY-MM-DD format (inclusive).
+        quantiles  (str): Optional, as for /api/v1/agent/latency-percentiles/.
+
+    Success Response (200):
+        {
+            "status": 1,
+            "agent_id": "<agent_uuid>",
+            "project_id": "<project_uuid>",
+            "totals": {
+                "request_count": 120, "error_count": 4,
+                "status_2xx": 110, "status_3xx": 0, "status_4xx": 6, "status_5xx": 4,
+                "latency_avg": 182.4, "latency_min": 3.1, "latency_max": 2210.0,
+                "p50": 142.3, "p95": 489.1, "p99": 1203.7
+            },
+            "days": [
+                { "date": "2026-03-01", "request_count": 70, "error_count": 1, ..., "p50": ... }
+            ],
+            "paths": [
+                {
+                    "path": "/example/api/{id}", "path_id": 42,
+                    "request_count": 17, "error_count": 0, "latency_avg": 96.2,
+                    "data": [{ "date": "2026-03-01", "count": 10 }]
+                }
+            ]
+        }
+
+        Notes:
+            - Only dates and paths with at least one event are included.
+            - Paths are path templates, as in /api/v1/agent/path-timeseries/.
+            - Percentiles come from the rollup DDSketches (within 1% relative error).
+
+    Error Responses:
+        Same as /api/v1/agent/latency-percentiles/, minus invalid_mode.
+    """
+
+    _COUNTERS = ("request_count", "error_count", "status_2xx", "status_3xx", "status_4xx", "status_5xx")
+
+    def _summary(self, counters, latency_sum, latency_min, latency_max, sketch, quantiles):
+        summary = dict(counters)
+        requests = counters["request_count"]
+        summary["latency_avg"] = round(latency_sum / requests, 1) if requests else None
+        summary["latency_min"] = latency_min
+        summary["latency_max"] = latency_max
+        for quantile in quantiles:
+            value = sketch.quantile(quantile)
+            summary[_quantile_label(quantile)] = round(value, 1) if value is not None else None
+        return summary
+
+    @cached_analytics_response
+    async def get(self, request):
+        return await run_blocking(self._get, request)
+
+    def _get(self, request):
+        try:
+            agent_id = request.auth_agent_id
+            try:
+                start, end = parse_date_range(request.GET)
+            except ValueError as exc:
+                return JsonResponse({"status": 0, "status_description": str(exc)}, status=400)
+
+            quantiles = _parse_quantiles(request.GET.get("quantiles"))
+            if quantiles is None:
+                return JsonResponse(
+                    {"status": 0, "status_description": "quantiles must be comma-separated numbers between 0 and 1"},
+                    status=400,
+                )
+
+            rows = (
+                AgentPathDailyRollup.objects.filter(
+                    agent_id=agent_id,
+                    event_date__gte=start,
+                    event_date__lte=end,
+                )
+                .values("event_date", "path_template")
+                .annotate(
+                    **{counter: Sum(counter) for counter in self._COUNTERS},
+                    latency_sum=Sum("latency_sum"),
+                    latency_min=Min("latency_min"),
+                    latency_max=Max("latency_max"),
+                    sketch=SketchMerge("latency_sketch"),
+                )
+                .order_by("event_date", "path_template")
+            )
+            rows = list(rows)
+            labels = path_labels(row["path_template"] for row in rows)
+
+            def empty():
+                return {
+                    "counters": dict.fromkeys(self._COUNTERS, 0),
+                    "latency_sum": 0.0,
+                    "latency_min": None,
+                    "latency_max": None,
+                    "sketch": DDSketch(),
+                    "data": {},
+                }
+
+            def fold(acc, row):
+                for counter in self._COUNTERS:
+                    acc["counters"][counter] += row[counter]
+                acc["latency_sum"] += row["latency_sum"]
+                acc["latency_min"] = row["latency_min"] if acc["latency_min"] is None else min(acc["latency_min"], row["latency_min"])
+                acc["latency_max"] = row["latency_max"] if acc["latency_max"] is None else max(acc["latency_max"], row["latency_max"])
+
+            totals = empty()
+            days = {}
+            paths = {}
+            for row in rows:
+                day = days.setdefault(row["event_date"], empty())
+                path = paths.setdefault(labels[row["path_template"]], empty())
+                for acc in (totals, day, path):
+                    fold(acc, row)
+                if row["sketch"]:
+                    totals["sketch"].merge(row["sketch"])
+                    day["sketch"].merge(row["sketch"])
+                path["data"][row["event_date"]] = path["data"].get(row["event_date"], 0) + row["request_count"]
+
+            def summarize(acc):
+                return self._summary(
+                    acc["counters"], acc["latency_sum"], acc["latency_min"], acc["latency_max"],
+                    acc["sketch"], quantiles,
+                )
+
+            return JsonResponse(
+                {
+                    "status": 1,
+                    "agent_id": agent_id,
+                    "project_id": request.auth_project_id,
+                    "totals": summarize(totals),
+                    "days": [
+                        {"date": event_date.isoformat(), **summarize(acc)}
+                        for event_date, acc in sorted(days.items())
+                    ],
+                    "paths": [
+                        {
+                            "path": template,
+                            "path_id": path_id,
+                            "request_count": acc["counters"]["request_count"],
+                            "error_count": acc["counters"]["error_count"],
+                            "latency_avg": round(acc["latency_sum"] / acc["counters"]["request_count"], 1),
+                            "data": [
+                                {"date": event_date.isoformat(), "count": count}
+                                for event_date, count in acc["data"].items()
+                            ],
+                        }
+                        for (path_id, template), acc in sorted(paths.items(), key=lambda item: item[0][1])
+                    ],
+                },
+                status=200,
+            )
+
+        except Exception:
+            logger.exception("AgentOverviewView failed")
+            return JsonResponse({"status": 0, "status_description": "server_error"}, status=500)
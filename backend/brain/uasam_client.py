@@ -0,0 +1,297 @@
+# uasam_client.py
+"""
+Shared HTTP client for brain -> UASAM calls.
+
+One pooled, keep-alive requests.Session is reused for every sync call and
+one httpx.AsyncClient per event loop for async calls (apost), with per-call
+timeouts, bounded retries with full-jitter backoff and a circuit breaker
+shared by both, so a slow or failing UASAM cannot pile up brain workers.
+All UASAM endpoints called from brain are read-only auth checks, so
+retrying them is safe even though they are POSTs.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+POOL_MAXSIZE = getattr(settings, 'UASAM_HTTP_POOL_MAXSIZE', 50)
+ASYNC_POOL_MAXSIZE = getattr(settings, 'UASAM_HTTP_ASYNC_POOL_MAXSIZE', 200)
+CONNECT_TIMEOUT = getattr(settings, 'UASAM_HTTP_CONNECT_TIMEOUT', 1.0)
+READ_TIMEOUT = getattr(settings, 'UASAM_HTTP_READ_TIMEOUT', 5.0)
+MAX_RETRIES = getattr(settings, 'UASAM_HTTP_MAX_RETRIES', 2)
+RETRY_BACKOFF = getattr(settings, 'UASAM_HTTP_RETRY_BACKOFF', 0.05)
+CIRCUIT_FAILURE_THRESHOLD = getattr(settings, 'UASAM_CIRCUIT_FAILURE_THRESHOLD', 5)
+CIRCUIT_RESET_SECONDS = getattr(settings, 'UASAM_CIRCUIT_RESET_SECONDS', 10)
+
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without touching the network while the circuit is open.
+    Subclasses ConnectionError so existing RequestException handlers
+    treat it as "auth service unreachable".
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures and rejects
+    calls for CIRCUIT_RESET_SECONDS; then lets a single trial call through
+    (half-open) and closes again if it succeeds.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning('UASAM circuit opened after %d consecutive failures', self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ClientMetrics:
+    """
+    Request counters and a rolling window of call latencies.
+    """
+
+    def __init__(self, window=1000):
+        self.counters = {
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'circuit_rejections': 0,
+        }
+        self.latencies_ms = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def observe(self, latency_ms):
+        with self._lock:
+            self.latencies_ms.append(latency_ms)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies_ms)
+            counters = dict(self.counters)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2)
+
+        return {
+            **counters,
+            'latency_ms': {
+                'samples': len(latencies),
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1], 2) if latencies else None,
+            },
+        }
+
+
+class UasamClient:
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.metrics = ClientMetrics()
+        self._async_loop = None
+        self._async_session = None
+        # Closes of replaced async clients still running.
+        self._closing = set()
+
+    def _start_attempt(self, attempt):
+        """
+        Checks the circuit and counts the attempt.
+        Returns the backoff delay to wait before sending it.
+        """
+        if not self.breaker.allow():
+            self.metrics.incr('circuit_rejections')
+            raise CircuitOpenError('UASAM circuit is open')
+        self.metrics.incr('requests')
+        if not attempt:
+            return 0
+        self.metrics.incr('retries')
+        return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+    def _record_error(self, started):
+        self.metrics.observe((time.perf_counter() - started) * 1000)
+        self.metrics.incr('failures')
+        self.breaker.record_failure()
+
+    def _record_response(self, response, started, attempt):
+        """
+        Records the outcome of a response. Returns True if it should be retried.
+        """
+        self.metrics.observe((time.perf_counter() - started) * 1000)
+        if response.status_code in RETRY_STATUS_CODES:
+            self.metrics.incr('failures')
+            self.breaker.record_failure()
+            return attempt < MAX_RETRIES
+        if response.status_code >= 500:
+            self.metrics.incr('failures')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return False
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        """
+        POSTs to UASAM and returns the response.
+        Retries connection errors, timeouts and 502/503/504 up to MAX_RETRIES
+        times. Raises requests.exceptions.Timeout / RequestException when all
+        attempts fail, and CircuitOpenError while the circuit is open.
+        """
+        timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+        for attempt in range(MAX_RETRIES + 1):
+            delay = self._start_attempt(attempt)
+            if delay:
+                time.sleep(delay)
+
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, headers=headers, json=json, timeout=timeout)
+            except requests.exceptions.RequestException:
+                self._record_error(started)
+                if attempt == MAX_RETRIES:
+                    raise
+                continue
+
+            if not self._record_response(response, started, attempt):
+                return response
+
+    def _async_client(self):
+        # An AsyncClient's connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            if self._async_session is not None:
+                self._close_async_client(self._async_loop, self._async_session)
+            self._async_loop = loop
+            self._async_session = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=ASYNC_POOL_MAXSIZE,
+                    max_keepalive_connections=POOL_MAXSIZE,
+                ),
+            )
+        return self._async_session
+
+    def _close_async_client(self, loop, client):
+        """
+        Closes an AsyncClient replaced by one for another loop: on its own
+        loop while that still runs, otherwise on the current one, where
+        connections the old loop's shutdown already broke are just dropped.
+        """
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+
+        async def close():
+            try:
+                await client.aclose()
+            except Exception:
+                logger.debug('Closing the replaced UASAM async client failed', exc_info=True)
+
+        task = asyncio.get_running_loop().create_task(close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def apost(self, url, headers=None, json=None, timeout=None):
+        """
+        Async variant of post() with the same retries, circuit breaker and
+        exceptions: httpx errors are re-raised as requests.exceptions.Timeout
+        or ConnectionError so callers handle both clients alike. The response
+        is an httpx.Response (status_code, json()).
+        """
+        connect_timeout, read_timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        client = self._async_client()
+
+        for attempt in range(MAX_RETRIES + 1):
+            delay = self._start_attempt(attempt)
+            if delay:
+                await asyncio.sleep(delay)
+
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, headers=headers, json=json, timeout=timeout)
+            except httpx.PoolTimeout as exc:
+                # Every pooled connection is busy: local saturation, not a UASAM failure.
+                raise requests.exceptions.Timeout(str(exc)) from exc
+            except httpx.TransportError as exc:
+                self._record_error(started)
+                if attempt == MAX_RETRIES:
+                    if isinstance(exc, httpx.TimeoutException):
+                        raise requests.exceptions.Timeout(str(exc)) from exc
+                    raise requests.exceptions.ConnectionError(str(exc)) from exc
+                continue
+
+            if not self._record_response(response, started, attempt):
+                return response
+
+    def pool_stats(self):
+        pools = []
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': f'{pool.host}:{pool.port}',
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle_connections': sum(1 for conn in pool.pool.queue if conn is not None) if pool.pool else 0,
+                'max_size': pool.pool.maxsize if pool.pool else POOL_MAXSIZE,
+            })
+        return pools
+
+    def get_metrics(self):
+        return {
+            **self.metrics.snapshot(),
+            'circuit_state': self.breaker.state,
+            'pools': self.pool_stats(),
+        }
+
+
+uasam_client = UasamClient()
@@ -4,8 +4,8 @@ import secrets
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.contrib.auth.hashers import make_password, check_password
 from users.models import User
+from projects.utils import APIKeyHasher
 
 
 class Agent(models.Model):
@@ -62,14 +62,18 @@ class AgentKey(models.Model):
 		return full_key, prefix
 
 	def hash_key(self, full_key):
-		self.hashed_key = make_password(full_key)
+		self.hashed_key = APIKeyHasher.hash(full_key)
 
 	def verify_key(self, full_key):
 		if self.revoked_at or not self.active:
 			return False
 		if self.expires_at and self.expires_at < timezone.now():
 			return False
-		return check_password(full_key, self.hashed_key)
+		is_valid, needs_upgrade = APIKeyHasher.verify(full_key, self.hashed_key)
+		if needs_upgrade:
+			self.hash_key(full_key)
+			self.save(update_fields=['hashed_key'])
+		return is_valid
 
 
 class AgentSession(models.Model):
@@ -0,0 +1,200 @@
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from projects.utils import APIKeyHasher
+from .models import Agent, AgentKey
+
+logger = logging.getLogger(__name__)
+
+
+class AgentKeyCache:
+    """
+    Cache of recently verified agent keys, so repeat verifications skip the
+    DB lookup and hash check.
+
+    Entries are keyed by the key's HMAC-SHA256 digest, which is also what
+    AgentKey.hashed_key stores, so revocation can find and drop an entry
+    without knowing the raw key. Two layers are used:
+      - Redis (django cache), shared by all workers and invalidated at once
+        on revoke/rotation.
+      - A small in-process LRU in front of it. Other processes may keep
+        serving a revoked key for up to AGENT_KEY_LOCAL_CACHE_TTL seconds;
+        set it to 0 to disable the local layer.
+    Entries never outlive the key's expires_at. Deactivating an agent or a
+    key drops its entries (agents/signals.py).
+    """
+    REDIS_TTL = getattr(settings, "AGENT_KEY_CACHE_TTL", 300)
+    LOCAL_TTL = getattr(settings, "AGENT_KEY_LOCAL_CACHE_TTL", 5)
+    LOCAL_MAXSIZE = getattr(settings, "AGENT_KEY_LOCAL_CACHE_MAXSIZE", 10000)
+
+    _local = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(digest):
+        return f"agent_key_auth:{digest}"
+
+    @staticmethod
+    def _local_get(digest):
+        with AgentKeyCache._lock:
+            entry = AgentKeyCache._local.get(digest)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del AgentKeyCache._local[digest]
+                return None
+            AgentKeyCache._local.move_to_end(digest)
+            return entry[1]
+
+    @staticmethod
+    def _local_set(digest, data, ttl):
+        if AgentKeyCache.LOCAL_TTL <= 0:
+            return
+        with AgentKeyCache._lock:
+            AgentKeyCache._local[digest] = (time.monotonic() + min(ttl, AgentKeyCache.LOCAL_TTL), data)
+            AgentKeyCache._local.move_to_end(digest)
+            while len(AgentKeyCache._local) > AgentKeyCache.LOCAL_MAXSIZE:
+                AgentKeyCache._local.popitem(last=False)
+
+    @staticmethod
+    def _to_models(data):
+        agent = Agent(
+            id=data["agent_id"],
+            name=data["agent_name"],
+            provider=data["agent_provider"],
+            project_id=data["project_id"],
+            # Entries cached before the flags were stored only ever held
+            # active keys of active agents.
+            is_active=data.get("agent_is_active", True),
+        )
+        agent_key = AgentKey(
+            id=data["agent_key_id"],
+            prefix=data["prefix"],
+            agent_id=data["agent_id"],
+            active=data.get("active", True),
+        )
+        agent_key.agent = agent
+        return agent, agent_key
+
+    @staticmethod
+    def get(full_key):
+        """
+        Returns (agent, agent_key) for a previously verified key, or None.
+        The returned instances carry only the fields the auth views read.
+        """
+        digest = APIKeyHasher.hash(full_key)
+        data = AgentKeyCache._local_get(digest)
+        if data is None:
+            try:
+                data = cache.get(AgentKeyCache._cache_key(digest))
+            except Exception:
+                data = None
+            if data is None:
+                return None
+            AgentKeyCache._local_set(digest, data, AgentKeyCache.REDIS_TTL)
+
+        if data["expires_at"] is not None and data["expires_at"] <= time.time():
+            AgentKeyCache.invalidate_digest(digest)
+            return None
+        return AgentKeyCache._to_models(data)
+
+    @staticmethod
+    def set(full_key, agent_key):
+        """
+        Caches a key that has just passed AgentKey.verify_key.
+        """
+        ttl = AgentKeyCache.REDIS_TTL
+        expires_at = None
+        if agent_key.expires_at:
+            expires_at = agent_key.expires_at.timestamp()
+            ttl = min(ttl, int((agent_key.expires_at - timezone.now()).total_seconds()))
+            if ttl <= 0:
+                return
+
+        agent = agent_key.agent
+        data = {
+            "agent_key_id": str(agent_key.id),
+            "prefix": agent_key.prefix,
+            "agent_id": str(agent.id),
+            "agent_name": agent.name,
+            "agent_provider": agent.provider,
+            "project_id": str(agent.project_id),
+            "agent_is_active": agent.is_active,
+            "active": agent_key.active,
+            "expires_at": expires_at,
+        }
+        digest = APIKeyHasher.hash(full_key)
+        AgentKeyCache._local_set(digest, data, ttl)
+        try:
+            cache.set(AgentKeyCache._cache_key(digest), data, ttl)
+        except Exception:
+            logger.exception("Failed to cache verified agent key")
+
+    @staticmethod
+    def invalidate_digest(digest):
+        with AgentKeyCache._lock:
+            AgentKeyCache._local.pop(digest, None)
+        try:
+            cache.delete(AgentKeyCache._cache_key(digest))
+        except Exception:
+            logger.exception("Failed to invalidate cached agent key")
+
+    @staticmethod
+    def invalidate(hashed_keys):
+        """
+        Drops cached verifications for the given AgentKey.hashed_key values.
+        Legacy PBKDF2 hashes are skipped; they are never used as cache keys.
+        """
+        digests = [h for h in hashed_keys if not APIKeyHasher.is_legacy(h)]
+        with AgentKeyCache._lock:
+            for digest in digests:
+                AgentKeyCache._local.pop(digest, None)
+        if not digests:
+            return
+        try:
+            cache.delete_many([AgentKeyCache._cache_key(d) for d in digests])
+        except Exception:
+            logger.exception("Failed to invalidate cached agent keys")
+
+    @staticmethod
+    def invalidate_agent(agent_id):
+        """
+        Drops cached verifications of every key of the agent, e.g. once it is
+        deactivated.
+        """
+        AgentKeyCache.invalidate(AgentKey.objects.filter(agent_id=agent_id).values_list("hashed_key", flat=True))
+
+
+def invalidate_brain_auth(user_ids=(), project_ids=(), agent_ids=()):
+    """
+    Tells brain to drop its cached dashboard authorization for the given
+    users, projects and agents. Failures are logged, not raised: brain's
+    cache TTL still bounds how long a lost invalidation lingers.
+    """
+    token = getattr(settings, "INTERNAL_API_TOKEN", "")
+    if not token:
+        return
+    body = json.dumps({
+        "user_ids": [str(i) for i in user_ids],
+        "project_ids": [str(i) for i in project_ids],
+        "agent_ids": [str(i) for i in agent_ids],
+    }).encode()
+    request = urllib.request.Request(
+        settings.BRAIN_API_URL.rstrip("/") + "/api/v1/internal/auth-cache/invalidate/",
+        data=body,
+        headers={"Content-Type": "application/json", "X-OTAS-INTERNAL-TOKEN": token},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=getattr(settings, "BRAIN_INVALIDATE_TIMEOUT", 2)):
+            pass
+    except Exception:
+        logger.warning("Failed to invalidate brain auth cache", exc_info=True)
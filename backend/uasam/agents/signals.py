@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Agent, AgentKey
+from .services import AgentKeyCache, invalidate_brain_auth
+
+
+@receiver(post_save, sender=Agent)
+def invalidate_deactivated_agent(sender, instance, **kwargs):
+    if not instance.is_active:
+        transaction.on_commit(lambda: AgentKeyCache.invalidate_agent(instance.id))
+
+
+@receiver(post_save, sender=Agent)
+@receiver(post_delete, sender=Agent)
+def invalidate_brain_agent_auth(sender, instance, created=False, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: invalidate_brain_auth(agent_ids=[instance.id]))
+
+
+@receiver(post_save, sender=AgentKey)
+def invalidate_deactivated_agent_key(sender, instance, **kwargs):
+    if not instance.active or instance.revoked_at:
+        transaction.on_commit(lambda: AgentKeyCache.invalidate([instance.hashed_key]))
@@ -1,3 +1,104 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from projects.models import Project, UserProjectMapping
+from users.models import User
+from users.services import UserServices
+from .models import Agent, AgentKey
+from .services import AgentKeyCache
+
+AGENT_AUTH_VERIFY_URL = '/api/agent/v1/auth/verify/'
+AGENT_KEY_REVOKE_URL = '/api/agent/v1/agents/key/revoke/'
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AgentAuthenticatorTests(TestCase):
+    def setUp(self):
+        AgentKeyCache._local.clear()
+        self.user = User.objects.create(first_name='a', last_name='b', email='a@example.com', password='x')
+        self.project = Project.objects.create(name='p', created_by=self.user)
+        self.agent = Agent.objects.create(name='agent', provider='openai', project=self.project, created_by=self.user)
+        self.full_key, prefix = AgentKey.generate_key()
+        self.agent_key = AgentKey(agent=self.agent, prefix=prefix)
+        self.agent_key.hash_key(self.full_key)
+        self.agent_key.save()
+
+    def _verify(self):
+        return self.client.post(AGENT_AUTH_VERIFY_URL, HTTP_X_OTAS_AGENT_KEY=self.full_key)
+
+    def test_uncached_key_of_deactivated_agent_is_rejected(self):
+        # update() sends no signals, so only the query itself can reject it.
+        Agent.objects.filter(pk=self.agent.pk).update(is_active=False)
+        self.assertEqual(self._verify().status_code, 401)
+        self.assertIsNone(AgentKeyCache.get(self.full_key))
+
+    def test_verified_key_is_served_from_cache(self):
+        first = self._verify()
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self._verify()
+        self.assertEqual(second.json(), first.json())
+
+    def test_shared_layer_serves_other_processes(self):
+        self._verify()
+        AgentKeyCache._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._verify().status_code, 200)
+
+    def test_cached_models_carry_the_auth_fields(self):
+        AgentKeyCache.set(self.full_key, self.agent_key)
+        AgentKeyCache._local.clear()
+
+        agent, agent_key = AgentKeyCache.get(self.full_key)
+
+        self.assertEqual(
+            (str(agent.id), agent.name, agent.provider, str(agent.project_id), agent.is_active),
+            (str(self.agent.id), 'agent', 'openai', str(self.project.id), True),
+        )
+        self.assertEqual(
+            (str(agent_key.id), agent_key.prefix, str(agent_key.agent_id), agent_key.active),
+            (str(self.agent_key.id), self.agent_key.prefix, str(self.agent.id), True),
+        )
+        self.assertIs(agent_key.agent, agent)
+
+    def test_expired_keys_are_not_cached(self):
+        self.agent_key.expires_at = timezone.now() - timedelta(seconds=1)
+        AgentKeyCache.set(self.full_key, self.agent_key)
+        self.assertIsNone(AgentKeyCache.get(self.full_key))
+
+    def test_revoke_drops_cached_key(self):
+        self._verify()
+        UserProjectMapping.objects.create(
+            user=self.user, project=self.project, privilege=UserProjectMapping.PRIVILEGE_ADMIN,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                AGENT_KEY_REVOKE_URL,
+                data={'agent_key_id': str(self.agent_key.id)},
+                content_type='application/json',
+                HTTP_X_OTAS_USER_TOKEN=UserServices.generate_jwt_token(self.user),
+                HTTP_X_OTAS_PROJECT_ID=str(self.project.id),
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(AgentKeyCache.get(self.full_key))
+        self.assertEqual(self._verify().status_code, 401)
+
+    def test_deactivating_key_drops_cached_key(self):
+        self._verify()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent_key.active = False
+            self.agent_key.save()
+        self.assertIsNone(AgentKeyCache.get(self.full_key))
+        self.assertEqual(self._verify().status_code, 401)
+
+    def test_deactivating_agent_drops_cached_keys(self):
+        self._verify()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent.is_active = False
+            self.agent.save()
+        self.assertIsNone(AgentKeyCache.get(self.full_key))
+        self.assertEqual(self._verify().status_code, 401)
@@ -16,6 +16,7 @@ from django.core.exceptions import ValidationError
 from decorators import agent_authenticator, user_project_auth_required
 from users.constants import JWT_SECRET
 from .models import AgentSession, Agent, AgentKey
+from .services import AgentKeyCache
 from projects.models import UserProjectMapping
 
 logger = logging.getLogger(__name__)
@@ -339,7 +340,10 @@ class AgentKeyCreateView(View):
             
             with transaction.atomic():
                 # revoke any earlier valid key for this agent before issuing a new one
-                AgentKey.objects.filter(agent=agent, active=True).update(active=False, revoked_at=timezone.now())
+                old_keys = AgentKey.objects.select_for_update().filter(agent=agent, active=True)
+                old_hashes = list(old_keys.values_list("hashed_key", flat=True))
+                old_keys.update(active=False, revoked_at=timezone.now())
+                transaction.on_commit(lambda: AgentKeyCache.invalidate(old_hashes))
 
                 full_key, prefix = AgentKey.generate_key()
                 expires_at = timezone.now() + timezone.timedelta(days=30)
@@ -414,6 +418,7 @@ class AgentKeyRevokeView(View):
             agent_key.active = False
             agent_key.revoked_at = timezone.now()
             agent_key.save()
+            AgentKeyCache.invalidate([agent_key.hashed_key])
             return JsonResponse({"status":1,"status_description":"agent_key_revoked","response":{"id":str(agent_key.id)}}, status=200)
         except AgentKey.DoesNotExist:
             return JsonResponse({"status":0,"status_description":"agent_key_not_found"}, status=404)
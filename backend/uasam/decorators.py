@@ -2,7 +2,9 @@ from functools import wraps
 from django.http import JsonResponse
 from users.services import UserServices
 from projects.models import Project, UserProjectMapping, BackendAPIKey 
+from projects.utils import APIKeyHasher
 from agents.models import AgentKey
+from agents.services import AgentKeyCache
 import uuid
 
 def user_auth_required(view_fuc):
@@ -77,13 +79,12 @@ def sdk_authenticator(view_func):
             return JsonResponse({"error": "SDK Key missing"}, status=401)
 
         try:
-            parts = full_key.split('_', 2)
-            if len(parts) != 3:
+            prefix = APIKeyHasher.parse_prefix(full_key, "otas")
+            if not prefix:
                 return JsonResponse({"error": "Invalid Key Format"}, status=403)
-            prefix_candidate = parts[1]
-            secret_part = parts[2]
 
-            key_qs = BackendAPIKey.objects.filter(active=True)
+            # Prefix is indexed and effectively unique, so at most one hash check runs
+            key_qs = BackendAPIKey.objects.filter(prefix=prefix, active=True).select_related("project")
             matched_key = None
             for key_obj in key_qs:
                 if key_obj.verify_key(full_key):
@@ -114,29 +115,45 @@ def agent_authenticator(view_func):
             }, status=401)
 
         try:
-            parts = full_key.split("_", 2)
-            if len(parts) != 3 or parts[0] != "agent":
+            prefix = APIKeyHasher.parse_prefix(full_key, "agent")
+            if not prefix:
                 return JsonResponse({
                     "status": 0,
                     "status_description": "invalid_agent_key"
                 }, status=401)
 
-            prefix = parts[1]
-            key_qs = AgentKey.objects.filter(active=True, prefix=prefix).select_related("agent")
-
-            matched_key = None
-            for key_obj in key_qs:
-                if key_obj.verify_key(full_key):
-                    matched_key = key_obj
-                    break
-
-            if not matched_key:
-                return JsonResponse({
-                    "status": 0,
-                    "status_description": "invalid_agent_key"
-                }, status=401)
-
-            request.agent = matched_key.agent
+            cached = AgentKeyCache.get(full_key)
+            if cached:
+                agent, matched_key = cached
+                if not agent.is_active or not matched_key.active:
+                    return JsonResponse({
+                        "status": 0,
+                        "status_description": "invalid_agent_key"
+                    }, status=401)
+            else:
+                # Keys of a deactivated agent are rejected here too, not just
+                # on the cached path, so deactivation does not depend on
+                # whether the key happens to be cached.
+                key_qs = AgentKey.objects.filter(
+                    active=True, prefix=prefix, agent__is_active=True,
+                ).select_related("agent")
+
+                matched_key = None
+                for key_obj in key_qs:
+                    if key_obj.verify_key(full_key):
+                        matched_key = key_obj
+                        break
+
+                if not matched_key:
+                    return JsonResponse({
+                        "status": 0,
+                        "status_description": "invalid_agent_key"
+                    }, status=401)
+
+                AgentKeyCache.set(full_key, matched_key)
+                agent = matched_key.agent
+
+            request.agent = agent
             request.agent_key = matched_key
 
         except Exception:
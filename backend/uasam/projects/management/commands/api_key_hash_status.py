@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from agents.models import AgentKey
+from projects.models import BackendAPIKey
+from projects.utils import APIKeyHasher
+
+
+class Command(BaseCommand):
+    """
+    Reports how many active API keys still carry a legacy PBKDF2 hash.
+
+    Raw keys are never stored, so legacy hashes cannot be converted in a data
+    migration; each one is rewritten as HMAC-SHA256 the first time its key is
+    used. Once this reports zero legacy keys, the PBKDF2 fallback in
+    APIKeyHasher.verify is no longer exercised.
+    """
+    help = "Report active SDK/agent keys still hashed with PBKDF2."
+
+    def handle(self, *args, **options):
+        for model in (BackendAPIKey, AgentKey):
+            legacy = (
+                model.objects
+                .filter(active=True)
+                .exclude(hashed_key__startswith=APIKeyHasher.SCHEME)
+                .count()
+            )
+            total = model.objects.filter(active=True).count()
+            self.stdout.write(f"{model._meta.db_table}: {legacy} legacy of {total} active keys")
@@ -3,8 +3,8 @@ import uuid
 import secrets
 from django.db import models
 from django.utils import timezone
-from django.contrib.auth.hashers import make_password, check_password
 from users.models import User
+from .utils import APIKeyHasher
 
 
 
@@ -97,12 +97,19 @@ class BackendAPIKey(models.Model):
 
     def hash_key(self, full_key):
         """Hash and store the full API key."""
-        self.hashed_key = make_password(full_key)
+        self.hashed_key = APIKeyHasher.hash(full_key)
 
     def verify_key(self, full_key):
-        """Verify if a given key matches the hashed key."""
+        """
+        Verify if a given key matches the hashed key.
+        A matching legacy PBKDF2 hash is rewritten as HMAC-SHA256.
+        """
         if self.revoked_at or not self.active:
             return False
         if self.expires_at and self.expires_at < timezone.now():
             return False
-        return check_password(full_key, self.hashed_key)
+        is_valid, needs_upgrade = APIKeyHasher.verify(full_key, self.hashed_key)
+        if needs_upgrade:
+            self.hash_key(full_key)
+            self.save(update_fields=["hashed_key"])
+        return is_valid
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from agents.services import invalidate_brain_auth
+from .models import Project, UserProjectMapping
+
+
+@receiver(post_save, sender=UserProjectMapping)
+@receiver(post_delete, sender=UserProjectMapping)
+def invalidate_brain_membership_auth(sender, instance, created=False, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: invalidate_brain_auth(user_ids=[instance.user_id]))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_brain_project_auth(sender, instance, created=False, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: invalidate_brain_auth(project_ids=[instance.id]))
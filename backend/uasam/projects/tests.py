@@ -1,3 +1,142 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from agents.models import Agent, AgentKey
+from users.models import User
+from . import signals
+from .models import BackendAPIKey, Project, UserProjectMapping
+from .utils import APIKeyHasher
+
+SDK_AUTHENTICATE_URL = '/api/project/v1/sdk/backend/key/authenticate/'
+
+
+def _legacy_hash(full_key):
+    # Django's PBKDF2 format, with few iterations to keep the tests fast.
+    return PBKDF2PasswordHasher().encode(full_key, 'legacysalt', iterations=1000)
+
+
+class APIKeyHasherTests(SimpleTestCase):
+    def test_hmac_hash_verifies(self):
+        hashed = APIKeyHasher.hash('otas_abc_secret')
+        self.assertTrue(hashed.startswith(APIKeyHasher.SCHEME))
+        self.assertEqual(APIKeyHasher.verify('otas_abc_secret', hashed), (True, False))
+        self.assertEqual(APIKeyHasher.verify('otas_abc_other', hashed), (False, False))
+
+    def test_legacy_hash_verifies_and_needs_upgrade(self):
+        hashed = _legacy_hash('otas_abc_secret')
+        self.assertTrue(APIKeyHasher.is_legacy(hashed))
+        self.assertEqual(APIKeyHasher.verify('otas_abc_secret', hashed), (True, True))
+        self.assertEqual(APIKeyHasher.verify('otas_abc_other', hashed), (False, False))
+
+    def test_parse_prefix(self):
+        self.assertEqual(APIKeyHasher.parse_prefix('otas_ab_cdefghij_secret', 'otas'), 'ab_cdefghij')
+        for malformed in ('otas_short_secret', 'otas_abcdefghijk-secret', 'otas_abcdefghijk_', 'agent_abcdefghijk_s'):
+            self.assertIsNone(APIKeyHasher.parse_prefix(malformed, 'otas'), malformed)
+
+
+class BackendAPIKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(first_name='a', last_name='b', email='a@example.com', password='x')
+        self.project = Project.objects.create(name='p', created_by=self.user)
+
+    def _key(self, legacy=False):
+        full_key, prefix = BackendAPIKey.generate_key()
+        api_key = BackendAPIKey(project=self.project, prefix=prefix)
+        if legacy:
+            api_key.hashed_key = _legacy_hash(full_key)
+        else:
+            api_key.hash_key(full_key)
+        api_key.save()
+        return full_key, api_key
+
+    def _authenticate(self, full_key):
+        return self.client.post(SDK_AUTHENTICATE_URL, HTTP_X_OTAS_SDK_KEY=full_key)
+
+    def test_legacy_key_verifies_and_is_upgraded(self):
+        full_key, api_key = self._key(legacy=True)
+
+        response = self._authenticate(full_key)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response']['project']['id'], str(self.project.id))
+        api_key.refresh_from_db()
+        self.assertEqual(api_key.hashed_key, APIKeyHasher.hash(full_key))
+        self.assertEqual(self._authenticate(full_key).status_code, 200)
+
+    def test_hmac_key_verifies(self):
+        full_key, _ = self._key()
+        self.assertEqual(self._authenticate(full_key).status_code, 200)
+
+    def test_wrong_key_is_rejected(self):
+        full_key, api_key = self._key(legacy=True)
+        response = self._authenticate(full_key[:-1] + ('a' if full_key[-1] != 'a' else 'b'))
+        self.assertEqual(response.status_code, 403)
+        api_key.refresh_from_db()
+        self.assertTrue(APIKeyHasher.is_legacy(api_key.hashed_key))
+
+    def test_prefix_collision_is_rejected(self):
+        full_key, api_key = self._key()
+        impostor, _ = BackendAPIKey.generate_key()
+        impostor = f'otas_{api_key.prefix}_{impostor.rsplit("_", 1)[1]}'
+        self.assertEqual(self._authenticate(impostor).status_code, 403)
+        self.assertEqual(self._authenticate(full_key).status_code, 200)
+
+    def test_revoked_key_is_rejected(self):
+        full_key, api_key = self._key()
+        api_key.active = False
+        api_key.save()
+        self.assertEqual(self._authenticate(full_key).status_code, 403)
+
+    def test_malformed_and_missing_keys(self):
+        self.assertEqual(self._authenticate('otas_short').status_code, 403)
+        self.assertEqual(self.client.post(SDK_AUTHENTICATE_URL).status_code, 401)
+
+    def test_api_key_hash_status(self):
+        self._key(legacy=True)
+        self._key()
+        agent = Agent.objects.create(name='a', project=self.project, created_by=self.user)
+        AgentKey.objects.create(agent=agent, prefix='x' * 11, hashed_key=_legacy_hash('agent_key'))
+
+        out = StringIO()
+        call_command('api_key_hash_status', stdout=out)
+
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ['backend_api_keys: 1 legacy of 2 active keys', 'agent_key: 1 legacy of 1 active keys'],
+        )
+
+
+class BrainAuthInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(first_name='a', last_name='b', email='a@example.com', password='x')
+        self.project = Project.objects.create(name='p', created_by=self.user)
+        self.mapping = UserProjectMapping.objects.create(user=self.user, project=self.project)
+        self.invalidate = mock.patch.object(signals, 'invalidate_brain_auth').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_membership_change_invalidates_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mapping.is_active = False
+            self.mapping.save()
+        self.invalidate.assert_called_once_with(user_ids=[self.user.id])
+
+        self.invalidate.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mapping.delete()
+        self.invalidate.assert_called_once_with(user_ids=[self.user.id])
+
+    def test_project_change_invalidates_project(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.is_active = False
+            self.project.save()
+        self.invalidate.assert_called_once_with(project_ids=[self.project.id])
+
+    def test_new_membership_does_not_invalidate(self):
+        other = User.objects.create(first_name='c', last_name='d', email='c@example.com', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserProjectMapping.objects.create(user=other, project=self.project)
+        self.invalidate.assert_not_called()
@@ -1,4 +1,9 @@
 # Please use this file for additional logic
+import hashlib
+import hmac
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+
 
 class ProjectUtils:
     @staticmethod
@@ -39,4 +44,59 @@ class ProjectUtils:
         
         domain = payload.get("project_domain", "")
 
-        return True, {"project_name": name, "project_description": desc, "project_domain": domain}
\ No newline at end of file
+        return True, {"project_name": name, "project_description": desc, "project_domain": domain}
+
+
+class APIKeyHasher:
+    """
+    Hashing scheme shared by BackendAPIKey and AgentKey.
+
+    Keys are high-entropy random tokens, so a keyed HMAC-SHA256 is as safe as
+    a slow password hash and costs microseconds. Hashes written before this
+    scheme are Django PBKDF2 strings; they still verify and are upgraded to
+    HMAC on first successful use.
+    """
+    SCHEME = "hmac_sha256$"
+    # secrets.token_urlsafe(8) always yields 11 characters, which may
+    # themselves contain "_", so the prefix is sliced rather than split.
+    PREFIX_LENGTH = 11
+
+    @staticmethod
+    def hash(full_key: str) -> str:
+        digest = hmac.new(
+            settings.API_KEY_HMAC_SECRET.encode(),
+            full_key.encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        return f"{APIKeyHasher.SCHEME}{digest}"
+
+    @staticmethod
+    def verify(full_key: str, hashed_key: str):
+        """
+        Returns (is_valid, needs_upgrade).
+        """
+        if hashed_key.startswith(APIKeyHasher.SCHEME):
+            return hmac.compare_digest(APIKeyHasher.hash(full_key), hashed_key), False
+        is_valid = check_password(full_key, hashed_key)
+        return is_valid, is_valid
+
+    @staticmethod
+    def is_legacy(hashed_key: str) -> bool:
+        return not hashed_key.startswith(APIKeyHasher.SCHEME)
+
+    @staticmethod
+    def parse_prefix(full_key: str, scheme: str):
+        """
+        Extracts <prefix> from a key shaped <scheme>_<prefix>_<secret>.
+        Returns None if the key is malformed.
+        """
+        head = f"{scheme}_"
+        if not full_key.startswith(head):
+            return None
+        rest = full_key[len(head):]
+        prefix = rest[:APIKeyHasher.PREFIX_LENGTH]
+        separator = rest[APIKeyHasher.PREFIX_LENGTH:APIKeyHasher.PREFIX_LENGTH + 1]
+        secret = rest[APIKeyHasher.PREFIX_LENGTH + 1:]
+        if len(prefix) != APIKeyHasher.PREFIX_LENGTH or separator != "_" or not secret:
+            return None
+        return prefix
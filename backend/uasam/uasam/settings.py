@@ -22,6 +22,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', 'some-secret')
 
+# Server-side secret for HMAC-SHA256 hashing of SDK and agent API keys.
+# Rotating it invalidates every key issued under the previous value.
+API_KEY_HMAC_SECRET = os.getenv('API_KEY_HMAC_SECRET', SECRET_KEY)
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 ALLOWED_HOSTS = ['*']
@@ -146,6 +150,20 @@ CACHES = {
     }
 }
 
+# Verified agent key cache (seconds / entries). The local layer bounds how
+# long another worker may keep accepting a just-revoked key.
+AGENT_KEY_CACHE_TTL = int(os.getenv('AGENT_KEY_CACHE_TTL', 300))
+AGENT_KEY_LOCAL_CACHE_TTL = int(os.getenv('AGENT_KEY_LOCAL_CACHE_TTL', 5))
+AGENT_KEY_LOCAL_CACHE_MAXSIZE = int(os.getenv('AGENT_KEY_LOCAL_CACHE_MAXSIZE', 10000))
+
+# Brain caches dashboard authorization decisions; membership, project and
+# agent changes are pushed to its internal invalidation endpoint. Use the
+# same INTERNAL_API_TOKEN as brain; empty disables the call, leaving brain's
+# AGENT_AUTH_CACHE_TTL as the only bound on stale access.
+BRAIN_API_URL = os.getenv('BRAIN_API_URL', 'http://host.docker.internal:8002')
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+BRAIN_INVALIDATE_TIMEOUT = float(os.getenv('BRAIN_INVALIDATE_TIMEOUT', 2))
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
@@ -8,6 +8,10 @@ Requires:
     pip install psycopg2-binary
 
 Make sure your DB is running (docker compose up brain-db) before running this.
+
+This inserts one row at a time and is only meant for small samples. For
+backfills use the COPY-based loader instead:
+    python manage.py load_events dummy_events.csv --workers 4
 """
 
 import csv